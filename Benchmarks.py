@@ -0,0 +1,364 @@
+"""
+    Benchmarks for performance critical parts of the fuzzy vault
+    Run with the name of a benchmark as parameter, e.g. python3 Benchmarks.py galois_field
+"""
+
+import math
+import os
+import random
+import sys
+import tempfile
+import timeit
+import tracemalloc
+
+import numpy as np
+from bitstring import BitArray
+
+import Constants
+from Chaff_Points_Generator import ChaffPointsGenerator
+from Galois.Galois_Field_Factory import GaloisFieldFactory
+from Galois.Incremental_Interpolator import IncrementalInterpolator
+from Galois.Lagrange_Interpolator import LagrangeInterpolator
+from Geometric_Hashing_Transformer import GHTransformer
+from Minutia import MinutiaNBIS, MinutiaNBIS_GH
+from Minutia_Converter import MinutiaConverter
+from Minutiae_Extractor import MinutiaeExtractor
+from Polynomial_Extractor import PolynomialExtractor
+from Polynomial_Generator import PolynomialGenerator
+from Subset_Enumerator import SubsetEnumerator
+from Template_Store import TemplateStore
+from Vault import Vault, VaultElement, CompactVault
+from Vault_Identifier import VaultIdentifier
+
+
+def time_per_call(function, arguments, repeat=3):
+    """ Measures the best average execution time of function over all arguments
+        :param function: function to be timed, called as function(*argument)
+        :param arguments: list of argument tuples
+        :param repeat: how many times the measurement is repeated (best is taken)
+        :returns time per call in microseconds """
+    timer = timeit.Timer(lambda: [function(*argument) for argument in arguments])
+    return min(timer.repeat(repeat=repeat, number=1)) / len(arguments) * 1e6
+
+
+def print_comparison(name, time_reference, time_new, reference='sympy', new='int'):
+    print('{:<20} {}: {:>10.2f} us   {}: {:>8.2f} us   speedup: {:>7.1f}x'.format(
+        name, reference, time_reference, new, time_new, time_reference / time_new))
+
+
+def benchmark_galois_field(iterations=500, gf_exp=32, poly_degree=8):
+    """ Compares per operation time of Galois Field backends 'sympy' (lists of coefficients) and 'int' """
+    k_sympy = GaloisFieldFactory.create_field(2, gf_exp, GaloisFieldFactory.BACKEND_SYMPY)
+    k_int = GaloisFieldFactory.create_field(2, gf_exp, GaloisFieldFactory.BACKEND_INT)
+    pairs = [(random.getrandbits(gf_exp) or 1, random.getrandbits(gf_exp) or 1) for _ in range(iterations)]
+    poly = [random.getrandbits(gf_exp) for _ in range(poly_degree + 1)]
+
+    print('Galois Field GF(2**{}) with {} random operands'.format(gf_exp, iterations))
+    for name, k_op_sympy, k_op_int in [('add', k_sympy.add, k_int.add), ('sub', k_sympy.sub, k_int.sub),
+                                       ('mul', k_sympy.mul, k_int.mul)]:
+        args_sympy = [(k_sympy.element_from_int(x), k_sympy.element_from_int(y)) for x, y in pairs]
+        print_comparison(name, time_per_call(k_op_sympy, args_sympy), time_per_call(k_op_int, pairs))
+
+    args_sympy = [(k_sympy.element_from_int(x),) for x, _ in pairs]
+    args_int = [(x,) for x, _ in pairs]
+    print_comparison('inv', time_per_call(k_sympy.inv, args_sympy), time_per_call(k_int.inv, args_int))
+
+    poly_sympy = [k_sympy.element_from_int(c) for c in poly]
+    args_sympy = [(poly_sympy, k_sympy.element_from_int(x)) for x, _ in pairs]
+    args_int = [(poly, x) for x, _ in pairs]
+    print_comparison('eval_poly (deg {})'.format(poly_degree),
+                     time_per_call(k_sympy.eval_poly, args_sympy), time_per_call(k_int.eval_poly, args_int))
+
+
+def benchmark_polynomial_array(points_amount=330, poly_degree=8, gf_exp=32, crc_length=32):
+    """ Compares evaluation of the secret polynomial at all vault points element by element and vectorized """
+    secret_bytes = bytes(random.getrandbits(8) for _ in range(
+        ((poly_degree + 1) * gf_exp - crc_length) // 8))
+    points = [random.getrandbits(gf_exp) for _ in range(points_amount)]
+    generator = PolynomialGenerator(secret_bytes, poly_degree, crc_length, gf_exp,
+                                    gf_backend=GaloisFieldFactory.BACKEND_INT)
+    time_single = time_per_call(lambda: [generator.evaluate_polynomial_gf_2(x) for x in points], [()])
+    time_array = time_per_call(generator.evaluate_polynomial_gf_2_array, [(points,)])
+    print('Polynomial of degree {} evaluated at {} points'.format(poly_degree, points_amount))
+    print_comparison('evaluate', time_single, time_array, reference='single', new='array')
+
+
+def benchmark_interpolation(subsets=20, poly_degree=8, gf_exp=32):
+    """ Compares O(k**3) reference Lagrange interpolation with LagrangeInterpolator for both Galois Field backends """
+    print('Lagrange interpolation of {} random subsets with {} points'.format(subsets, poly_degree + 1))
+    for backend in [GaloisFieldFactory.BACKEND_SYMPY, GaloisFieldFactory.BACKEND_INT]:
+        extractor = PolynomialExtractor(gf_exp, gf_backend=backend)
+        arguments = []
+        for _ in range(subsets):
+            X = random.sample(range(1, 2 ** gf_exp), poly_degree + 1)
+            Y = [random.getrandbits(gf_exp) for _ in X]
+            arguments.append(([extractor.K.element_from_int(x) for x in X],
+                              [extractor.K.element_from_int(y) for y in Y]))
+        print_comparison('interpolate ({})'.format(backend),
+                         time_per_call(extractor.interpolate_lagrange_poly_in_field, arguments, repeat=1),
+                         time_per_call(extractor.interpolator.interpolate, arguments, repeat=1),
+                         reference='reference', new='batch inversion')
+
+
+def benchmark_incremental_interpolation(points_amount=14, poly_degree=8, gf_exp=32):
+    """ Compares interpolation of all subsets in revolving door order from scratch and with incremental updates """
+    k_int = GaloisFieldFactory.create_field(2, gf_exp, GaloisFieldFactory.BACKEND_INT)
+    X = random.sample(range(1, 2 ** gf_exp), points_amount)
+    Y = [random.getrandbits(gf_exp) for _ in X]
+    walk = list(SubsetEnumerator.revolving_door(points_amount, poly_degree + 1))
+    interpolator = LagrangeInterpolator(k_int)
+    incremental_interpolator = IncrementalInterpolator(k_int)
+    incremental_interpolator.reset([X[j] for j in walk[0][0]], [Y[j] for j in walk[0][0]])
+    time_scratch = time_per_call(
+        lambda subset: interpolator.interpolate([X[j] for j in subset], [Y[j] for j in subset]),
+        [(subset,) for subset, _, _ in walk[1:]])
+    time_incremental = time_per_call(
+        lambda removed, added: incremental_interpolator.swap(X[removed], X[added], Y[added]),
+        [(removed, added) for _, removed, added in walk[1:]], repeat=1)
+    print('Interpolation of all {} subsets with {} of {} points'.format(len(walk), poly_degree + 1, points_amount))
+    print_comparison('interpolate (int)', time_scratch, time_incremental, reference='scratch', new='incremental')
+
+
+def benchmark_geom_transform(minutiae_amount=330):
+    """ Compares transforming all minutiae to all bases as MinutiaNBIS_GH objects and as one numpy array """
+    minutiae = [MinutiaNBIS_GH(random.randint(-280, 280), random.randint(-280, 280), random.randint(0, 359))
+                for _ in range(minutiae_amount)]
+    minutiae_array = GHTransformer.minutiae_to_array(minutiae)
+
+    def transform_objects():
+        return [GHTransformer.transform_minutiae_to_basis(basis, minutiae) for basis in minutiae]
+
+    def transform_array():
+        return GHTransformer.transform_minutiae_array(minutiae_array, minutiae_array)
+
+    print('Transformation of {} minutiae to all {} bases'.format(minutiae_amount, minutiae_amount))
+    print_comparison('transform', time_per_call(transform_objects, [()], repeat=1),
+                     time_per_call(transform_array, [()]), reference='objects', new='array')
+    for name, transform in [('objects', transform_objects), ('array', transform_array)]:
+        tracemalloc.start()
+        result = transform()
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del result
+        print('memory ({}): {:>10.1f} KiB'.format(name, memory / 1024))
+
+
+def benchmark_vault_memory(vaults_amount=20, points_amount=330):
+    """ Compares memory of enrolled vaults held as Vault (with and without geom_table) and as CompactVault """
+    m2b = MinutiaConverter()
+    vaults_elements = [[(m2b.get_uint_from_minutia(MinutiaNBIS(random.randint(0, 500), random.randint(0, 500),
+                                                               random.randint(0, 359))), random.getrandbits(32))
+                        for _ in range(points_amount)] for _ in range(vaults_amount)]
+
+    def create_vaults(geom_table):
+        vaults = []
+        for elements in vaults_elements:
+            vault = Vault()
+            for x_rep, y_rep in elements:
+                vault.add_vault_element(VaultElement(x_rep, y_rep))
+            if geom_table:
+                vault.create_geom_table()
+            vaults.append(vault)
+        return vaults
+
+    def create_compact_vaults():
+        return [CompactVault.from_vault(vault) for vault in create_vaults(geom_table=True)]
+
+    print('Memory of {} vaults with {} points'.format(vaults_amount, points_amount))
+    for name, create in [('Vault with geom_table', lambda: create_vaults(True)),
+                         ('Vault', lambda: create_vaults(False)),
+                         ('CompactVault', create_compact_vaults)]:
+        tracemalloc.start()
+        vaults = create()
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del vaults
+        print('{:<22} {:>10.1f} KiB per vault'.format(name, memory / 1024 / vaults_amount))
+
+
+def benchmark_identification(gallery_sizes=(1000, 10000, 100000), probes_amount=3, points_amount=330, gf_exp=32,
+                             crc_length=32):
+    """ Throughput of 1:N identification with galleries of random vaults and random probes that are not enrolled,
+        so that the whole shortlist is verified (worst case) """
+    secret_length = 128
+    while (secret_length + crc_length) % (Constants.POLY_DEGREE + 1):
+        secret_length += 8
+    m2b = MinutiaConverter()
+    probes = [[MinutiaNBIS(random.randint(0, 559), random.randint(0, 559), random.randint(0, 359))
+               for _ in range(Constants.MINUTIAE_POINTS_AMOUNT)] for _ in range(probes_amount)]
+    print('Identification of {} probes (not enrolled) with shortlist of {} vaults'.format(
+        probes_amount, Constants.IDENTIFY_TOP_K))
+    for gallery_size in gallery_sizes:
+        identifier = VaultIdentifier()
+        t_start = timeit.default_timer()
+        for _ in range(gallery_size):
+            vault_x = m2b.get_uint_array_from_minutiae_array(np.random.randint(0, [560, 560, 360],
+                                                                               size=(points_amount, 3)))
+            identifier.add_vault(CompactVault(vault_x,
+                                              np.random.randint(1, 2 ** gf_exp, size=points_amount, dtype=np.uint32)))
+        identifier.build_index()
+        time_enroll = timeit.default_timer() - t_start
+        time_shortlist = time_per_call(identifier.shortlist, [(probe,) for probe in probes], repeat=1)
+        t_start = timeit.default_timer()
+        for probe in probes:
+            identifier.identify(probe, Constants.POLY_DEGREE, gf_exp, crc_length, secret_length)
+        time_identify = (timeit.default_timer() - t_start) / probes_amount
+        print('{:>7} vaults: enroll {:>7.1f} s, index {:>8.1f} MiB, shortlist {:>8.1f} ms, '
+              'identify {:>6.2f} probes/s'.format(gallery_size, time_enroll, identifier.nbytes() / 2 ** 20,
+                                                  time_shortlist / 1000, 1 / time_identify))
+
+
+def benchmark_chaff_points(amounts=(300, 1000, 1500), genuine_amount=30):
+    """ Time of chaff point generation for different amounts of chaff points
+        (with POINTS_DISTANCE = 10 the area of 560 x 560 holds roughly 1800 randomly placed points) """
+    m2b = MinutiaConverter()
+    genuine_minutiae = []
+    while len(genuine_minutiae) < genuine_amount:
+        candidate = MinutiaNBIS(random.randint(0, 559), random.randint(0, 559), random.randint(0, 359))
+        if all(candidate.distance_to(minutia) > Constants.POINTS_DISTANCE for minutia in genuine_minutiae):
+            genuine_minutiae.append(candidate)
+    smallest_minutia_rep = min(m2b.get_uint_from_minutia(minutia) for minutia in genuine_minutiae)
+    print('Chaff points generation with {} genuine minutiae'.format(genuine_amount))
+    for amount in amounts:
+        time_generate = time_per_call(ChaffPointsGenerator.generate_chaff_points_randomly,
+                                      [(amount, genuine_minutiae, smallest_minutia_rep, m2b)], repeat=1)
+        print('{:>6} chaff points: {:>10.1f} ms'.format(amount, time_generate / 1000))
+
+
+def benchmark_minutia_converter(minutiae_amount=1000):
+    """ Compares conversion of minutiae to uint and back with bitstring, with shifts and as numpy array """
+    m2b = MinutiaConverter()
+    minutiae = [MinutiaNBIS(random.randint(0, 560), random.randint(0, 560), random.randint(0, 359))
+                for _ in range(minutiae_amount)]
+    minutiae_array = np.array([(m.x, m.y, m.theta) for m in minutiae])
+    reps = [m2b.get_uint_from_minutia(m) for m in minutiae]
+    reps_array = np.array(reps, dtype=np.uint32)
+    print('Conversion of {} minutiae'.format(minutiae_amount))
+
+    def to_uint_bitstring():
+        return [m2b.get_total_bitstring_from_minutia(m).uint for m in minutiae]
+
+    def from_uint_bitstring():
+        return [m2b.get_minutia_from_bitstring(BitArray(uint=rep, length=m2b.TOTAL_BIT_LENGTH)) for rep in reps]
+
+    for name, bitstring_function, int_function, array_function in [
+        ('to uint', to_uint_bitstring, lambda: [m2b.get_uint_from_minutia(m) for m in minutiae],
+         lambda: m2b.get_uint_array_from_minutiae_array(minutiae_array)),
+        ('from uint', from_uint_bitstring, lambda: [m2b.get_minutia_from_uint(rep) for rep in reps],
+         lambda: m2b.get_minutiae_array_from_uint_array(reps_array))]:
+        time_bitstring = time_per_call(bitstring_function, [()]) / minutiae_amount
+        print_comparison(name, time_bitstring, time_per_call(int_function, [()]) / minutiae_amount,
+                         reference='bitstring', new='int')
+        print_comparison(name, time_bitstring, time_per_call(array_function, [()]) / minutiae_amount,
+                         reference='bitstring', new='array')
+
+
+def benchmark_template_store(templates_amount=100, minutiae_amount=50, reads=10):
+    """ Compares reading random .xyt templates with MinutiaeExtractor (parsed at every read) and TemplateStore
+        (parsed once, kept in memory or loaded from binary cache) """
+    with tempfile.TemporaryDirectory() as folder:
+        paths = []
+        for i in range(templates_amount):
+            paths.append(os.path.join(folder, '{}.xyt'.format(i)))
+            with open(paths[-1], 'w') as file:
+                for _ in range(minutiae_amount):
+                    file.write('{} {} {} {}\n'.format(random.randint(0, 560), random.randint(0, 560),
+                                                      random.randint(0, 359), random.randint(0, 100)))
+        cache_folder = os.path.join(folder, 'cache')
+        extractor = MinutiaeExtractor()
+        store = TemplateStore(cache_folder)
+        arguments = [(path,) for path in paths]
+        print('Reading {} templates with {} minutiae'.format(templates_amount, minutiae_amount))
+        time_extractor = time_per_call(extractor.extract_minutiae_from_xyt, arguments)
+        print_comparison('parse', time_extractor, time_per_call(TemplateStore.parse_xyt, arguments),
+                         reference='extractor', new='store')
+        print_comparison('cold (write cache)', time_extractor, time_per_call(store.get_template, arguments, repeat=1),
+                         reference='extractor', new='store')
+        store.clear()
+        print_comparison('cache (mmap)', time_extractor, time_per_call(store.get_template, arguments, repeat=1),
+                         reference='extractor', new='store')
+        print_comparison('memory', time_extractor, time_per_call(store.get_template, arguments * reads),
+                         reference='extractor', new='store')
+        print_comparison('memory + minutiae', time_extractor,
+                         time_per_call(store.get_minutiae, [(path, 30) for path in paths] * reads),
+                         reference='extractor', new='store')
+
+
+def write_random_captures(folder, finger, poses, minutiae_amount=40):
+    """ Writes .xyt templates of a random finger captured with poses (rotation around the image center in degrees,
+        translation) and small jitter
+        :returns list of paths of the templates """
+    minutiae = []
+    while len(minutiae) < minutiae_amount:
+        x, y = random.randrange(80, 480), random.randrange(80, 480)
+        if all(math.hypot(x - other_x, y - other_y) > 20 for other_x, other_y, _, _ in minutiae):
+            minutiae.append((x, y, random.randrange(360), random.randrange(10, 100)))
+    paths = []
+    for capture, (angle, dx, dy) in enumerate(poses, 1):
+        cos_angle, sin_angle = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+        paths.append(os.path.join(folder, '{}_{}.xyt'.format(finger, capture)))
+        with open(paths[-1], 'w') as file:
+            for x, y, theta, quality in minutiae:
+                x, y = x - 280, y - 280
+                file.write('{} {} {} {}\n'.format(
+                    round(x * cos_angle - y * sin_angle + 280 + dx) + random.randint(-2, 2),
+                    round(x * sin_angle + y * cos_angle + 280 + dy) + random.randint(-2, 2),
+                    (theta + angle + random.randint(-2, 2)) % 360, quality))
+    return paths
+
+
+def benchmark_pose_alignment(fingers_amount=5, chaff_amount=300):
+    """ Compares geometric hashing iterations and time of genuine verifications without and with
+        Constants.POSE_ALIGNMENT on random fingers captured twice (rotated and translated) """
+    # Main connects to the database on import
+    from Main import generate_smallest_secret, initialize_log_dict, generate_vault, verify_secret
+    secret = generate_smallest_secret(Constants.POLY_DEGREE, Constants.CRC_LENGTH, min_size=128)
+    pose_alignment = Constants.POSE_ALIGNMENT
+    print('Genuine verifications of {} random fingers (vault with {} minutiae and {} chaff points)'.format(
+        fingers_amount, Constants.MINUTIAE_POINTS_AMOUNT, chaff_amount))
+    with tempfile.TemporaryDirectory() as folder:
+        for finger in range(1, fingers_amount + 1):
+            probe_pose = (random.randint(-20, 20), random.randint(-30, 30), random.randint(-30, 30))
+            gallery_xyt, probe_xyt = write_random_captures(folder, finger, [(0, 0, 0), probe_pose])
+            log_dict = {}
+            initialize_log_dict(log_dict)
+            vault = generate_vault(gallery_xyt, Constants.MINUTIAE_POINTS_AMOUNT, chaff_amount,
+                                   Constants.POLY_DEGREE, secret, Constants.CRC_LENGTH, Constants.GF_2_M, log_dict)
+            vault.create_geom_table()
+            results = []
+            seed = random.getrandbits(64)
+            for alignment in (False, True):
+                Constants.POSE_ALIGNMENT = alignment
+                # same order of probe bases in both runs
+                random.seed(seed)
+                initialize_log_dict(log_dict)
+                start = timeit.default_timer()
+                match = verify_secret(probe_xyt, Constants.MINUTIAE_POINTS_AMOUNT, Constants.POLY_DEGREE,
+                                      Constants.CRC_LENGTH, len(secret) * 8, Constants.GF_2_M, vault, log_dict)
+                results.append(((timeit.default_timer() - start) * 1e6, match, log_dict['geom_iteration']))
+            print('finger {}: match {} / {}, geom iterations {:>6} / {:>6}'.format(
+                finger, results[0][1], results[1][1], results[0][2], results[1][2]))
+            print_comparison('verification', results[0][0], results[1][0], reference='no pose', new='pose')
+    Constants.POSE_ALIGNMENT = pose_alignment
+
+
+BENCHMARKS = {
+    'galois_field': benchmark_galois_field,
+    'polynomial_array': benchmark_polynomial_array,
+    'interpolation': benchmark_interpolation,
+    'incremental_interpolation': benchmark_incremental_interpolation,
+    'geom_transform': benchmark_geom_transform,
+    'vault_memory': benchmark_vault_memory,
+    'identification': benchmark_identification,
+    'chaff_points': benchmark_chaff_points,
+    'minutia_converter': benchmark_minutia_converter,
+    'template_store': benchmark_template_store,
+    'pose_alignment': benchmark_pose_alignment,
+}
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2 or sys.argv[1] not in BENCHMARKS:
+        print('Please provide one of the benchmarks as parameter: {}'.format(', '.join(BENCHMARKS.keys())))
+        exit(-1)
+    BENCHMARKS[sys.argv[1]]()
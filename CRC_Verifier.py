@@ -0,0 +1,77 @@
+"""
+    CRC Verifier checks if the coefficients of an interpolated polynomial encode secret and matching CRC
+    Coefficients are processed one after another as int, so a candidate is rejected at the first coefficient that is
+    too big, and secret and CRC are assembled with integer shifts instead of bitstrings.
+    The verifier counts how many candidates were rejected in which stage
+"""
+
+import binascii
+from itertools import islice
+
+
+class CRCVerifier:
+    def __init__(self, degree, crc_length, secret_length):
+        """
+        :param degree: degree of the polynomial
+        :param crc_length: length of the CRC in bits as int
+        :param secret_length: length of the secret in bits as int
+        """
+        assert (crc_length + secret_length) % (degree + 1) == 0
+        assert secret_length % 8 == 0
+        self.coefficients_amount = degree + 1
+        self.coefficient_length = (crc_length + secret_length) // (degree + 1)
+        self.crc_length = crc_length
+        self.crc_mask = (1 << crc_length) - 1
+        self.secret_bytes_length = secret_length // 8
+        # amount of checked candidates and candidates rejected because of a too big coefficient or wrong CRC
+        self.checked = 0
+        self.rejected_coefficient = 0
+        self.rejected_crc = 0
+
+    def verify(self, poly, to_int=None):
+        """ Checks if CRC in polynomial encoding (secret) is correct
+            :param poly: list of coefficients of polynomial, highest degree first (leading zeros can be omitted,
+            coefficients beyond degree + 1 are ignored)
+            :param to_int: function converting coefficients to int (e.g. element_to_int of a Galois Field),
+            only called for coefficients that are needed
+            :returns True if CRC is correct """
+        self.checked += 1
+        coefficient_length = self.coefficient_length
+        value = 0
+        for coefficient in islice(poly, max(0, len(poly) - self.coefficients_amount), None):
+            if to_int is not None:
+                coefficient = to_int(coefficient)
+            # if coefficient is bigger than supposed to CRC is definitely not correct
+            if coefficient >> coefficient_length:
+                self.rejected_coefficient += 1
+                return False
+            value = (value << coefficient_length) | coefficient
+        secret = value >> self.crc_length
+        if value & self.crc_mask != binascii.crc32(secret.to_bytes(self.secret_bytes_length, 'big')):
+            self.rejected_crc += 1
+            return False
+        return True
+
+    def reject(self):
+        """ Counts a candidate that has no polynomial (e.g. subset with repeated x-coordinates) as wrong CRC
+            :returns False """
+        self.checked += 1
+        self.rejected_crc += 1
+        return False
+
+    def counts(self):
+        """ :returns tuple (checked, rejected because of coefficient, rejected because of CRC) """
+        return self.checked, self.rejected_coefficient, self.rejected_crc
+
+    def add_counts(self, counts):
+        """ Adds counts of another verifier (see counts) """
+        checked, rejected_coefficient, rejected_crc = counts
+        self.checked += checked
+        self.rejected_coefficient += rejected_coefficient
+        self.rejected_crc += rejected_crc
+
+    def add_to_log(self, log_dict):
+        """ Adds counts to the totals in log_dict """
+        log_dict['crc_checked'] = log_dict.get('crc_checked', 0) + self.checked
+        log_dict['crc_rejected_coefficient'] = log_dict.get('crc_rejected_coefficient', 0) + self.rejected_coefficient
+        log_dict['crc_rejected_crc'] = log_dict.get('crc_rejected_crc', 0) + self.rejected_crc
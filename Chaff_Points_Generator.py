@@ -3,36 +3,75 @@
 """
 
 import random
+import numpy as np
 from Minutia import MinutiaNBIS
 import Constants
 
 
 class ChaffPointsGenerator:
     @staticmethod
-    def generate_chaff_points_randomly(amount, genuine_minutiae, smallest_minutia_rep, minutia_converter):
+    def generate_chaff_points_randomly(amount, genuine_minutiae, smallest_minutia_rep, minutia_converter,
+                                       points_distance=None):
         """ create the amount of chaff points (Minutia) desired
         Chaff points need to have at least a specified distance from all other genuine minutiae and chaff points
 
+        :param points_distance: distance points have to be apart, Constants.POINTS_DISTANCE if None
         :returns a list of Minutia randomly generated """
-        chaff_points_list = []
-        all_vault_points = genuine_minutiae.copy()
-        for _ in range(amount):
-            plausible_minutia = False
-            while not plausible_minutia:
-                x_random = random.randrange(MinutiaNBIS.X_MIN, MinutiaNBIS.X_MAX)
-                y_random = random.randrange(MinutiaNBIS.Y_MIN, MinutiaNBIS.Y_MAX)
-                theta_random = random.randrange(MinutiaNBIS.THETA_MIN, MinutiaNBIS.THETA_MAX)
-                quality_random = random.randrange(MinutiaNBIS.QUALITY_MIN, MinutiaNBIS.QUALITY_MAX)
-                chaff_point = MinutiaNBIS(x_random, y_random, theta_random, quality_random)
-
-                if minutia_converter.get_uint_from_minutia(chaff_point) >= (smallest_minutia_rep // 2):
-                    too_close = False
-                    for minutia in all_vault_points:
-                        if chaff_point.distance_to(minutia) <= Constants.POINTS_DISTANCE:
-                            too_close = True
-                            break
-                    if not too_close:
-                        chaff_points_list.append(chaff_point)
-                        all_vault_points.append(chaff_point)
-                        plausible_minutia = True
-        return chaff_points_list
+        return [MinutiaNBIS(x, y, theta, quality) for x, y, theta, quality in ChaffPointsGenerator.sample_chaff_points(
+            amount, genuine_minutiae, smallest_minutia_rep, minutia_converter, points_distance)]
+
+    @staticmethod
+    def generate_chaff_points_rep_array(amount, genuine_minutiae, smallest_minutia_rep, minutia_converter,
+                                        points_distance=None):
+        """ create the amount of chaff points desired as uint representations
+        (same chaff points as generate_chaff_points_randomly, without creating Minutia objects)
+
+        :param points_distance: distance points have to be apart, Constants.POINTS_DISTANCE if None
+        :returns numpy array (uint32) of uint representations of chaff points """
+        chaff_points = np.array(ChaffPointsGenerator.sample_chaff_points(
+            amount, genuine_minutiae, smallest_minutia_rep, minutia_converter, points_distance),
+            dtype=np.int64).reshape(-1, 4)
+        return minutia_converter.get_uint_array_from_minutiae_array(chaff_points[:, :3])
+
+    @staticmethod
+    def sample_chaff_points(amount, genuine_minutiae, smallest_minutia_rep, minutia_converter, points_distance=None):
+        """ draws chaff points for generate_chaff_points_randomly
+
+        Points are kept in a uniform grid with cells of size POINTS_DISTANCE + 1: distance_to truncates to int, so
+        points are too close if their exact distance is smaller than POINTS_DISTANCE + 1, and all of them lie in the
+        cell of the candidate or in its 8 neighbours. Candidates are drawn in the same order as before, so the same
+        random state yields the same chaff points
+
+        :param points_distance: distance points have to be apart, Constants.POINTS_DISTANCE if None
+        :returns list of tuples (x, y, theta, quality) """
+        if points_distance is None:
+            points_distance = Constants.POINTS_DISTANCE
+        cell_size = points_distance + 1
+        min_distance_squared = cell_size ** 2
+        # points in grid by cell (x // cell_size, y // cell_size)
+        grid = {}
+        for minutia in genuine_minutiae:
+            grid.setdefault((minutia.x // cell_size, minutia.y // cell_size), []).append((minutia.x, minutia.y))
+        # uint representation of candidate is assembled with shifts before a minutia is created
+        x_shift = minutia_converter.X_SHIFT
+        y_shift = minutia_converter.Y_SHIFT
+        smallest_chaff_rep = smallest_minutia_rep // 2
+
+        chaff_points = []
+        while len(chaff_points) < amount:
+            x_random = random.randrange(MinutiaNBIS.X_MIN, MinutiaNBIS.X_MAX)
+            y_random = random.randrange(MinutiaNBIS.Y_MIN, MinutiaNBIS.Y_MAX)
+            theta_random = random.randrange(MinutiaNBIS.THETA_MIN, MinutiaNBIS.THETA_MAX)
+            quality_random = random.randrange(MinutiaNBIS.QUALITY_MIN, MinutiaNBIS.QUALITY_MAX)
+            if (x_random << x_shift) | (y_random << y_shift) | theta_random < smallest_chaff_rep:
+                continue
+            cell_x = x_random // cell_size
+            cell_y = y_random // cell_size
+            too_close = any((x_random - x) ** 2 + (y_random - y) ** 2 < min_distance_squared
+                            for neighbour_x in (cell_x - 1, cell_x, cell_x + 1)
+                            for neighbour_y in (cell_y - 1, cell_y, cell_y + 1)
+                            for x, y in grid.get((neighbour_x, neighbour_y), ()))
+            if not too_close:
+                chaff_points.append((x_random, y_random, theta_random, quality_random))
+                grid.setdefault((cell_x, cell_y), []).append((x_random, y_random))
+        return chaff_points
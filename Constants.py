@@ -7,16 +7,58 @@ import datetime
 # How many times the database is iterated through (at each iteration, parameters can be changed below
 # with CHANGE_* constants.
 RUN_DB_ITERATIONS = 4
+# Amount of processes running the database with Database_Runner (work units of one gallery template with all its
+# probes, vault is reused), 0: run database serially in run_over_database
+DB_RUNNER_WORKERS = 0
+# Seed of the random generators of the work units, results do not depend on DB_RUNNER_WORKERS. With a seed, every run
+# generates the same vaults (deterministic results), None: random seed per run (independent vaults in every iteration)
+DB_RUNNER_SEED = None
+# Folder of the log shards written by the workers of Database_Runner
+DB_RUNNER_SHARD_FOLDER = 'out/shards/'
+# Journal of finished work units of Database_Runner to resume interrupted runs (e.g. 'out/db_journal.jsonl'): a run
+# continues with the unfinished units of the same parameters and templates when it is started again, finished
+# parameters are skipped (delete journal to run them again). None: no journal, every run starts from the beginning
+DB_RUNNER_JOURNAL = None
+# Shared work directory of coordinator and workers (python3 Main.py coordinator / worker), leases of work units
+# expire if a worker does not renew them within WORK_LEASE_SECONDS, workers wait WORK_POLL_SECONDS for leases
+WORK_DIR = 'out/work/'
+WORK_LEASE_SECONDS = 600
+WORK_POLL_SECONDS = 5
 # Reuse generated vault for the same gallery template
 REUSE_VAULT = True
 # Threshold to define when to use random subset evaluation
 SUBSET_EVAL_THRES = 25
-# Use random subset evaluation instead of generation of all subsets upfront
-RANDOM_SUBSET_EVAL = True
+# Use random subset evaluation instead of generation of all subsets upfront (False: subsets of at most
+# SUBSET_EVAL_THRES candidates are interpolated incrementally, see INCREMENTAL_INTERPOLATION)
+RANDOM_SUBSET_EVAL = False
+# Amount of processes evaluating subsets in parallel (1: evaluate in the verifying process)
+SUBSET_EVAL_WORKERS = 1
+# Seed of the random order in which subsets are evaluated (None: new random order in every verification)
+SUBSET_EVAL_SEED = None
+# Amount of threads or processes verifying in parallel in batch verification (VaultVerifier.verify_probes/verify_vaults)
+VERIFY_WORKERS = 4
+# Use processes instead of threads for batch verification (threads share the vault, processes receive a copy)
+VERIFY_USE_PROCESSES = False
+# 1:N identification: maximal distance of two vault points (or probe minutiae) forming a pair in the inverted index
+IDENTIFY_PAIR_DISTANCE = 100
+# 1:N identification: bin size of distance of pair and of angles of minutiae relative to pair (has to divide 180)
+IDENTIFY_DISTANCE_BIN = 6
+IDENTIFY_ANGLE_BIN = 20
+# 1:N identification: amount of vaults with highest votes that are verified
+IDENTIFY_TOP_K = 10
+# Walk all subsets so that consecutive subsets differ in one point and update the interpolated polynomial
+# incrementally, only used without random subset evaluation (RANDOM_SUBSET_EVAL = False and at most
+# SUBSET_EVAL_THRES candidates)
+INCREMENTAL_INTERPOLATION = True
 # Run 1vs1 and FVC protocol instead of all possible matches
 ONE_TO_ONE_FVC_PROTOCOL = True
 # Check if chaff point mapping is on polynomial
 CHECK_CHAFF_POINT_MAPPING = True
+# Decode polynomial from all candidate minutiae at once with Gao's Reed-Solomon decoder before subset evaluation
+# (a polynomial decoded this way is logged with 0 evaluated subsets)
+ALGEBRAIC_DECODING = False
+# Evaluate subsets if algebraic decoding fails (too many chaff points in candidate minutiae)
+ALGEBRAIC_DECODING_FALLBACK = True
 
 # Constants variable
 POLY_DEGREE = 8
@@ -34,6 +76,15 @@ CHANGE_THETA_THRES = 0
 CHANGE_TOT_THRES = 0
 CHANGE_BASIS_THETA = 0
 
+# Parameter sweep (python3 Main.py sweep): grid of ExperimentParameters names and values, all combinations are run
+# (other parameters from these Constants), vaults are shared by parameter sets with same enrollment parameters
+SWEEP_GRID = {'x_threshold': [10, 12, 14], 'basis_theta_threshold': [8, 10, 12]}
+# Folder of parameter sweep, logs and log summary of every parameter set are in a subfolder set_<index>
+SWEEP_FOLDER = 'out/sweep/'
+
+# Folder of binary cache of parsed templates (.xyt files), None: templates are only kept in memory
+TEMPLATE_CACHE_FOLDER = 'out/template_cache/'
+
 # Distance that minutiae (genuine minutiae and chaff points) have to at least be apart
 POINTS_DISTANCE = 10
 
@@ -47,6 +98,17 @@ BASIS_THETA_THRESHOLD = 10
 MAX_ITERATION_THRESHOLD = 27000000
 # threshold for geometric hashing: should be exactly POLY_DEGREE + 1 to ensure correctness
 MATCH_THRESHOLD = POLY_DEGREE + 1
+# matching of transformed minutiae in geometric hashing: 'vectorized' compares all pairs at once with numpy,
+# 'hash' looks up probe minutiae in hash table of quantized enrollment minutiae,
+# 'pairwise' compares all pairs one by one (all find the same matches)
+GEOM_MATCHING_MODE = 'vectorized'
+# order pairs of probe basis and gallery basis in geometric hashing by votes for their implied pose (Hough voting)
+POSE_ALIGNMENT = False
+# bin sizes of pose accumulator: rotation in degrees and translation
+POSE_THETA_BIN = 10
+POSE_XY_BIN = 20
+# pairs of bases with less votes for their pose are skipped (0: no pair is skipped)
+POSE_MIN_VOTES = 0
 # Logging in Vault_Verifier
 now = datetime.datetime.now()
 date_time_now_str = '{}_{}'.format(now.strftime("%Y%m%d"), now.strftime("%H%M"))
@@ -66,6 +128,8 @@ FP_OUTPUT_NAME = 'temp'
 # Galois field exponent
 GF_2_M = 32
 CRC_LENGTH = 32
+# Galois field implementation: 'int' (integers, carry-less arithmetic) or 'sympy' (lists of coefficients)
+GF_BACKEND = 'int'
 
 # Constants to run over whole DB 2A
 SPLIT_COMPUTATION = False
@@ -104,6 +168,8 @@ JSON_VAULT_GEOM = "vault_geom_table"
 JSON_GEOM_BASIS = "geom_basis"
 JSON_GEOM_X = "geom_x"
 JSON_GEOM_Y = "geom_y"
+JSON_VAULT_THETA_ORDER = "vault_theta_order"
+JSON_VAULT_THETA = "vault_theta"
 
 # Constants for Create_Log_Summary script
 DB_TESTING_FOLDER = 'db_testing/1vs1/'
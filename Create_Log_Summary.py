@@ -15,10 +15,9 @@ def create_log_summary(log_summary_path, db_testing_folder):
     # loop through whole database (folder)
     all_paths = os.listdir(db_testing_folder)
 
-    fvc_flag = False
-    one_vs_one_flag = False
-
     for log_name_original in all_paths:
+        fvc_flag = False
+        one_vs_one_flag = False
         if log_name_original.startswith('1_vs_1_'):
             log_name = log_name_original[len('1_vs_1_'):]
             one_vs_one_flag = True
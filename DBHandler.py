@@ -24,7 +24,7 @@ class DBHandler:
     def insert_fuzzy_vault(self, vault, vault_id):
         self.col_fuzzy_vault.insert_one(VaultConverter.serialize(vault, vault_id))
 
-    def find_fuzzy_vault(self, vault_id, dump=False):
+    def find_fuzzy_vault(self, vault_id, dump=False, compact=False):
         result_cursor = self.col_fuzzy_vault.find({Constants.JSON_VAULT_ID: vault_id})
         if result_cursor.count() == 0:
             print("No match found with given ID!")
@@ -38,7 +38,17 @@ class DBHandler:
             del result['_id']
             with open('out/vault_{}.json'.format(vault_id), 'w') as json_file:
                 json.dump(result, json_file)
+        if compact:
+            return VaultConverter.deserialize_compact(result)
         return VaultConverter.deserialize(result)
 
+    def find_all_fuzzy_vaults(self, compact=False):
+        """ Yields tuples (vault ID, vault) of all stored vaults, vaults as CompactVault if compact """
+        for result in self.col_fuzzy_vault.find():
+            if compact:
+                yield result[Constants.JSON_VAULT_ID], VaultConverter.deserialize_compact(result)
+            else:
+                yield result[Constants.JSON_VAULT_ID], VaultConverter.deserialize(result)
+
     def close_handler(self):
         self.client.close()
@@ -0,0 +1,321 @@
+"""
+    Database Runner to match all gallery and probe templates of a database in parallel processes
+
+    The pairs of gallery and probe templates are planned as work units, one per gallery template with all its probes,
+    so that the vault of the gallery template is generated once and reused for all probes of the unit.
+    Work units are executed on a process pool. Every worker process appends the logs of its units to its own shard
+    files and reports which part of the shards belongs to which unit. At the end, the parts are merged into the log
+    files in the order of the plan, so the logs have the same order with any amount of workers.
+    The random generator is seeded per unit, so that the results (matches) do not depend on the amount of workers
+    or on which worker runs a unit.
+
+    Finished units are recorded in an append-only journal (one JSON object per line) together with their parts of
+    the shard files. A run that was interrupted skips the recorded units when it is started again with the same
+    parameters, and the log files are only written when all units are finished.
+"""
+
+import hashlib
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import combinations, groupby
+
+import Constants
+
+
+class WorkUnit:
+    """ Gallery template matched with probe templates, logged to the log files of all keys in logs """
+    __slots__ = ('index', 'gallery_xyt', 'probe_xyts', 'logs')
+
+    def __init__(self, index, gallery_xyt, probe_xyts, logs):
+        self.index = index
+        self.gallery_xyt = gallery_xyt
+        self.probe_xyts = probe_xyts
+        self.logs = logs
+
+    def __repr__(self):
+        return 'WorkUnit({}, {}, {} probes, {})'.format(self.index, self.gallery_xyt, len(self.probe_xyts), self.logs)
+
+
+class RunJournal:
+    """ Append-only journal of database runs, every line is one record:
+        - start: parameters (key of parameter set), seed, log_files
+        - unit: parameters, unit (index), gallery, result (see DatabaseRunner.run_unit)
+        - merged: parameters (all logs of the parameter set are written) """
+    START = 'start'
+    UNIT = 'unit'
+    MERGED = 'merged'
+
+    def __init__(self, path):
+        """
+        :param path: path of journal file, records of an existing journal are loaded
+        """
+        self.path = path
+        # parameters: start record
+        self.starts = dict()
+        # parameters: {unit index: unit record}
+        self.units = dict()
+        self.merged = set()
+        if os.path.exists(path):
+            self.load()
+
+    def load(self):
+        """ Reads all records of the journal file (an incomplete last line of an interrupted run is ignored) """
+        with open(self.path, 'r') as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                parameters = record['parameters']
+                if record['type'] == RunJournal.START:
+                    self.starts.setdefault(parameters, record)
+                elif record['type'] == RunJournal.UNIT:
+                    self.units.setdefault(parameters, dict())[record['unit']] = record
+                elif record['type'] == RunJournal.MERGED:
+                    self.merged.add(parameters)
+
+    def append(self, record):
+        """ Appends record to journal file and flushes it to disk """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'a') as file:
+            file.write(json.dumps(record, separators=(',', ':')) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+
+    def start(self, parameters, seed, log_files):
+        """ Records start of a run with parameters, or gets the start record of an earlier run with same parameters
+        :param parameters: key of parameter set (see DatabaseRunner.get_parameters_key)
+        :param seed: seed of the run
+        :param log_files: dict of log key: (log parameter file, log database file)
+        :returns tuple (seed, log_files) of the first run with parameters """
+        if parameters not in self.starts:
+            record = {'type': RunJournal.START, 'parameters': parameters, 'seed': seed, 'log_files': log_files}
+            self.append(record)
+            self.starts[parameters] = record
+        record = self.starts[parameters]
+        return record['seed'], {key: tuple(files) for key, files in record['log_files'].items()}
+
+    def add_unit(self, parameters, unit: WorkUnit, result):
+        """ Records finished unit with its result of DatabaseRunner.run_unit """
+        record = {'type': RunJournal.UNIT, 'parameters': parameters, 'unit': unit.index,
+                  'gallery': unit.gallery_xyt, 'result': result}
+        self.append(record)
+        self.units.setdefault(parameters, dict())[unit.index] = record
+
+    def get_results(self, parameters, units):
+        """ :returns dict of unit index: result of all recorded units of parameters
+            :raises ValueError if recorded units do not match units (e.g. database was changed) """
+        results = dict()
+        for index, record in self.units.get(parameters, dict()).items():
+            if index >= len(units) or units[index].gallery_xyt != record['gallery']:
+                raise ValueError('Journal {} does not match the planned work units'.format(self.path))
+            results[index] = tuple(record['result'])
+        return results
+
+    def set_merged(self, parameters):
+        """ Records that all logs of parameters are written """
+        self.append({'type': RunJournal.MERGED, 'parameters': parameters})
+        self.merged.add(parameters)
+
+    def is_merged(self, parameters):
+        return parameters in self.merged
+
+
+class DatabaseRunner:
+    # keys of log files in protocols
+    LOG_FVC = 'fvc'
+    LOG_ONE_TO_ONE = '1vs1'
+    LOG_ALL = 'all'
+    # prefixes of the names of log files in protocols (see Create_Log_Summary)
+    LOG_PREFIXES = {LOG_FVC: 'fvc_', LOG_ONE_TO_ONE: '1_vs_1_', LOG_ALL: ''}
+
+    @staticmethod
+    def group_by_gallery(pairs, logs, units):
+        """ Appends work units to units, consecutive pairs with the same gallery template form one unit
+        :param pairs: iterable of (gallery_xyt, probe_xyt)
+        :param logs: tuple of keys of log files of units
+        :param units: list of WorkUnit """
+        for gallery_xyt, gallery_pairs in groupby(pairs, key=lambda pair: pair[0]):
+            units.append(WorkUnit(len(units), gallery_xyt, [probe_xyt for _, probe_xyt in gallery_pairs], logs))
+
+    @staticmethod
+    def finger_of(xyt):
+        """ :returns finger number of template named <finger>_<capture>.xyt """
+        return int(xyt.split('_')[0])
+
+    @staticmethod
+    def plan_protocols(all_xyt):
+        """ Plans the pairs of 1vs1 and FVC protocol (same pairs as run_over_database with ONE_TO_ONE_FVC_PROTOCOL)
+        - FMR: all pairs of first captures of different fingers, logged to both protocols
+        - FNMR 1vs1: first capture against second capture of every finger
+        - FNMR FVC: all pairs of captures of the same finger
+        :param all_xyt: sorted list of all .xyt file names of database (<finger>_<capture>.xyt)
+        :returns list of WorkUnit """
+        units = []
+        all_xyt_one = [xyt for xyt in all_xyt if xyt.endswith('_1.xyt')]
+        DatabaseRunner.group_by_gallery(combinations(all_xyt_one, 2),
+                                        (DatabaseRunner.LOG_FVC, DatabaseRunner.LOG_ONE_TO_ONE), units)
+        fingers = sorted(set(DatabaseRunner.finger_of(xyt) for xyt in all_xyt))
+        DatabaseRunner.group_by_gallery((('{}_1.xyt'.format(finger), '{}_2.xyt'.format(finger)) for finger in fingers),
+                                        (DatabaseRunner.LOG_ONE_TO_ONE,), units)
+        for finger in fingers:
+            all_xyt_finger = [xyt for xyt in all_xyt if xyt.startswith('{}_'.format(finger))]
+            DatabaseRunner.group_by_gallery(combinations(all_xyt_finger, 2), (DatabaseRunner.LOG_FVC,), units)
+        return units
+
+    @staticmethod
+    def plan_all(gallery_xyts, all_xyt):
+        """ Plans every gallery template against all templates of the database
+        :param gallery_xyts: list of .xyt file names of gallery templates
+        :param all_xyt: list of all .xyt file names of database
+        :returns list of WorkUnit """
+        return [WorkUnit(index, gallery_xyt, list(all_xyt), (DatabaseRunner.LOG_ALL,))
+                for index, gallery_xyt in enumerate(gallery_xyts)]
+
+    @staticmethod
+    def get_constants():
+        """ :returns dict of all constants (upper case names in Constants), which may have been changed at runtime """
+        return {name: value for name, value in vars(Constants).items() if name.isupper()}
+
+    @staticmethod
+    def get_parameters_key(database_path=None):
+        """ Key of the current parameter set: hash of all constants except names of log files
+        (which contain the start time) and amount of workers (which does not change results), and of name,
+        modification time and size of all .xyt files in database_path (changed templates are not resumed)
+        :param database_path: path to folder of fingerprint templates, only constants are hashed if None
+        :returns hex string """
+        constants = sorted((name, repr(value)) for name, value in DatabaseRunner.get_constants().items()
+                           if not name.startswith('LOG_') and name != 'DB_RUNNER_WORKERS')
+        templates = []
+        if database_path is not None:
+            for file_name in sorted(os.listdir(database_path)):
+                if file_name.endswith('.xyt'):
+                    stat = os.stat(os.path.join(database_path, file_name))
+                    templates.append((file_name, stat.st_mtime_ns, stat.st_size))
+        return hashlib.sha1(repr((constants, templates)).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def get_shard_prefix(shard_folder, parameters):
+        """ :returns prefix of paths of shard files of parameter set (key or None) """
+        return os.path.join(shard_folder, 'shard_{}_'.format(parameters[:16] if parameters else 'run'))
+
+    @staticmethod
+    def remove_shards(shard_folder, parameters):
+        """ Removes all shard files of parameter set (also shards of processes of an interrupted run) """
+        shard_prefix = DatabaseRunner.get_shard_prefix(shard_folder, parameters)
+        for file_name in os.listdir(shard_folder):
+            path = os.path.join(shard_folder, file_name)
+            if path.startswith(shard_prefix):
+                os.remove(path)
+
+    @staticmethod
+    def run_unit(unit: WorkUnit, experiment, database_path, log_parameter_file, log_db_file, seed, constants):
+        """ Runs a work unit and appends its logs to log files
+        :param unit: WorkUnit to run
+        :param experiment: function(gallery_xyt, probe_xyts, database_path, log_parameter_file, log_db_file)
+        that matches gallery with all probes and appends one line per probe to both log files
+        :param database_path: path to folder of fingerprint templates
+        :param log_parameter_file: path of parameter log file
+        :param log_db_file: path of database log file
+        :param seed: seed of random generator of unit
+        :param constants: dict of constants to set in Constants (see get_constants)
+        :returns tuple (unit index, parameter log path, start, end, database log path, start, end)
+        with start and end as byte offsets of the logs of the unit """
+        for name, value in constants.items():
+            setattr(Constants, name, value)
+        random.seed(seed)
+        open(log_parameter_file, 'a').close()
+        open(log_db_file, 'a').close()
+        parameter_start = os.path.getsize(log_parameter_file)
+        db_start = os.path.getsize(log_db_file)
+        experiment(unit.gallery_xyt, unit.probe_xyts, database_path, log_parameter_file, log_db_file)
+        return (unit.index, log_parameter_file, parameter_start, os.path.getsize(log_parameter_file),
+                log_db_file, db_start, os.path.getsize(log_db_file))
+
+    @staticmethod
+    def run_unit_in_shard(unit: WorkUnit, experiment, database_path, shard_prefix, seed, constants):
+        """ Runs a work unit and appends its logs to the shard files of the current process (see run_unit)
+        :param shard_prefix: prefix of paths of shard files (see get_shard_prefix) """
+        shard_prefix = '{}{}_'.format(shard_prefix, os.getpid())
+        return DatabaseRunner.run_unit(unit, experiment, database_path, shard_prefix + 'param.csv',
+                                       shard_prefix + 'db.csv', seed, constants)
+
+    @staticmethod
+    def run(units, experiment, database_path, shard_folder, workers, seed=None, journal: RunJournal = None,
+            parameters=None, echo=False):
+        """ Runs all work units on a pool of workers processes
+        :param units: list of WorkUnit (see plan_protocols and plan_all)
+        :param experiment: function running a unit (see run_unit), has to be defined at module level
+        :param database_path: path to folder of fingerprint templates
+        :param shard_folder: folder of the shard files (shard files are appended, so results of units recorded in
+        journal stay valid)
+        :param workers: amount of processes, units are run in the current process if 1
+        :param seed: seed of the random generators of all units, random if None
+        :param journal: RunJournal recording finished units, units already recorded for parameters are skipped
+        :param parameters: key of parameter set in journal and of shard files (see get_parameters_key)
+        :param echo: print progress to console
+        :returns list of results of run_unit in order of units """
+        os.makedirs(shard_folder, exist_ok=True)
+        if seed is None:
+            seed = random.getrandbits(64)
+        results = journal.get_results(parameters, units) if journal is not None else dict()
+        constants = DatabaseRunner.get_constants()
+        shard_prefix = DatabaseRunner.get_shard_prefix(shard_folder, parameters)
+        arguments = [(unit, experiment, database_path, shard_prefix, '{}_{}'.format(seed, unit.index), constants)
+                     for unit in units if unit.index not in results]
+        if echo and results:
+            print('Resuming with {} of {} work units finished'.format(len(results), len(units)))
+
+        def add_result(result):
+            results[result[0]] = result
+            if journal is not None:
+                journal.add_unit(parameters, units[result[0]], result)
+            if echo:
+                DatabaseRunner.print_progress(len(results), len(units), t_start)
+
+        t_start = time.time()
+        if workers == 1:
+            for argument in arguments:
+                add_result(DatabaseRunner.run_unit_in_shard(*argument))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(DatabaseRunner.run_unit_in_shard, *argument) for argument in arguments]
+                for future in as_completed(futures):
+                    add_result(future.result())
+        return [results[unit.index] for unit in units]
+
+    @staticmethod
+    def merge(units, results, log_files):
+        """ Appends the logs of all units from the shard files to the log files in order of units
+        :param units: list of WorkUnit
+        :param results: list of results of run_unit in order of units (see run)
+        :param log_files: dict of log key: (log parameter file, log database file) """
+        shards = dict()
+        outputs = {key: (open(log_parameter_file, 'ab'), open(log_db_file, 'ab'))
+                   for key, (log_parameter_file, log_db_file) in log_files.items()}
+        try:
+            for unit, (index, parameter_shard, parameter_start, parameter_end, db_shard, db_start, db_end) \
+                    in zip(units, results):
+                assert unit.index == index
+                for shard in (parameter_shard, db_shard):
+                    if shard not in shards:
+                        shards[shard] = open(shard, 'rb')
+                shards[parameter_shard].seek(parameter_start)
+                parameter_log = shards[parameter_shard].read(parameter_end - parameter_start)
+                shards[db_shard].seek(db_start)
+                db_log = shards[db_shard].read(db_end - db_start)
+                for key in unit.logs:
+                    outputs[key][0].write(parameter_log)
+                    outputs[key][1].write(db_log)
+        finally:
+            for file in list(shards.values()) + [file for output in outputs.values() for file in output]:
+                file.close()
+
+    @staticmethod
+    def print_progress(done, total, t_start):
+        print('Finished {} of {} work units in {} seconds'.format(done, total, round(time.time() - t_start, 2)))
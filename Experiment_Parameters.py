@@ -0,0 +1,77 @@
+"""
+    Experiment Parameters: parameters of one fuzzy vault experiment passed explicitly instead of read from Constants
+
+    Parameters are split by the stage of the pipeline they affect:
+    - enrollment: polynomial degree, amount of minutiae and chaff points, distance of points (vault generation)
+    - verification: thresholds of geometric hashing (vault of same enrollment parameters can be reused)
+"""
+
+import Constants
+
+
+class ExperimentParameters:
+    # parameters affecting vault generation (and verification)
+    ENROLLMENT = ('poly_degree', 'minutiae_points_amount', 'chaff_points_amount', 'points_distance')
+    # parameters only affecting verification
+    VERIFICATION = ('x_threshold', 'y_threshold', 'theta_threshold', 'total_threshold', 'basis_theta_threshold',
+                    'match_threshold')
+    __slots__ = ENROLLMENT + VERIFICATION
+
+    def __init__(self, poly_degree, minutiae_points_amount, chaff_points_amount, points_distance, x_threshold,
+                 y_threshold, theta_threshold, total_threshold, basis_theta_threshold, match_threshold=None):
+        """
+        :param match_threshold: minimal amount of matching minutiae in geometric hashing, poly_degree + 1 if None
+        """
+        self.poly_degree = poly_degree
+        self.minutiae_points_amount = minutiae_points_amount
+        self.chaff_points_amount = chaff_points_amount
+        self.points_distance = points_distance
+        self.x_threshold = x_threshold
+        self.y_threshold = y_threshold
+        self.theta_threshold = theta_threshold
+        self.total_threshold = total_threshold
+        self.basis_theta_threshold = basis_theta_threshold
+        self.match_threshold = match_threshold if match_threshold is not None else poly_degree + 1
+
+    def __repr__(self):
+        return '{}({})'.format(self.__class__.__name__, ', '.join(
+            '{}={}'.format(name, getattr(self, name)) for name in self.__slots__))
+
+    def __eq__(self, other):
+        return isinstance(other, ExperimentParameters) and self.to_dict() == other.to_dict()
+
+    def __hash__(self):
+        return hash(tuple(self.to_dict().items()))
+
+    @staticmethod
+    def from_constants():
+        """ :returns ExperimentParameters with current values of Constants """
+        return ExperimentParameters(Constants.POLY_DEGREE, Constants.MINUTIAE_POINTS_AMOUNT,
+                                    Constants.CHAFF_POINTS_AMOUNT, Constants.POINTS_DISTANCE, Constants.X_THRESHOLD,
+                                    Constants.Y_THRESHOLD, Constants.THETA_THRESHOLD, Constants.TOTAL_THRESHOLD,
+                                    Constants.BASIS_THETA_THRESHOLD, Constants.MATCH_THRESHOLD)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def replace(self, **changes):
+        """ :returns copy with changed parameters (match_threshold follows poly_degree if it is not changed itself
+            and was poly_degree + 1) """
+        parameters = self.to_dict()
+        if 'poly_degree' in changes and 'match_threshold' not in changes and \
+                self.match_threshold == self.poly_degree + 1:
+            parameters['match_threshold'] = None
+        for name, value in changes.items():
+            if name not in parameters:
+                raise ValueError('Unknown experiment parameter {}'.format(name))
+            parameters[name] = value
+        return ExperimentParameters(**parameters)
+
+    def enrollment_key(self):
+        """ :returns tuple of enrollment parameters, vaults can be shared by parameters with same key """
+        return tuple(getattr(self, name) for name in self.ENROLLMENT)
+
+    def thresholds_str(self):
+        """ :returns thresholds as logged in parameter log (points distance/[x/y/theta/total]/basis theta) """
+        return '({}/[{}/{}/{}/{}]/{})'.format(self.points_distance, self.x_threshold, self.y_threshold,
+                                              self.theta_threshold, self.total_threshold, self.basis_theta_threshold)
@@ -8,6 +8,8 @@ from sympy.polys.domains import ZZ
 from sympy.polys.galoistools import (gf_irreducible_p, gf_add, gf_sub, gf_mul, gf_rem, gf_gcdex)
 from sympy.ntheory.primetest import isprime
 
+from Galois.Galois_Converter import GaloisConverter
+
 
 class GF:
     def __init__(self, p, n=1):
@@ -18,6 +20,8 @@ class GF:
             raise ValueError("n must be a positive integer, not %s" % n)
         self.p = p
         self.n = n
+        self.zero = []
+        self.one = [1]
         if n == 1:
             self.reducing = [1, 0]
         else:
@@ -46,3 +50,11 @@ class GF:
             val = self.mul(val, point)
             val = self.add(val, c)
         return val
+
+    def element_from_int(self, x):
+        """ Converts int to element of this field in the form of [1,0,0,0] """
+        return GaloisConverter.convert_int_to_element_in_gf_2(x, self.n)
+
+    def element_to_int(self, element):
+        """ Converts element of this field in the form of [1,0,0,0] to int """
+        return GaloisConverter.convert_gf_2_element_to_int(element, self.n)
@@ -0,0 +1,32 @@
+"""
+    Factory to choose the implementation (backend) of the Galois Field used for polynomial arithmetic
+    - 'sympy': Galois_Field.GF, elements are lists of coefficients and arithmetic is done by sympy
+    - 'int': Galois_Field_Int.GFInt, elements are integers and arithmetic is done with carry-less operations
+"""
+
+from Galois.Galois_Field import GF
+from Galois.Galois_Field_Int import GFInt
+
+
+class GaloisFieldFactory:
+    BACKEND_SYMPY = 'sympy'
+    BACKEND_INT = 'int'
+    BACKENDS = {BACKEND_SYMPY: GF, BACKEND_INT: GFInt}
+
+    # fields are immutable after creation, so one instance per (backend, p, n) is shared
+    fields = dict()
+
+    @staticmethod
+    def create_field(p, n, backend):
+        """ Creates (or reuses) Galois Field GF(p**n) of the given backend
+            :param p: characteristic of the field
+            :param n: exponential of the field (p**n)
+            :param backend: 'sympy' or 'int'
+            :returns Galois Field with add/sub/mul/inv/eval_poly and element_from_int/element_to_int """
+        if backend not in GaloisFieldFactory.BACKENDS:
+            raise ValueError('Unknown Galois Field backend {}, choose one of {}'.format(
+                backend, list(GaloisFieldFactory.BACKENDS.keys())))
+        key = (backend, p, n)
+        if key not in GaloisFieldFactory.fields:
+            GaloisFieldFactory.fields[key] = GaloisFieldFactory.BACKENDS[backend](p, n)
+        return GaloisFieldFactory.fields[key]
@@ -0,0 +1,216 @@
+"""
+    Galois Field GF(2**n) with elements represented as plain integers
+    Bit i of the integer is the coefficient of x**i, so the integer value of an element is the same as the one
+    produced by GaloisConverter from the list representation of Galois_Field.GF
+
+    The field uses the same reducing polynomial as Galois_Field.GF (smallest irreducible polynomial of degree n),
+    therefore both implementations produce identical results and can be exchanged
+
+    Array versions of the arithmetic work on numpy arrays of elements (uint32) with vectorized shift/xor kernels
+"""
+
+import numpy as np
+
+
+class GFInt:
+    # bits of the multiplier that are processed at once in the carry-less multiplication
+    WINDOW_BITS = 4
+    # bits of the overflow that are reduced at once with the reduction table
+    REDUCTION_BITS = 8
+
+    def __init__(self, p, n=1):
+        p, n = int(p), int(n)
+        if p != 2:
+            raise ValueError("p must be 2 for integer represented Galois Fields, not %s" % p)
+        if n <= 0:
+            raise ValueError("n must be a positive integer, not %s" % n)
+        self.p = p
+        self.n = n
+        self.zero = 0
+        self.one = 1
+        self.mask = (1 << n) - 1
+        self.reducing = self.find_reducing_polynomial(n)
+        # x**n is congruent to reducing_low, so every overflow bit above degree n can be folded back with it
+        self.reducing_low = self.reducing & self.mask
+        # reduction_table[b] is the carry-less product of b with reducing_low
+        self.reduction_table = [self.clmul(b, self.reducing_low) for b in range(1 << self.REDUCTION_BITS)]
+
+    @staticmethod
+    def clmul(x, y):
+        """ Carry-less multiplication of two polynomials over GF(2) represented as int """
+        result = 0
+        while y:
+            if y & 1:
+                result ^= x
+            x <<= 1
+            y >>= 1
+        return result
+
+    @staticmethod
+    def clmod(x, f):
+        """ Remainder of carry-less division of x by f (polynomials over GF(2) represented as int) """
+        f_len = f.bit_length()
+        while x.bit_length() >= f_len:
+            x ^= f << (x.bit_length() - f_len)
+        return x
+
+    @staticmethod
+    def is_irreducible(f):
+        """ Ben-Or irreducibility test of polynomial f over GF(2) represented as int
+            f is irreducible if gcd(x**(2**i) - x mod f, f) = 1 for all 1 <= i <= deg(f) / 2 """
+        n = f.bit_length() - 1
+        x_power = 2
+        for _ in range(n // 2):
+            # square x_power modulo f
+            x_power = GFInt.clmod(GFInt.clmul(x_power, x_power), f)
+            a, b = f, x_power ^ 2
+            while b:
+                a, b = b, GFInt.clmod(a, b)
+            if a != 1:
+                return False
+        return True
+
+    @staticmethod
+    def find_reducing_polynomial(n):
+        """ Smallest irreducible polynomial of degree n, the same one that is chosen by Galois_Field.GF
+            :returns reducing polynomial as int including the leading x**n """
+        for c in range(1 << n):
+            poly = (1 << n) | c
+            if GFInt.is_irreducible(poly):
+                return poly
+        raise ValueError("No irreducible polynomial of degree %d found" % n)
+
+    def window_table(self, x):
+        """ Precomputes carry-less products of x with all values of WINDOW_BITS bits
+            :returns list of products, index is the multiplier """
+        table = [0] * (1 << self.WINDOW_BITS)
+        for i in range(1, len(table)):
+            table[i] = table[i >> 1] << 1 if not i & 1 else table[i - 1] ^ x
+        return table
+
+    def reduce(self, x):
+        """ Reduces product x of two field elements modulo the reducing polynomial """
+        # class attributes are bound to locals as this is the innermost loop of all field operations
+        n, mask, table = self.n, self.mask, self.reduction_table
+        bits = self.REDUCTION_BITS
+        table_mask = len(table) - 1
+        high = x >> n
+        while high:
+            folded = table[high & table_mask]
+            high >>= bits
+            shift = bits
+            while high:
+                folded ^= table[high & table_mask] << shift
+                high >>= bits
+                shift += bits
+            x = (x & mask) ^ folded
+            high = x >> n
+        return x
+
+    def mul_table(self, table, y):
+        """ Multiplies the element of the precomputed window table with y """
+        bits = self.WINDOW_BITS
+        window_mask = len(table) - 1
+        result = 0
+        shift = 0
+        while y:
+            result ^= table[y & window_mask] << shift
+            y >>= bits
+            shift += bits
+        return self.reduce(result)
+
+    def add(self, x, y):
+        return x ^ y
+
+    def sub(self, x, y):
+        return x ^ y
+
+    def mul(self, x, y):
+        if not x or not y:
+            return 0
+        return self.mul_table(self.window_table(x), y)
+
+    def inv(self, x):
+        """ Inverse of x with the extended Euclidean algorithm on the int polynomials """
+        if not x:
+            raise ZeroDivisionError("0 has no inverse in GF(2**%d)" % self.n)
+        u, v = x, self.reducing
+        g1, g2 = 1, 0
+        while u != 1:
+            shift = u.bit_length() - v.bit_length()
+            if shift < 0:
+                u, v = v, u
+                g1, g2 = g2, g1
+                shift = -shift
+            u ^= v << shift
+            g1 ^= g2 << shift
+        return g1
+
+    def eval_poly(self, poly, point):
+        """ Evaluates polynomial (list of coefficients, highest degree first) at point with Horner's method """
+        table = self.window_table(point)
+        val = 0
+        for c in poly:
+            val = self.mul_table(table, val) ^ c
+        return val
+
+    def element_from_int(self, x):
+        """ Converts int to element of this field (the int itself, reduced if it is exactly 2**n) """
+        if x > 2 ** self.n:
+            raise ValueError('Integer %d is bigger than can be encoded in GF(2**%d)!' % (x, self.n))
+        return self.reduce(x)
+
+    def element_to_int(self, element):
+        """ Converts element of this field to int (the element itself) """
+        return element
+
+    def reduce_array(self, x):
+        """ Reduces array of products (uint64) modulo the reducing polynomial
+            :returns reduced array as uint64 """
+        n = np.uint64(self.n)
+        mask = np.uint64(self.mask)
+        low_bits = [np.uint64(i) for i in range(self.n) if self.reducing_low >> i & 1]
+        high = x >> n
+        while high.any():
+            x = x & mask
+            for bit in low_bits:
+                x ^= high << bit
+            high = x >> n
+        return x
+
+    def mul_array_bits(self, x, y_bits):
+        """ Multiplies array x with array y given as list of its bits (see array_bits)
+            :returns array of products as uint64 """
+        product = np.zeros(len(x), dtype=np.uint64)
+        for i, bit in enumerate(y_bits):
+            product ^= (x << np.uint64(i)) * bit
+        return self.reduce_array(product)
+
+    def array_bits(self, y):
+        """ Splits array y into n arrays of its bits (0 or 1), lowest bit first """
+        y = np.asarray(y, dtype=np.uint64)
+        return [(y >> np.uint64(i)) & np.uint64(1) for i in range(self.n)]
+
+    def mul_array(self, x, y):
+        """ Multiplies arrays of field elements elementwise
+            :returns array of products as uint32 """
+        self.check_array_support()
+        x = np.asarray(x, dtype=np.uint64)
+        return self.mul_array_bits(x, self.array_bits(y)).astype(np.uint32)
+
+    def eval_poly_array(self, poly, points):
+        """ Evaluates polynomial (list of coefficients, highest degree first) at all points with Horner's method
+            :param poly: list of coefficients as int
+            :param points: array of field elements
+            :returns array of function values as uint32 """
+        self.check_array_support()
+        points_bits = self.array_bits(points)
+        val = np.zeros(len(points_bits[0]), dtype=np.uint64)
+        for c in poly:
+            val = self.mul_array_bits(val, points_bits) ^ np.uint64(c)
+        return val.astype(np.uint32)
+
+    def check_array_support(self):
+        """ Products of two elements need to fit into uint64 for the array kernels """
+        if self.n > 32:
+            raise ValueError('Array arithmetic is only supported up to GF(2**32), not GF(2**%d)' % self.n)
@@ -0,0 +1,51 @@
+"""
+    Incremental interpolation over a Galois Field: replacing one point of the interpolated subset costs O(k) field
+    operations instead of the O(k**2) of a new interpolation
+
+    Newton's form adds point (b, y_b) to polynomial P interpolating the nodes S as P + c * w(x) with the node polynomial
+    w(x) = prod (x - s) for s in S and c = (y_b - P(b)) / w(b). Replacing node a by b works the same way with
+    w(x) / (x - a), which vanishes on all remaining nodes and is obtained from w by synthetic division.
+    Polynomials are represented by list of coefficients, highest degrees first (same as PolyRing)
+"""
+
+from Galois.Lagrange_Interpolator import LagrangeInterpolator
+
+
+class IncrementalInterpolator:
+    def __init__(self, field):
+        """
+        :param field: Galois Field (Galois_Field.GF or Galois_Field_Int.GFInt)
+        """
+        self.K = field
+        self.interpolator = LagrangeInterpolator(field)
+        # polynomial interpolating the current nodes
+        self.poly = []
+        # node polynomial prod (x - x_i) of the current nodes
+        self.nodes_poly = []
+
+    def reset(self, X, Y):
+        """ Interpolates polynomial on points from scratch
+            :param X: x-coordinates of points as field elements (pairwise distinct)
+            :param Y: y-coordinates of points as field elements
+            :returns polynomial with len(X) coefficients in form of field elements """
+        self.poly = self.interpolator.interpolate(X, Y)
+        self.nodes_poly = self.interpolator.master_polynomial(X)
+        return self.poly
+
+    def swap(self, x_old, x_new, y_new):
+        """ Replaces node x_old of the interpolated points by point (x_new, y_new) in O(k)
+            :param x_old: x-coordinate of current node that is removed as field element
+            :param x_new: x-coordinate of new point as field element (different from all remaining nodes)
+            :param y_new: y-coordinate of new point as field element
+            :returns polynomial interpolating the new points """
+        K = self.K
+        # vanishes on all remaining nodes, has degree k - 1
+        remaining_poly = self.interpolator.synthetic_division(self.nodes_poly, x_old)
+        factor = K.mul(K.sub(y_new, K.eval_poly(self.poly, x_new)), K.inv(K.eval_poly(remaining_poly, x_new)))
+        self.poly = [K.add(c, K.mul(factor, r)) for c, r in zip(self.poly, remaining_poly)]
+        # multiply remaining node polynomial with (x - x_new)
+        nodes_poly = remaining_poly + [K.zero]
+        for i, c in enumerate(remaining_poly, 1):
+            nodes_poly[i] = K.sub(nodes_poly[i], K.mul(x_new, c))
+        self.nodes_poly = nodes_poly
+        return self.poly
@@ -0,0 +1,78 @@
+"""
+    Lagrange interpolation over a Galois Field in O(k**2) field operations for k points
+
+    The master polynomial M(x) = (x - x_0)...(x - x_k-1) is built once, every basis numerator M(x) / (x - x_j) is
+    derived from it with synthetic division and all denominators are inverted together with Montgomery's batch
+    inversion, so there is only one field inversion per interpolation.
+    Polynomials are represented by list of coefficients, highest degrees first (same as PolyRing)
+"""
+
+
+class LagrangeInterpolator:
+    def __init__(self, field):
+        """
+        :param field: Galois Field (Galois_Field.GF or Galois_Field_Int.GFInt)
+        """
+        self.K = field
+
+    def master_polynomial(self, X):
+        """ Computes master polynomial (x - x_0)...(x - x_k-1)
+            :param X: x-coordinates of points as field elements
+            :returns polynomial of degree len(X) """
+        K = self.K
+        master = [K.one]
+        for x in X:
+            # multiply with (x - x_i): shift by one degree and subtract x_i times the polynomial
+            shifted = master + [K.zero]
+            for i, c in enumerate(master, 1):
+                shifted[i] = K.sub(shifted[i], K.mul(x, c))
+            master = shifted
+        return master
+
+    def synthetic_division(self, poly, x):
+        """ Divides poly by (x - root) where root is a root of poly (remainder is dropped)
+            :param poly: polynomial with root x
+            :param x: root as field element
+            :returns quotient polynomial with degree one less than poly """
+        K = self.K
+        quotient = [poly[0]]
+        for c in poly[1:-1]:
+            quotient.append(K.add(c, K.mul(x, quotient[-1])))
+        return quotient
+
+    def batch_inv(self, elements):
+        """ Inverts all elements with only one field inversion (Montgomery's trick)
+            :param elements: list of non-zero field elements
+            :returns list of inverses in the same order """
+        K = self.K
+        if not elements:
+            return []
+        # prefix[i] is the product of elements[0..i]
+        prefix = [elements[0]]
+        for e in elements[1:]:
+            prefix.append(K.mul(prefix[-1], e))
+        inverse = K.inv(prefix[-1])
+        result = [K.zero] * len(elements)
+        for i in range(len(elements) - 1, 0, -1):
+            result[i] = K.mul(inverse, prefix[i - 1])
+            inverse = K.mul(inverse, elements[i])
+        result[0] = inverse
+        return result
+
+    def interpolate(self, X, Y):
+        """ Interpolates polynomial with Lagrange
+            :param X: x-coordinates of points as field elements (pairwise distinct)
+            :param Y: y-coordinates of points as field elements
+            :returns polynomial with len(X) coefficients in form of field elements """
+        K = self.K
+        master = self.master_polynomial(X)
+        numerators = [self.synthetic_division(master, x) for x in X]
+        denominators = [K.eval_poly(numerator, x) for numerator, x in zip(numerators, X)]
+        weights = self.batch_inv(denominators)
+
+        poly = [K.zero] * len(X)
+        for numerator, weight, y in zip(numerators, weights, Y):
+            factor = K.mul(y, weight)
+            for i, c in enumerate(numerator):
+                poly[i] = K.add(poly[i], K.mul(factor, c))
+        return poly
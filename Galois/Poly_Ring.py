@@ -11,17 +11,49 @@ class PolyRing:
         self.K = field
 
     def add(self, p, q):
-        s = [self.K.add(x, y) for x, y in itertools.zip_longest(p[::-1], q[::-1], fillvalue=[])]
+        s = [self.K.add(x, y) for x, y in itertools.zip_longest(p[::-1], q[::-1], fillvalue=self.K.zero)]
         return s[::-1]
 
     def sub(self, p, q):
-        s = [self.K.sub(x, y) for x, y in itertools.zip_longest(p[::-1], q[::-1], fillvalue=[])]
+        s = [self.K.sub(x, y) for x, y in itertools.zip_longest(p[::-1], q[::-1], fillvalue=self.K.zero)]
         return s[::-1]
 
     def mul(self, p, q):
         if len(p) < len(q):
             p, q = q, p
-        s = [[]]
+        s = [self.K.zero]
         for j, c in enumerate(q):
-            s = self.add(s, [self.K.mul(b, c) for b in p] + [[]] * (len(q) - j - 1))
+            s = self.add(s, [self.K.mul(b, c) for b in p] + [self.K.zero] * (len(q) - j - 1))
         return s
+
+    def strip(self, p):
+        """ Removes leading zero coefficients, the zero polynomial is [zero] """
+        for i, c in enumerate(p):
+            if self.K.element_to_int(c) != 0:
+                return p[i:]
+        return [self.K.zero]
+
+    def degree(self, p):
+        """ Degree of polynomial, -1 for the zero polynomial """
+        p = self.strip(p)
+        if len(p) == 1 and self.K.element_to_int(p[0]) == 0:
+            return -1
+        return len(p) - 1
+
+    def divmod(self, p, q):
+        """ Polynomial long division
+            :returns quotient and remainder as tuple """
+        p, q = self.strip(p), self.strip(q)
+        if self.degree(q) < 0:
+            raise ZeroDivisionError('Polynomial division by zero polynomial')
+        if len(p) < len(q):
+            return [self.K.zero], p
+        lead_inv = self.K.inv(q[0])
+        remainder = list(p)
+        quotient = []
+        for i in range(len(p) - len(q) + 1):
+            c = self.K.mul(remainder[i], lead_inv)
+            quotient.append(c)
+            for j in range(1, len(q)):
+                remainder[i + j] = self.K.sub(remainder[i + j], self.K.mul(c, q[j]))
+        return quotient, self.strip(remainder[len(p) - len(q) + 1:])
@@ -0,0 +1,49 @@
+"""
+    Reed-Solomon decoder by Gao ("A New Algorithm for Decoding Reed-Solomon Codes", 2003)
+
+    The points of a vault that lie on the secret polynomial form a Reed-Solomon codeword, chaff points among the
+    candidate points are errors. Gao's algorithm recovers the polynomial of degree < k from n points in one pass
+    as long as at most (n - k) / 2 of the points are not on the polynomial (unique decoding).
+    Polynomials are represented by list of coefficients, highest degrees first (same as PolyRing)
+"""
+
+from Galois.Poly_Ring import PolyRing
+from Galois.Lagrange_Interpolator import LagrangeInterpolator
+
+
+class GaoDecoder:
+    def __init__(self, field):
+        """
+        :param field: Galois Field (Galois_Field.GF or Galois_Field_Int.GFInt)
+        """
+        self.K = field
+        self.R = PolyRing(field)
+        self.interpolator = LagrangeInterpolator(field)
+
+    def decode(self, X, Y, k):
+        """ Decodes polynomial of degree < k from points
+            :param X: x-coordinates of points as field elements (pairwise distinct)
+            :param Y: y-coordinates of points as field elements
+            :param k: number of coefficients of the polynomial (degree + 1)
+            :returns polynomial with k coefficients in form of field elements or None if decoding failed """
+        R = self.R
+        n = len(X)
+        if n < k:
+            return None
+        # g0 vanishes at all points, g1 interpolates all points (including errors)
+        g0 = self.interpolator.master_polynomial(X)
+        g1 = R.strip(self.interpolator.interpolate(X, Y))
+
+        # partial extended Euclidean algorithm on g0 and g1 until remainder has degree < (n + k) / 2
+        r_prev, r = g0, g1
+        v_prev, v = [self.K.zero], [self.K.one]
+        while 2 * R.degree(r) >= n + k:
+            q, remainder = R.divmod(r_prev, r)
+            r_prev, r = r, remainder
+            v_prev, v = v, R.sub(v_prev, R.mul(q, v))
+
+        # error locator v divides the remainder if the amount of errors is correctable
+        f, remainder = R.divmod(r, v)
+        if R.degree(remainder) >= 0 or R.degree(f) >= k:
+            return None
+        return [self.K.zero] * (k - len(f)) + f
@@ -1,12 +1,26 @@
 """
     Transformer for geometric hashing
+
+    Minutiae sets are transformed to all bases at once as numpy arrays: a set of N minutiae is an (N, 3) array of
+    (x, y, theta) and its transformation to B bases an (B, N, 3) array. Elements of the geometric hashing tables are
+    views into these arrays, MinutiaNBIS_GH objects are only created on demand
 """
 
 import math
+import threading
+
+import numpy as np
+
 from Minutia import MinutiaNBIS_GH
 from Minutia_Converter import MinutiaConverter
 
 
+# transformed coordinates are within MinutiaNBIS_GH boundaries (+-791) and fit into int16
+GH_DTYPE = np.int16
+# guards creation of hash tables of enrollment elements, which are shared by threads verifying the same vault
+HASH_TABLE_LOCK = threading.Lock()
+
+
 class GHTransformer:
     @staticmethod
     def generate_enrollment_table(vault_element_pairs):
@@ -28,20 +42,24 @@ class GHTransformer:
             function_points.append(element.y_rep)
 
         assert len(minutiae_list) == len(vault_element_pairs)
-        for basis in minutiae_list:
+        minutiae_array = GHTransformer.minutiae_to_array(minutiae_list)
+        transformed_minutiae = GHTransformer.transform_minutiae_array(minutiae_array, minutiae_array)
+        for basis, transformed_minutiae_basis in zip(minutiae_list, transformed_minutiae):
             # Indices of minutiae_list in GHElementEnrollment is the same as vault_element_pairs
-            geom_table.append(GHElementEnrollment(basis, minutiae_list, function_points))
+            geom_table.append(GHElementEnrollment(basis, minutiae_list, function_points,
+                                                  transformed_minutiae=transformed_minutiae_basis))
         return geom_table
 
     @staticmethod
-    def generate_verification_table_element(basis, minutiae_list):
+    def generate_verification_table_element(basis, minutiae_list, transformed_minutiae=None):
         """
         generate verification table element from probe minutiae and basis
         :param basis: basis to transform probe minutiae to
         :param minutiae_list: list of minutiae (Minutia_NBIS_GH)
+        :param transformed_minutiae: minutiae_list already transformed to basis as (N, 3) array or None
         :return: verification table element
         """
-        return GHElementVerification(basis, minutiae_list)
+        return GHElementVerification(basis, minutiae_list, transformed_minutiae)
 
     @staticmethod
     def convert_list_to_MinutiaNBIS_GH(minutiae_list):
@@ -74,6 +92,36 @@ class GHTransformer:
 
         return MinutiaNBIS_GH(x_transformed, y_transformed, theta_transformed)
 
+    @staticmethod
+    def minutiae_to_array(minutiae_list):
+        """
+        converts list of minutiae to array
+        :param minutiae_list: list of MinutiaNBIS_GH
+        :return: (N, 3) array of (x, y, theta)
+        """
+        return np.array([(m.x, m.y, m.theta) for m in minutiae_list], dtype=GH_DTYPE).reshape(-1, 3)
+
+    @staticmethod
+    def transform_minutiae_array(bases, minutiae):
+        """
+        transforms all minutiae to every basis at once, with the same results as transform_minutia_to_basis
+        (cos and sin are taken from math for every basis and numpy rounds half to even like round)
+        :param bases: (B, 3) array of bases
+        :param minutiae: (N, 3) array of minutiae
+        :return: (B, N, 3) array, [b, i] is minutia i transformed to basis b
+        """
+        cos_basis_theta = np.array([math.cos(math.radians(theta)) for theta in bases[:, 2].tolist()])[:, None]
+        sin_basis_theta = np.array([math.sin(math.radians(theta)) for theta in bases[:, 2].tolist()])[:, None]
+        x_diff = (minutiae[None, :, 0].astype(np.int64) - bases[:, None, 0]).astype(np.float64)
+        y_diff = (minutiae[None, :, 1].astype(np.int64) - bases[:, None, 1]).astype(np.float64)
+        theta_diff = minutiae[None, :, 2].astype(np.int64) - bases[:, None, 2]
+
+        transformed = np.empty((len(bases), len(minutiae), 3), dtype=GH_DTYPE)
+        transformed[:, :, 0] = np.rint(x_diff * cos_basis_theta + y_diff * sin_basis_theta)
+        transformed[:, :, 1] = np.rint(-x_diff * sin_basis_theta + y_diff * cos_basis_theta)
+        transformed[:, :, 2] = np.where(theta_diff >= 0, theta_diff, theta_diff + 360)
+        return transformed
+
     @staticmethod
     def transform_minutiae_to_basis(basis, minutiae_list):
         """
@@ -88,15 +136,71 @@ class GHTransformer:
         return transformed_minutiae_list
 
 
+class GHThetaIndex:
+    """ Index of the bases of a geometric hashing table sorted by orientation """
+    __slots__ = ('order', 'thetas')
+
+    def __init__(self, order, thetas):
+        """
+        :param order: indices of elements in geometric hashing table sorted by orientation of their basis
+        :param thetas: sorted orientations of bases (0 <= theta < 360), thetas[i] belongs to element order[i]
+        """
+        self.order = np.asarray(order, dtype=np.int32)
+        self.thetas = np.asarray(thetas, dtype=GH_DTYPE)
+
+    @staticmethod
+    def from_geom_table(geom_table):
+        """
+        create index of geometric hashing table
+        :param geom_table: list of GHElementEnrollment
+        :return: GHThetaIndex
+        """
+        thetas = np.array([element.basis.theta % 360 for element in geom_table], dtype=GH_DTYPE)
+        order = np.argsort(thetas, kind='stable')
+        return GHThetaIndex(order, thetas[order])
+
+    def query(self, theta, threshold):
+        """
+        range query for bases with orientation within threshold of theta (wrapping around at 360 degrees)
+        :param theta: orientation in degrees
+        :param threshold: maximal difference of orientation in degrees
+        :return: ascending array of indices in geometric hashing table
+        """
+        if threshold >= 180:
+            return np.arange(len(self.order))
+        theta %= 360
+        low, high = theta - threshold, theta + threshold
+        if low < 0:
+            ranges = [(0, high), (low + 360, 359)]
+        elif high >= 360:
+            ranges = [(0, high - 360), (low, 359)]
+        else:
+            ranges = [(low, high)]
+        indices = [self.order[np.searchsorted(self.thetas, range_low, side='left'):
+                              np.searchsorted(self.thetas, range_high, side='right')]
+                   for range_low, range_high in ranges]
+        return np.sort(np.concatenate(indices))
+
+    def __len__(self):
+        return len(self.order)
+
+
 class GHElementEnrollment:
     """ Element of geometric hash table for enrollment using vault """
-    def __init__(self, basis, minutiae_list, function_points, save_to_db=False):
+    def __init__(self, basis, minutiae_list, function_points, save_to_db=False, transformed_minutiae=None):
         """
         :param basis: Minutia used as basis as MinutiaNBIS_GH
         :param minutiae_list: list of MinutiaNBIS_GH
+        :param transformed_minutiae: minutiae_list already transformed to basis as (N, 3) array
+        (e.g. view of GHTransformer.transform_minutiae_array), transformed here if None
         """
         self.basis = basis
-        self.transformed_minutiae_list = GHTransformer.transform_minutiae_to_basis(self.basis, minutiae_list)
+        if transformed_minutiae is None:
+            transformed_minutiae = GHTransformer.transform_minutiae_array(
+                GHTransformer.minutiae_to_array([basis]), GHTransformer.minutiae_to_array(minutiae_list))[0]
+        self.transformed_minutiae = transformed_minutiae
+        # hash tables of transformed minutiae, one for every bucket size (see get_hash_table)
+        self.hash_tables = {}
 
         if save_to_db:
             # representations to store in DB
@@ -107,13 +211,50 @@ class GHElementEnrollment:
                 self.minutiae_rep.append(m_conv.get_uint_from_minutia(m, non_negative=False))
             self.function_points_rep = function_points
 
+    @property
+    def transformed_minutiae_list(self):
+        """ transformed minutiae as list of MinutiaNBIS_GH (created on every access) """
+        return [MinutiaNBIS_GH(x, y, theta) for x, y, theta in self.transformed_minutiae.tolist()]
+
+    def get_transformed_minutia(self, i):
+        """ transformed minutia with index i as MinutiaNBIS_GH """
+        x, y, theta = self.transformed_minutiae[i].tolist()
+        return MinutiaNBIS_GH(x, y, theta)
+
+    def get_hash_table(self, x_bucket, y_bucket, theta_bucket):
+        """
+        hash table of transformed minutiae quantized to buckets of the given size,
+        created once for every bucket size and cached (thread-safe, tables are created under HASH_TABLE_LOCK
+        and never changed afterwards)
+        :param x_bucket: bucket size of x
+        :param y_bucket: bucket size of y
+        :param theta_bucket: bucket size of theta
+        :return: dict with key (x bucket, y bucket, theta bucket) and value list of tuples
+        (index, transformed minutia as MinutiaNBIS_GH)
+        """
+        bucket_size = (x_bucket, y_bucket, theta_bucket)
+        hash_table = self.hash_tables.get(bucket_size)
+        if hash_table is not None:
+            return hash_table
+        with HASH_TABLE_LOCK:
+            # another thread may have created the table while waiting for the lock
+            hash_table = self.hash_tables.get(bucket_size)
+            if hash_table is None:
+                hash_table = {}
+                for i, (x, y, theta) in enumerate(self.transformed_minutiae.tolist()):
+                    hash_table.setdefault((x // x_bucket, y // y_bucket, theta // theta_bucket), []).append(
+                        (i, MinutiaNBIS_GH(x, y, theta)))
+                # table is only published when it is complete
+                self.hash_tables[bucket_size] = hash_table
+        return hash_table
+
     def __str__(self):
         return '(Basis:\n' \
             'x = {}\n' \
             'y = {}\n' \
             'theta = {}\n' \
             '#Minutiae:' \
-            '{})'.format(self.basis.x, self.basis.y, self.basis.theta, len(self.transformed_minutiae_list))
+            '{})'.format(self.basis.x, self.basis.y, self.basis.theta, len(self.transformed_minutiae))
 
     def __repr__(self):
         return '{}(Basis: ({}, {}, {}))'.format(
@@ -123,13 +264,23 @@ class GHElementEnrollment:
 
 class GHElementVerification:
     """ Element of geometric hash table for verification using probe fingerprint """
-    def __init__(self, basis, minutiae_list):
+    def __init__(self, basis, minutiae_list, transformed_minutiae=None):
         """
         :param basis: Minutia used as basis as MinutiaNBIS_GH
         :param minutiae_list: list of MinutiaNBIS_GH
+        :param transformed_minutiae: minutiae_list already transformed to basis as (N, 3) array
+        (e.g. view of GHTransformer.transform_minutiae_array), transformed here if None
         """
         self.basis = basis
-        self.transformed_minutiae_list = GHTransformer.transform_minutiae_to_basis(self.basis, minutiae_list)
+        if transformed_minutiae is None:
+            transformed_minutiae = GHTransformer.transform_minutiae_array(
+                GHTransformer.minutiae_to_array([basis]), GHTransformer.minutiae_to_array(minutiae_list))[0]
+        self.transformed_minutiae = transformed_minutiae
+
+    @property
+    def transformed_minutiae_list(self):
+        """ transformed minutiae as list of MinutiaNBIS_GH (created on every access) """
+        return [MinutiaNBIS_GH(x, y, theta) for x, y, theta in self.transformed_minutiae.tolist()]
 
     def __str__(self):
         return '(Basis:\n' \
@@ -137,7 +288,7 @@ class GHElementVerification:
                'y = {}\n' \
                'theta = {}\n' \
                '#Minutiae:' \
-               '{})'.format(self.basis.x, self.basis.y, self.basis.theta, len(self.transformed_minutiae_list))
+               '{})'.format(self.basis.x, self.basis.y, self.basis.theta, len(self.transformed_minutiae))
 
     def __repr__(self):
         return '{}(Basis: ({}, {}, {}))'.format(
@@ -1,25 +1,34 @@
+import multiprocessing
 import random
 import time
 import datetime
 import os
 import sys
-import copy
 from itertools import combinations
 from shutil import copyfile
 
 from Chaff_Points_Generator import ChaffPointsGenerator
+from Database_Runner import DatabaseRunner, RunJournal
+from Experiment_Parameters import ExperimentParameters
+from Create_Log_Summary import create_log_summary
 from Constants import XYT_GALLERY, XYT_PROBE, DATABASE_2B_PATH, \
-    GF_2_M, CRC_LENGTH, POINTS_DISTANCE, \
+    GF_2_M, CRC_LENGTH, \
     SAVE_VAULT_TO_DB, GET_VAULT_FROM_DB, FINGER_END, FINGER_START, CAPTURE_END, CAPTURE_START, \
     DATABASE_2A_FLAG, DATABASE_2A_PATH, SPLIT_COMPUTATION, ONE_TO_ONE_FVC_PROTOCOL
 import Constants
 from Minutia_Converter import MinutiaConverter
-from Minutiae_Extractor import MinutiaeExtractor
+from Parameter_Sweep import ParameterSweep
 from Polynomial_Generator import PolynomialGenerator
-from Vault import Vault
+from Template_Store import TemplateStore
+from Vault import Vault, CompactVault
+from Vault_Identifier import VaultIdentifier
 from Vault_Verifier import VaultVerifier
+from Work_Coordinator import WorkCoordinator
 from DBHandler import DBHandler
 
+# templates are parsed once and shared by all experiments (gallery and probe templates are read many times)
+template_store = TemplateStore(Constants.TEMPLATE_CACHE_FOLDER)
+
 
 def main():
     """
@@ -27,7 +36,35 @@ def main():
     1st parameter:
         - 0: run whole database
         - x: where x > 0, run that many iterations of main algorithm
+        - identify: search probe (2nd parameter, .xyt path) in all vaults stored in the database of DBHandler
+        - coordinator: run whole database with workers sharing a work directory (2nd parameter, WORK_DIR of Constants
+          if omitted), 3rd parameter is the amount of workers started by the coordinator (0 if omitted)
+        - worker: run work units of coordinator with work directory (2nd parameter, WORK_DIR of Constants if omitted)
+        - sweep: run whole database for all parameter sets of SWEEP_GRID of Constants (2nd parameter is the amount of
+          processes, DB_RUNNER_WORKERS of Constants if omitted)
     """
+    if DATABASE_2A_FLAG:
+        database_path = DATABASE_2A_PATH
+    else:
+        database_path = DATABASE_2B_PATH
+
+    if len(sys.argv) == 3 and sys.argv[1] == 'identify':
+        db_handler = DBHandler()
+        run_identification(sys.argv[2], db_handler.find_all_fuzzy_vaults(compact=True), echo=True)
+        db_handler.close_handler()
+        return
+    if len(sys.argv) in (2, 3, 4) and sys.argv[1] == 'coordinator':
+        run_coordinator(database_path, sys.argv[2] if len(sys.argv) >= 3 else Constants.WORK_DIR,
+                        int(sys.argv[3]) if len(sys.argv) == 4 else 0, echo=True)
+        return
+    if len(sys.argv) in (2, 3) and sys.argv[1] == 'worker':
+        run_worker(sys.argv[2] if len(sys.argv) == 3 else Constants.WORK_DIR, echo=True)
+        return
+    if len(sys.argv) in (2, 3) and sys.argv[1] == 'sweep':
+        run_parameter_sweep(database_path, Constants.SWEEP_GRID,
+                            int(sys.argv[2]) if len(sys.argv) == 3 else max(Constants.DB_RUNNER_WORKERS, 1), echo=True)
+        return
+
     if not len(sys.argv) == 2:
         print("False amount of arguments detected. Please provide ONE running parameter as integer.")
         exit(-1)
@@ -42,11 +79,6 @@ def main():
 
     assert iteration >= 0
 
-    if DATABASE_2A_FLAG:
-        database_path = DATABASE_2A_PATH
-    else:
-        database_path = DATABASE_2B_PATH
-
     if iteration == 0:
         # run whole database
         for _ in range(1, Constants.RUN_DB_ITERATIONS + 1):
@@ -116,22 +148,11 @@ def run_over_database(database_path, echo=True):
     :param database_path: path to folder of fingerprint templates
     :param echo: print intermediate messages to console
     """
+    if Constants.DB_RUNNER_WORKERS:
+        run_over_database_parallel(database_path, Constants.DB_RUNNER_WORKERS, echo=echo)
+        return
 
-    def initiate_db_testing_log(log_file):
-        """ clear log file and add log header for logging database matching results """
-        if not os.path.exists('out'):
-            os.makedirs('out')
-        open(log_file, 'w+').close()
-        with open(log_file, 'a') as log:
-            log.write('gallery; capture; probe; capture; match\n')
-
-    # list all .xyt files in database
-    all_paths = os.listdir(database_path)
-    all_paths.sort()
-    all_xyt = []
-    for path in all_paths:
-        if path.endswith(".xyt"):
-            all_xyt.append(path)
+    all_xyt = list_database_xyt(database_path)
 
     if ONE_TO_ONE_FVC_PROTOCOL:
         # Create log file and initiate logs for 1vs1 and FVC protocol
@@ -145,9 +166,9 @@ def run_over_database(database_path, echo=True):
         log_fvc_db = out_folder + prefix_fvc + Constants.LOG_DB
 
         initialize_parameter_testing_log(log_one_param)
-        initiate_db_testing_log(log_one_db)
+        initialize_database_testing_log(log_one_db)
         initialize_parameter_testing_log(log_fvc_param)
-        initiate_db_testing_log(log_fvc_db)
+        initialize_database_testing_log(log_fvc_db)
 
         # FVC protocol or 1 vs 1: FMR
         # all_xyt_one contains all capture 1 of all fingers
@@ -190,7 +211,7 @@ def run_over_database(database_path, echo=True):
             log_parameter_file = Constants.LOG_FILE_PARAMETER_2A
             log_db_file = Constants.LOG_FILE_DATABASE_2A
             initialize_parameter_testing_log(log_parameter_file)
-            initiate_db_testing_log(log_db_file)
+            initialize_database_testing_log(log_db_file)
 
             # Run through whole DB with splitting on machines
             for finger in range(FINGER_START, FINGER_END):
@@ -207,7 +228,7 @@ def run_over_database(database_path, echo=True):
             log_parameter_file = Constants.LOG_FILE_PARAMETER_TESTING
             log_db_file = Constants.LOG_FILE_DATABASE_TESTING
             initialize_parameter_testing_log(log_parameter_file)
-            initiate_db_testing_log(log_db_file)
+            initialize_database_testing_log(log_db_file)
 
             # loop through whole database (folder)
             for gallery_xyt in all_xyt:
@@ -220,6 +241,168 @@ def run_over_database(database_path, echo=True):
                                               echo=echo)
 
 
+def run_over_database_parallel(database_path, workers, echo=True):
+    """
+    Run experiment over whole database with the same protocols and log files as run_over_database,
+    split into work units (one vault per gallery template, reused for all its probes) that run in parallel processes.
+    If DB_RUNNER_JOURNAL is set, finished units are recorded in the journal: a run with the same parameters and
+    templates as an interrupted run continues with the unfinished units and writes the log files of the interrupted
+    run, a run with the parameters of a finished run is skipped
+    :param database_path: path to folder of fingerprint templates
+    :param workers: amount of processes
+    :param echo: print progress to console
+    """
+    units, log_files = plan_database(database_path)
+    seed = Constants.DB_RUNNER_SEED if Constants.DB_RUNNER_SEED is not None else random.getrandbits(64)
+    journal = None
+    parameters = DatabaseRunner.get_parameters_key(database_path)
+    if Constants.DB_RUNNER_JOURNAL:
+        journal = RunJournal(Constants.DB_RUNNER_JOURNAL)
+        if journal.is_merged(parameters):
+            if echo:
+                print('Skipping parameters {}, all work units are finished according to journal'.format(parameters))
+            return
+        seed, log_files = journal.start(parameters, seed, log_files)
+
+    if echo:
+        print('Running {} pairs in {} work units with {} workers'.format(
+            sum(len(unit.probe_xyts) for unit in units), len(units), workers))
+    results = DatabaseRunner.run(units, run_experiment_reuse_vault, database_path, Constants.DB_RUNNER_SHARD_FOLDER,
+                                 workers, seed=seed, journal=journal, parameters=parameters, echo=echo)
+    # log files are only written when all units are finished
+    initialize_log_files(log_files)
+    DatabaseRunner.merge(units, results, log_files)
+    if journal is not None:
+        journal.set_merged(parameters)
+    DatabaseRunner.remove_shards(Constants.DB_RUNNER_SHARD_FOLDER, parameters)
+
+
+def run_coordinator(database_path, work_dir, local_workers=0, echo=True):
+    """
+    Run experiment over whole database with workers sharing work_dir (see Work_Coordinator): writes the plan of work
+    units, waits until all units are finished, merges the logs and creates the log summary in work_dir/logs.
+    Starting the coordinator again with the same work_dir and parameters continues an interrupted run
+    :param database_path: path to folder of fingerprint templates (has to be the same path for all workers)
+    :param work_dir: shared work directory
+    :param local_workers: amount of worker processes started on this machine
+    :param echo: print progress to console
+    :returns dict of log key: (log parameter file path, log database file path)
+    """
+    units, log_files = plan_database(database_path)
+    log_files = {key: (os.path.basename(log_parameter_file), os.path.basename(log_db_file))
+                 for key, (log_parameter_file, log_db_file) in log_files.items()}
+    seed = Constants.DB_RUNNER_SEED if Constants.DB_RUNNER_SEED is not None else random.getrandbits(64)
+    plan = WorkCoordinator.write_plan(work_dir, units, log_files, database_path, seed)
+    if echo:
+        print('Coordinating {} work units in {} with {} local workers'.format(len(units), work_dir, local_workers))
+    processes = [multiprocessing.Process(target=run_worker, args=(work_dir, False)) for _ in range(local_workers)]
+    for process in processes:
+        process.start()
+    WorkCoordinator.wait(work_dir, plan, echo=echo)
+    for process in processes:
+        process.join()
+
+    log_files = WorkCoordinator.get_log_files(work_dir, plan)
+    initialize_log_files(log_files)
+    WorkCoordinator.merge(work_dir, plan, log_files)
+    logs_folder = os.path.join(work_dir, WorkCoordinator.LOGS, '')
+    create_log_summary(logs_folder + os.path.basename(Constants.LOG_SUMMARY_PATH), logs_folder)
+    return log_files
+
+
+def run_worker(work_dir, echo=True):
+    """
+    Run work units of coordinator with work_dir until all units are finished (see Work_Coordinator)
+    :param work_dir: shared work directory
+    :param echo: print progress to console
+    """
+    units_run = WorkCoordinator.run_worker(work_dir, run_experiment_reuse_vault, echo=echo)
+    if echo:
+        print('All work units are finished, {} run by this worker'.format(units_run))
+
+
+def run_parameter_sweep(database_path, grid, workers, echo=True):
+    """
+    Run experiment over whole database for every parameter set of grid (see Parameter_Sweep) with the protocols of
+    run_over_database. Logs and log summary of every parameter set are written to SWEEP_FOLDER/set_<index>/, the
+    parameters of every set to SWEEP_FOLDER/sweep_sets.csv. Starting the sweep again with the same grid continues an
+    interrupted sweep
+    :param database_path: path to folder of fingerprint templates
+    :param grid: dict of parameter name: list of values (see ExperimentParameters)
+    :param workers: amount of processes
+    :param echo: print progress to console
+    :returns list of dicts of log key: (log parameter file path, log database file path) per parameter set
+    """
+    sweep = ParameterSweep(grid)
+    units, log_files = plan_database(database_path)
+    sweep.run(units, run_experiment_sweep, database_path, Constants.SWEEP_FOLDER, workers,
+              seed=Constants.DB_RUNNER_SEED, echo=echo)
+
+    sweep_log_files = []
+    with open(os.path.join(Constants.SWEEP_FOLDER, 'sweep_sets.csv'), 'w') as log_sets:
+        log_sets.write('set;{}\n'.format(';'.join(ExperimentParameters.__slots__)))
+        for set_index, parameters in enumerate(sweep.parameter_sets):
+            set_folder = os.path.join(Constants.SWEEP_FOLDER, 'set_{}'.format(set_index), '')
+            os.makedirs(set_folder, exist_ok=True)
+            log_param = 'param_poly{}_minu{}_{}.csv'.format(
+                parameters.poly_degree, parameters.minutiae_points_amount, Constants.date_time_now_str)
+            log_db = 'db_poly{}_minu{}_{}.csv'.format(
+                parameters.poly_degree, parameters.minutiae_points_amount, Constants.date_time_now_str)
+            # named for the log summary, also if logs of the database are not (e.g. split computation)
+            set_log_files = get_log_files(set_folder, log_files.keys(), log_param, log_db)
+            initialize_log_files(set_log_files)
+            sweep.merge(units, Constants.SWEEP_FOLDER, set_index, set_log_files)
+            create_log_summary(set_folder + os.path.basename(Constants.LOG_SUMMARY_PATH), set_folder)
+            log_sets.write('{};{}\n'.format(set_index, ';'.join(str(value) for value in parameters.to_dict().values())))
+            sweep_log_files.append(set_log_files)
+    return sweep_log_files
+
+
+def plan_database(database_path):
+    """
+    Plans work units of database with the protocols of run_over_database (see Database_Runner)
+    :param database_path: path to folder of fingerprint templates
+    :returns tuple (list of WorkUnit, dict of log key: (log parameter file, log database file))
+    """
+    all_xyt = list_database_xyt(database_path)
+    out_folder = 'out/'
+    if ONE_TO_ONE_FVC_PROTOCOL:
+        units = DatabaseRunner.plan_protocols(all_xyt)
+        log_files = get_log_files(out_folder, (DatabaseRunner.LOG_ONE_TO_ONE, DatabaseRunner.LOG_FVC),
+                                  Constants.LOG_PARAM, Constants.LOG_DB)
+    elif SPLIT_COMPUTATION:
+        gallery_xyts = ['{}_{}.xyt'.format(finger, capture) for finger in range(FINGER_START, FINGER_END)
+                        for capture in range(CAPTURE_START, CAPTURE_END)]
+        units = DatabaseRunner.plan_all(gallery_xyts, all_xyt)
+        log_files = {DatabaseRunner.LOG_ALL: (Constants.LOG_FILE_PARAMETER_2A, Constants.LOG_FILE_DATABASE_2A)}
+    else:
+        units = DatabaseRunner.plan_all(all_xyt, all_xyt)
+        log_files = {DatabaseRunner.LOG_ALL: (Constants.LOG_FILE_PARAMETER_TESTING,
+                                              Constants.LOG_FILE_DATABASE_TESTING)}
+    return units, log_files
+
+
+def get_log_files(folder, log_keys, log_param, log_db):
+    """
+    Log files of protocols named as expected by the log summary (see Create_Log_Summary)
+    :param folder: folder of log files (ending with separator)
+    :param log_keys: keys of log files (see DatabaseRunner)
+    :param log_param: name of parameter log file without prefix of protocol
+    :param log_db: name of database log file without prefix of protocol
+    :returns dict of log key: (log parameter file, log database file)
+    """
+    log_files = dict()
+    for key in log_keys:
+        prefix = folder + DatabaseRunner.LOG_PREFIXES[key]
+        log_files[key] = (prefix + log_param, prefix + log_db)
+    return log_files
+
+
+def list_database_xyt(database_path):
+    """ :returns sorted list of names of all .xyt files in database_path """
+    return sorted(path for path in os.listdir(database_path) if path.endswith('.xyt'))
+
+
 def run_experiment_single(db_path, log_parameter_file, log_db_file, gallery_xyt, probe_xyt,
                           log_flag=True, echo=False, number=0):
     """
@@ -266,13 +449,16 @@ def run_experiment_single(db_path, log_parameter_file, log_db_file, gallery_xyt,
             t_decode = round(t_end - t_middle, 2) if not too_few_minutia else 0
             t_total = round(t_end - t_start, 2) if not too_few_minutia else 0
             subset_eval = 'Subsets random' if log_dict['subset_eval_random'] else 'Subsets precomputed'
-            log.write('{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{}\n'.format(
+            crc_rejections = '({}/{}/{})'.format(log_dict['crc_rejected_coefficient'], log_dict['crc_rejected_crc'],
+                                                 log_dict['crc_checked'])
+            log.write('{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{}\n'.format(
                 versus, Constants.POLY_DEGREE, Constants.MINUTIAE_POINTS_AMOUNT, Constants.CHAFF_POINTS_AMOUNT,
                 thresholds,
                 secret_length + CRC_LENGTH, minutiae_candidates, total_subsets, evaluated_subsets,
                 t_encode, t_decode, round(t_geom_creation, 2),
                 round(t_interpol, 2), round(t_geom, 2), t_total, tries_geom, single_matches_geom,
-                amount_geom, geom_iteration, gallery_basis_str, probe_basis_str, subset_eval
+                amount_geom, geom_iteration, gallery_basis_str, probe_basis_str, subset_eval, log_dict['decoder'],
+                crc_rejections, log_dict['pose_skipped_pairs']
             ))
 
     def log_database_matches(match):
@@ -380,59 +566,21 @@ def run_experiment_reuse_vault(gallery_xyt, probe_xyts, db_path, log_parameter_f
     Run experiments with fuzzy vault created from gallery_xyt and match with all probe_xyts
     Detailed print statements are turned off
     """
+    run_experiment_sweep(gallery_xyt, probe_xyts, db_path, [ExperimentParameters.from_constants()],
+                         [(log_parameter_file, log_db_file)], echo=echo)
 
-    def log_parameters(probe_xyt_to_log, time_encode, time_decode):
-        with open(log_parameter_file, 'a') as log:
-            versus = '{} vs {}'.format(probe_xyt_to_log, gallery_xyt)
-            minutiae_candidates = log_dict['minutiae_candidates']
-            total_subsets = log_dict['total_subsets']
-            evaluated_subsets = log_dict['evaluated_subsets']
-            amount_geom = log_dict['amount_geom_table']
-            t_geom_creation = log_dict['geom_creation_time']
-            t_interpol = log_dict['time_interpolation']
-            t_geom = log_dict['time_geom']
-            tries_geom = log_dict['geom_match_tries']
-            single_matches_geom = log_dict['geom_single_match']
-            geom_iteration = log_dict['geom_iteration']
-            if log_dict['too_few_minutiae_gallery']:
-                gallery_basis_str = 'Invalid'
-                probe_basis_str = 'No Basis'
-            elif log_dict['too_few_minutiae_probe']:
-                gallery_basis_str = 'No Basis'
-                probe_basis_str = 'Invalid'
-            else:
-                gallery_basis_str = print_minutia_basis(log_dict['geom_gallery_basis'])
-                probe_basis_str = print_minutia_basis(log_dict['geom_probe_basis'])
-            thresholds = log_dict['thresholds']
-            time_encode_str = round(time_encode, 2)
-            time_decode_str = round(time_decode, 2)
-            time_total_str = round(time_encode + time_decode, 2)
-            subset_eval = 'Subsets random' if log_dict['subset_eval_random'] else 'Subsets precomputed'
-            log.write('{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{}\n'.format(
-                versus, Constants.POLY_DEGREE, Constants.MINUTIAE_POINTS_AMOUNT, Constants.CHAFF_POINTS_AMOUNT,
-                thresholds,
-                secret_length + CRC_LENGTH, minutiae_candidates, total_subsets, evaluated_subsets,
-                time_encode_str, time_decode_str, round(t_geom_creation, 2),
-                round(t_interpol, 2), round(t_geom, 2), time_total_str, tries_geom, single_matches_geom,
-                amount_geom, geom_iteration, gallery_basis_str, probe_basis_str, subset_eval
-            ))
 
-    def log_database_matches(probe_xyt_to_log, match, log_dictionary):
-        with open(log_db_file, 'a') as log_db:
-            gallery_str = gallery_xyt.replace('.xyt', '')
-            probe_str = probe_xyt_to_log.replace('.xyt', '')
-            gallery_finger, gallery_capture = gallery_str.split('_')
-            probe_finger, probe_capture = probe_str.split('_')
-            if match:
-                match_str = "wahr"
-            else:
-                match_str = "falsch"
-            if log_dictionary['too_few_minutiae_gallery']:
-                match_str = "invalid gallery"
-            if log_dictionary['too_few_minutiae_probe']:
-                match_str = "invalid probe"
-            log_db.write('{g_f};{g_c};{p_f};{p_c};{match_str}\n'.format(
-                g_f=gallery_finger, g_c=gallery_capture, p_f=probe_finger, p_c=probe_capture, match_str=match_str))
+def run_experiment_sweep(gallery_xyt, probe_xyts, db_path, parameter_sets, log_files, echo=False):
+    """
+    Run experiments with fuzzy vault created from gallery_xyt and match with all probe_xyts for all parameter_sets.
+    The vault is created once (all parameter sets have the same enrollment parameters) and every probe is verified
+    with the thresholds of every parameter set
+    :param parameter_sets: list of ExperimentParameters with same enrollment_key
+    :param log_files: list of tuples (log parameter file, log database file) for every parameter set
+    """
+    assert len(set(parameters.enrollment_key() for parameters in parameter_sets)) == 1
+    assert len(parameter_sets) == len(log_files)
+    enrollment = parameter_sets[0]
 
     # ENCODE fuzzy vault
     # time execution
@@ -443,24 +591,26 @@ def run_experiment_reuse_vault(gallery_xyt, probe_xyts, db_path, log_parameter_f
     initialize_log_dict(log_dict)
 
     # calculate secret according to polynomial degree. secret has to be able to be encoded in bytes (*8)
-    secret_bytes = generate_smallest_secret(Constants.POLY_DEGREE, CRC_LENGTH, min_size=128, echo=False)
+    secret_bytes = generate_smallest_secret(enrollment.poly_degree, CRC_LENGTH, min_size=128, echo=False)
     secret_length = len(secret_bytes) * 8
 
-    fuzzy_vault = generate_vault(db_path + gallery_xyt, Constants.MINUTIAE_POINTS_AMOUNT,
-                                 Constants.CHAFF_POINTS_AMOUNT,
-                                 Constants.POLY_DEGREE, secret_bytes, CRC_LENGTH, GF_2_M, log_dict, echo=False)
+    fuzzy_vault = generate_vault(db_path + gallery_xyt, enrollment.minutiae_points_amount,
+                                 enrollment.chaff_points_amount, enrollment.poly_degree, secret_bytes, CRC_LENGTH,
+                                 GF_2_M, log_dict, echo=False, points_distance=enrollment.points_distance)
     if not fuzzy_vault:
         if echo:
             print('Failure due to too few minutiae to generate vault...\n')
         log_dict['too_few_minutiae_gallery'] = True
-        for probe_xyt in probe_xyts:
-            log_parameters(probe_xyt + ' invalid gallery', 0, 0)
-            log_database_matches(probe_xyt, False, log_dict)
+        for parameters, (log_parameter_file, log_db_file) in zip(parameter_sets, log_files):
+            for probe_xyt in probe_xyts:
+                log_parameter_line(log_parameter_file, probe_xyt + ' invalid gallery', gallery_xyt, parameters,
+                                   secret_length, log_dict, 0, 0)
+                log_database_line(log_db_file, gallery_xyt, probe_xyt, False, log_dict)
         return
 
     t_start_geom_creation = time.time()
     fuzzy_vault.create_geom_table()
-    log_dict['geom_creation_time'] = round(time.time() - t_start_geom_creation, 2)
+    geom_creation_time = round(time.time() - t_start_geom_creation, 2)
 
     # end of ENCODE and start of DECODE
     t_encode_end = time.time()
@@ -474,48 +624,152 @@ def run_experiment_reuse_vault(gallery_xyt, probe_xyts, db_path, log_parameter_f
     # DECODE fuzzy vault
     # loop over probe_xyt and try to unlock vault from gallery_xyt
     for probe_xyt in probe_xyts:
-        if echo:
-            print('==========================================================')
-            print('Run {xyt_g} vs {xyt_p}'.format(xyt_g=gallery_xyt, xyt_p=probe_xyt))
-            print('==========================================================')
-
-        initialize_log_dict(log_dict)
-
-        # copy fuzzy vault for decoding
-        fuzzy_vault_clone = copy.deepcopy(fuzzy_vault)
+        for parameters, (log_parameter_file, log_db_file) in zip(parameter_sets, log_files):
+            if echo:
+                print('==========================================================')
+                print('Run {xyt_g} vs {xyt_p} with {parameters}'.format(xyt_g=gallery_xyt, xyt_p=probe_xyt,
+                                                                       parameters=parameters))
+                print('==========================================================')
+
+            initialize_log_dict(log_dict)
+            log_dict['geom_creation_time'] = geom_creation_time
+
+            # decoding (does not change fuzzy vault, so it is shared by all probes and parameter sets)
+            t_decode_start = time.time()
+            success = verify_secret(db_path + probe_xyt, parameters.minutiae_points_amount, parameters.poly_degree,
+                                    CRC_LENGTH, secret_length, GF_2_M, fuzzy_vault, log_dict, echo=False,
+                                    parameters=parameters)
+
+            # finish time execution
+            t_decode_end = time.time()
+            t_decode = t_decode_end - t_decode_start
+
+            # log run
+            log_parameter_line(log_parameter_file, probe_xyt, gallery_xyt, parameters, secret_length, log_dict,
+                               t_encode, t_decode)
+            log_database_line(log_db_file, gallery_xyt, probe_xyt, success, log_dict)
+
+            # clear up
+            log_dict.clear()
+
+            # prints SUCCESS or FAILURE
+            if echo:
+                print('Execution time: {} seconds'.format(int(t_encode + t_decode)))
+                if success:
+                    print("SUCCESS\n")
+                else:
+                    print("FAILURE...\n")
 
-        # decoding
-        t_decode_start = time.time()
-        success = verify_secret(db_path + probe_xyt, Constants.MINUTIAE_POINTS_AMOUNT, Constants.POLY_DEGREE,
-                                CRC_LENGTH, secret_length, GF_2_M, fuzzy_vault_clone, log_dict, echo=False)
-        fuzzy_vault_clone.clear_vault()
 
-        # finish time execution
-        t_decode_end = time.time()
-        t_decode = t_decode_end - t_decode_start
+def log_parameter_line(log_parameter_file, probe_xyt, gallery_xyt, parameters, secret_length, log_dict,
+                       time_encode, time_decode):
+    """ Append line of one match to parameter log (see initialize_parameter_testing_log) """
+    with open(log_parameter_file, 'a') as log:
+        versus = '{} vs {}'.format(probe_xyt, gallery_xyt)
+        minutiae_candidates = log_dict['minutiae_candidates']
+        total_subsets = log_dict['total_subsets']
+        evaluated_subsets = log_dict['evaluated_subsets']
+        amount_geom = log_dict['amount_geom_table']
+        t_geom_creation = log_dict['geom_creation_time']
+        t_interpol = log_dict['time_interpolation']
+        t_geom = log_dict['time_geom']
+        tries_geom = log_dict['geom_match_tries']
+        single_matches_geom = log_dict['geom_single_match']
+        geom_iteration = log_dict['geom_iteration']
+        if log_dict['too_few_minutiae_gallery']:
+            gallery_basis_str = 'Invalid'
+            probe_basis_str = 'No Basis'
+        elif log_dict['too_few_minutiae_probe']:
+            gallery_basis_str = 'No Basis'
+            probe_basis_str = 'Invalid'
+        else:
+            gallery_basis_str = print_minutia_basis(log_dict['geom_gallery_basis'])
+            probe_basis_str = print_minutia_basis(log_dict['geom_probe_basis'])
+        thresholds = log_dict['thresholds']
+        time_encode_str = round(time_encode, 2)
+        time_decode_str = round(time_decode, 2)
+        time_total_str = round(time_encode + time_decode, 2)
+        subset_eval = 'Subsets random' if log_dict['subset_eval_random'] else 'Subsets precomputed'
+        crc_rejections = '({}/{}/{})'.format(log_dict['crc_rejected_coefficient'], log_dict['crc_rejected_crc'],
+                                             log_dict['crc_checked'])
+        log.write('{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{}\n'.format(
+            versus, parameters.poly_degree, parameters.minutiae_points_amount, parameters.chaff_points_amount,
+            thresholds,
+            secret_length + CRC_LENGTH, minutiae_candidates, total_subsets, evaluated_subsets,
+            time_encode_str, time_decode_str, round(t_geom_creation, 2),
+            round(t_interpol, 2), round(t_geom, 2), time_total_str, tries_geom, single_matches_geom,
+            amount_geom, geom_iteration, gallery_basis_str, probe_basis_str, subset_eval, log_dict['decoder'],
+            crc_rejections, log_dict['pose_skipped_pairs']
+        ))
+
+
+def log_database_line(log_db_file, gallery_xyt, probe_xyt, match, log_dict):
+    """ Append result of one match to database log (see initialize_database_testing_log) """
+    with open(log_db_file, 'a') as log_db:
+        gallery_str = gallery_xyt.replace('.xyt', '')
+        probe_str = probe_xyt.replace('.xyt', '')
+        gallery_finger, gallery_capture = gallery_str.split('_')
+        probe_finger, probe_capture = probe_str.split('_')
+        if match:
+            match_str = "wahr"
+        else:
+            match_str = "falsch"
+        if log_dict['too_few_minutiae_gallery']:
+            match_str = "invalid gallery"
+        if log_dict['too_few_minutiae_probe']:
+            match_str = "invalid probe"
+        log_db.write('{g_f};{g_c};{p_f};{p_c};{match_str}\n'.format(
+            g_f=gallery_finger, g_c=gallery_capture, p_f=probe_finger, p_c=probe_capture, match_str=match_str))
 
-        # log run
-        log_parameters(probe_xyt, t_encode, t_decode)
-        log_database_matches(probe_xyt, success, log_dict)
 
-        # clear up
-        log_dict.clear()
+def run_identification(probe_xyt_path, vaults, echo=True):
+    """
+    1:N identification: searches probe in enrolled vaults
+    :param probe_xyt_path: path to .xyt file of probe
+    :param vaults: iterable of tuples (vault ID, Vault or CompactVault), e.g. DBHandler.find_all_fuzzy_vaults
+    :param echo: print results to console as they are available
+    :returns VerificationResult of matching vault (vault_id is ID of vault) or None
+    """
+    # vaults are enrolled with the smallest secret of at least 128 bits (see App.enroll_new_fingerprint)
+    secret_length = len(generate_smallest_secret(Constants.POLY_DEGREE, CRC_LENGTH, min_size=128)) * 8
+    identifier = VaultIdentifier()
+    t_load_start = time.time()
+    for vault_id, vault in vaults:
+        identifier.add_vault(vault, vault_id)
+    identifier.build_index()
+    if echo:
+        print('Loaded {} vaults in {} seconds'.format(len(identifier), round(time.time() - t_load_start, 2)))
 
-        # prints SUCCESS or FAILURE
+    minutiae_list = template_store.get_minutiae(probe_xyt_path, Constants.MINUTIAE_POINTS_AMOUNT)
+    if len(minutiae_list) < Constants.MINUTIAE_POINTS_AMOUNT:
         if echo:
-            print('Execution time: {} seconds'.format(int(t_encode + t_decode)))
-            if success:
-                print("SUCCESS\n")
-            else:
-                print("FAILURE...\n")
+            print('Not enough minutiae in probe to proceed for identification...')
+        return None
+    t_identify_start = time.time()
+    for result in identifier.identify_iter(minutiae_list, Constants.POLY_DEGREE, GF_2_M, CRC_LENGTH, secret_length):
+        if echo:
+            print('{}: score {}, {}'.format(result.vault_id, result.metrics['identify_score'],
+                                            'SUCCESS' if result.match else 'FAILURE'))
+        if result.match:
+            if echo:
+                print('Identified {} in {} seconds'.format(result.vault_id, round(time.time() - t_identify_start, 2)))
+            return result
+    if echo:
+        print('No match found in {} seconds'.format(round(time.time() - t_identify_start, 2)))
+    return None
 
 
 def generate_vault(xyt_input_path, minutiae_points_amount, chaff_points_amount, poly_degree, secret, crc_length,
-                   gf_exp, log_dict, echo=False):
-    # extract minutiae from template
-    nbis_minutiae_extractor = MinutiaeExtractor()
-    minutiae_list = nbis_minutiae_extractor.extract_minutiae_from_xyt(xyt_input_path)
-    if len(minutiae_list) < minutiae_points_amount:
+                   gf_exp, log_dict, echo=False, points_distance=None):
+    """
+    :param points_distance: minimal distance between vault points, POINTS_DISTANCE of Constants if None
+    :returns: Vault, None if template has too few minutiae
+    """
+    if points_distance is None:
+        points_distance = Constants.POINTS_DISTANCE
+    # get minutiae of template sorted by quality
+    template = template_store.get_template(xyt_input_path)
+    if len(template) < minutiae_points_amount:
         if echo:
             print('Not enough minutiae in template to proceed for generation of vault...')
         log_dict['too_few_minutiae_gallery'] = True
@@ -526,12 +780,12 @@ def generate_vault(xyt_input_path, minutiae_points_amount, chaff_points_amount,
 
     # Cut low quality minutiae and convert all minutiae to uint and add to vault
     genuine_minutiae_list = []
-    for candidate in minutiae_list:
+    for candidate in TemplateStore.iter_minutiae(template):
         if len(genuine_minutiae_list) == minutiae_points_amount:
             break
         too_close = False
         for minutia in genuine_minutiae_list:
-            if candidate.distance_to(minutia) <= POINTS_DISTANCE:
+            if candidate.distance_to(minutia) <= points_distance:
                 too_close = True
                 break
         if not too_close:
@@ -541,10 +795,9 @@ def generate_vault(xyt_input_path, minutiae_points_amount, chaff_points_amount,
         vault.add_minutia_rep(m2b.get_uint_from_minutia(minutia))
 
     # create chaff points and add to vault
-    chaff_points_list = ChaffPointsGenerator.generate_chaff_points_randomly(chaff_points_amount, genuine_minutiae_list,
-                                                                            vault.get_smallest_original_minutia(), m2b)
-    for chaff_point in chaff_points_list:
-        vault.add_chaff_point_rep(m2b.get_uint_from_minutia(chaff_point))
+    chaff_points_reps = ChaffPointsGenerator.generate_chaff_points_rep_array(
+        chaff_points_amount, genuine_minutiae_list, vault.get_smallest_original_minutia(), m2b, points_distance)
+    vault.vault_chaff_points_rep.extend(chaff_points_reps.tolist())
 
     # generate secret polynomial
     secret_poly_generator = PolynomialGenerator(secret, poly_degree, crc_length, gf_exp)
@@ -564,13 +817,13 @@ def generate_vault(xyt_input_path, minutiae_points_amount, chaff_points_amount,
 
 
 def verify_secret(xyt_input_path, minutiae_points_amount, poly_degree, crc_length, secret_length, gf_exp, vault: Vault,
-                  log_dict, echo=False):
+                  log_dict, echo=False, parameters=None):
     """
+    :param parameters: ExperimentParameters of verification, Constants if None
     :returns: True if match is found, False otherwise
     """
-    # extract minutiae from template
-    nbis_minutiae_extractor = MinutiaeExtractor()
-    minutiae_list = nbis_minutiae_extractor.extract_minutiae_from_xyt(xyt_input_path)
+    # get best quality minutiae of template
+    minutiae_list = template_store.get_minutiae(xyt_input_path, minutiae_points_amount)
     if len(minutiae_list) < minutiae_points_amount:
         if echo:
             print('Not enough minutiae in template to proceed for extraction of secret...')
@@ -578,8 +831,8 @@ def verify_secret(xyt_input_path, minutiae_points_amount, poly_degree, crc_lengt
         return False
 
     # extract and restore minutiae from vault using minutiae list from probe, only good quality points taken
-    return VaultVerifier.unlock_vault_geom(vault, minutiae_list[0:minutiae_points_amount], poly_degree, gf_exp,
-                                           crc_length, secret_length, log_dict, echo=echo)
+    return VaultVerifier.unlock_vault_geom(vault, minutiae_list, poly_degree, gf_exp, crc_length, secret_length,
+                                           log_dict, echo=echo, parameters=parameters)
 
 
 def store_in_cosmos_db(db_handler, vault, vault_id):
@@ -635,37 +888,30 @@ def generate_smallest_secret(poly_degree, crc_length, min_size=0, echo=False):
 def initialize_log_dict(log_dict, number=0):
     # experiment number
     log_dict['exp_number'] = number
-    # how many elements iterated through in geometric table
-    log_dict['amount_geom_table'] = 0
-    # number of subsets total
-    log_dict['total_subsets'] = 0
-    # how many subsets evaluated in polynomial interpolation
-    log_dict['evaluated_subsets'] = -1
-    # how many minutiae candidates before polynomial interpolation
-    log_dict['minutiae_candidates'] = 0
     # time of creation of geometric hashing table
     log_dict['geom_creation_time'] = 0
-    # time of polynomial interpolation (only the last try)
-    log_dict['time_interpolation'] = 0
-    # total time of geometric hashing (all iterations)
-    log_dict['time_geom'] = 0
-    # how many times candidate sets have been discovered in geometric hashing
-    log_dict['geom_match_tries'] = 0
-    # how many total iterations have been computed in geometric hashing (each subloop)
-    log_dict['geom_iteration'] = 0
-    # how many single minutiae matches have been found in geometric hashing
-    log_dict['geom_single_match'] = 0
-    # basis selected in gallery for geometric hashing in geom table for matching and interpolation
-    log_dict['geom_gallery_basis'] = None
-    # basis selected in probe for geometric hashing in geom table for matching and interpolation
-    log_dict['geom_probe_basis'] = None
-    # thresholds in Vault_Verifier
-    log_dict['thresholds'] = ''
     # flag if probe or gallery fingerprint template has too few minutiae
     log_dict['too_few_minutiae_probe'] = False
     log_dict['too_few_minutiae_gallery'] = False
-    # log if choice of candidate subsets is done randomly
-    log_dict['subset_eval_random'] = Constants.RANDOM_SUBSET_EVAL
+    # metrics of verification
+    VaultVerifier.initialize_metrics(log_dict)
+
+
+def initialize_log_files(log_files):
+    """ clear all log files and add log headers
+        :param log_files: dict of log key: (log parameter file, log database file) """
+    for log_parameter_file, log_db_file in log_files.values():
+        initialize_parameter_testing_log(log_parameter_file)
+        initialize_database_testing_log(log_db_file)
+
+
+def initialize_database_testing_log(log_db_file):
+    """ clear log file and add log header for logging database matching results """
+    if not os.path.exists('out'):
+        os.makedirs('out')
+    open(log_db_file, 'w+').close()
+    with open(log_db_file, 'a') as log:
+        log.write('gallery; capture; probe; capture; match\n')
 
 
 def initialize_parameter_testing_log(log_parameter_file):
@@ -695,7 +941,10 @@ def initialize_parameter_testing_log(log_parameter_file):
                   '# geom iteration;'
                   'gallery selected basis;'
                   'probe selected basis;'
-                  'subsets eval\n')
+                  'subsets eval;'
+                  'decoder;'
+                  'CRC rejections (coefficient/crc/checked);'
+                  '# pose skipped pairs\n')
 
 
 def print_minutia_basis(m):
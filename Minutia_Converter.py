@@ -2,9 +2,12 @@
     Converter for Minutia
     - to bitstring and vice-versa
     - from bitstring to int and vice-versa
+    - to int and vice-versa with shifts and masks (same layout as bitstring: x in highest bits, then y, theta in
+      lowest bits), also for whole numpy arrays of minutiae
 """
 
 from bitstring import BitArray
+import numpy as np
 from Minutia import MinutiaNBIS, MinutiaNBIS_GH
 
 
@@ -14,6 +17,21 @@ class MinutiaConverter:
         self.Y_BIT_LENGTH = y_bit_length
         self.THETA_BIT_LENGTH = theta_bit_length
         self.TOTAL_BIT_LENGTH = total_bit_length
+        assert x_bit_length + y_bit_length + theta_bit_length == total_bit_length
+        self.X_SHIFT = y_bit_length + theta_bit_length
+        self.Y_SHIFT = theta_bit_length
+        self.X_MASK = (1 << x_bit_length) - 1
+        self.Y_MASK = (1 << y_bit_length) - 1
+        self.THETA_MASK = (1 << theta_bit_length) - 1
+
+    def get_uint_from_values(self, x, y, theta):
+        """ Packs coordinates to unsigned int
+        :raises ValueError if a coordinate does not fit in its bits
+        :returns unsigned int """
+        if not (0 <= x <= self.X_MASK and 0 <= y <= self.Y_MASK and 0 <= theta <= self.THETA_MASK):
+            raise ValueError('Minutia ({}, {}, {}) does not fit in {}/{}/{} bits'.format(
+                x, y, theta, self.X_BIT_LENGTH, self.Y_BIT_LENGTH, self.THETA_BIT_LENGTH))
+        return (x << self.X_SHIFT) | (y << self.Y_SHIFT) | theta
 
     def get_total_bitstring_from_minutia(self, minutia: MinutiaNBIS):
         """ Converts minutia to bitstring
@@ -32,12 +50,11 @@ class MinutiaConverter:
         """ Converts minutia to signed int
         :param minutia: Minutia to be encoded to uint
         :param non_negative: True if all coordinates in minutia are positive, else False (Minutia_NBIS_GH)
+        :raises ValueError if a coordinate does not fit in its bits
         :returns unsigned int """
         if not non_negative:
-            return self.get_total_bitstring_from_minutia(
-                MinutiaNBIS(minutia.x + minutia.X_MAX, minutia.y + minutia.Y_MAX, minutia.theta, limit=False)).uint
-        else:
-            return self.get_total_bitstring_from_minutia(minutia).uint
+            minutia = MinutiaNBIS(minutia.x + minutia.X_MAX, minutia.y + minutia.Y_MAX, minutia.theta, limit=False)
+        return self.get_uint_from_values(int(minutia.x), int(minutia.y), int(minutia.theta))
 
     def get_minutia_from_bitstring(self, bitstring: BitArray, non_negative=True):
         """ Recreates minutia from bitstring (BitArray)
@@ -58,6 +75,51 @@ class MinutiaConverter:
         """ Recreates minutia from unsigned int that was created from bitstring
         :param unsigned_int: representation of minutia
         :param non_negative: True if all coordinates in minutia are positive, else False (Minutia_NBIS_GH, from storage)
+        :raises ValueError if unsigned_int does not fit in TOTAL_BIT_LENGTH bits
         :returns Minutia """
-        total_bit = BitArray(uint=unsigned_int, length=self.TOTAL_BIT_LENGTH)
-        return self.get_minutia_from_bitstring(total_bit, non_negative=non_negative)
+        if unsigned_int < 0 or unsigned_int >> self.TOTAL_BIT_LENGTH:
+            raise ValueError('{} does not fit in {} bits'.format(unsigned_int, self.TOTAL_BIT_LENGTH))
+        x = unsigned_int >> self.X_SHIFT
+        y = (unsigned_int >> self.Y_SHIFT) & self.Y_MASK
+        theta = unsigned_int & self.THETA_MASK
+        if not non_negative:
+            x -= MinutiaNBIS_GH.X_MAX
+            y -= MinutiaNBIS_GH.Y_MAX
+        return MinutiaNBIS(x, y, theta)
+
+    def get_uint_array_from_minutiae_array(self, minutiae_array, non_negative=True):
+        """ Converts all minutiae at once to unsigned int
+        :param minutiae_array: (N, 3) array of (x, y, theta)
+        :param non_negative: True if all coordinates are positive, else False (coordinates of Minutia_NBIS_GH)
+        :raises ValueError if a coordinate does not fit in its bits
+        :returns numpy array (uint32 for up to 32 bits, else uint64) of unsigned int """
+        minutiae_array = np.asarray(minutiae_array, dtype=np.int64).reshape(-1, 3)
+        x = minutiae_array[:, 0]
+        y = minutiae_array[:, 1]
+        theta = minutiae_array[:, 2]
+        if not non_negative:
+            x = x + MinutiaNBIS_GH.X_MAX
+            y = y + MinutiaNBIS_GH.Y_MAX
+        if ((x < 0) | (x > self.X_MASK) | (y < 0) | (y > self.Y_MASK) | (theta < 0) | (theta > self.THETA_MASK)).any():
+            raise ValueError('Minutiae do not fit in {}/{}/{} bits'.format(
+                self.X_BIT_LENGTH, self.Y_BIT_LENGTH, self.THETA_BIT_LENGTH))
+        dtype = np.uint32 if self.TOTAL_BIT_LENGTH <= 32 else np.uint64
+        return ((x << self.X_SHIFT) | (y << self.Y_SHIFT) | theta).astype(dtype)
+
+    def get_minutiae_array_from_uint_array(self, uint_array, non_negative=True):
+        """ Recreates all minutiae at once from unsigned int
+        :param uint_array: list or numpy array of unsigned int
+        :param non_negative: True if all coordinates are positive, else False (coordinates of Minutia_NBIS_GH)
+        :raises ValueError if an unsigned int does not fit in TOTAL_BIT_LENGTH bits
+        :returns (N, 3) numpy array (int64) of (x, y, theta) """
+        uint_array = np.asarray(uint_array)
+        if uint_array.dtype == object or (uint_array.size and (uint_array.min() < 0 or
+                                                              int(uint_array.max()) >> self.TOTAL_BIT_LENGTH)):
+            raise ValueError('Representations do not fit in {} bits'.format(self.TOTAL_BIT_LENGTH))
+        uint_array = uint_array.astype(np.int64).reshape(-1)
+        minutiae_array = np.stack((uint_array >> self.X_SHIFT, (uint_array >> self.Y_SHIFT) & self.Y_MASK,
+                                   uint_array & self.THETA_MASK), axis=1)
+        if not non_negative:
+            minutiae_array[:, 0] -= MinutiaNBIS_GH.X_MAX
+            minutiae_array[:, 1] -= MinutiaNBIS_GH.Y_MAX
+        return minutiae_array
@@ -0,0 +1,155 @@
+"""
+    Parameter Sweep runs a database with every parameter set of a grid (e.g. thresholds x polynomial degree)
+
+    The grid is declared as dict of parameter name (see ExperimentParameters) and list of values, the parameter sets
+    are all combinations of the values. Parameter sets are grouped by their enrollment parameters: within a group,
+    the vault (and geometric hashing table) of a gallery template is generated once and every probe is verified with
+    the thresholds of every parameter set of the group. Parameters are passed to the experiment explicitly, Constants
+    are not changed, so tasks of all groups run in parallel on a process pool.
+
+    A task is one enrollment group with one work unit (gallery template with its probes, see Database_Runner). Tasks
+    write the logs of every parameter set to their own files in the task folder (renamed when the task is finished),
+    so an interrupted sweep only runs the unfinished tasks when it is started again with the same sweep folder.
+"""
+
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import product
+
+import Constants
+from Database_Runner import DatabaseRunner
+from Experiment_Parameters import ExperimentParameters
+
+
+class ParameterSweep:
+    PLAN = 'sweep.json'
+    TASKS = 'tasks'
+
+    def __init__(self, grid, base: ExperimentParameters = None):
+        """
+        :param grid: dict of parameter name: list of values (e.g. {'x_threshold': [10, 12], 'poly_degree': [8, 10]})
+        :param base: ExperimentParameters for all parameters not in grid, Constants if None
+        """
+        if base is None:
+            base = ExperimentParameters.from_constants()
+        for name in grid:
+            if name not in ExperimentParameters.__slots__:
+                raise ValueError('Unknown experiment parameter {} in sweep grid'.format(name))
+        self.grid = grid
+        self.parameter_sets = [base.replace(**dict(zip(grid.keys(), values))) for values in product(*grid.values())]
+
+    def __len__(self):
+        return len(self.parameter_sets)
+
+    def enrollment_groups(self):
+        """ :returns list of lists of indices of parameter sets with the same enrollment parameters
+            (in order of first appearance) """
+        groups = dict()
+        for index, parameters in enumerate(self.parameter_sets):
+            groups.setdefault(parameters.enrollment_key(), []).append(index)
+        return list(groups.values())
+
+    @staticmethod
+    def get_task_paths(sweep_folder, set_index, unit_index):
+        """ :returns tuple of paths (parameter log, database log) of parameter set set_index in task of unit """
+        prefix = os.path.join(sweep_folder, ParameterSweep.TASKS, '{}_{}_'.format(set_index, unit_index))
+        return prefix + 'param.csv', prefix + 'db.csv'
+
+    @staticmethod
+    def run_task(unit, experiment, database_path, parameter_sets, task_paths, seed, constants):
+        """ Runs unit with all parameter sets of an enrollment group and renames the log files when finished
+        :param unit: WorkUnit
+        :param experiment: function(gallery_xyt, probe_xyts, database_path, parameter_sets, log_files) that matches
+        gallery with all probes for all parameter sets (with same enrollment parameters) and appends one line per
+        probe to both log files of every parameter set
+        :param parameter_sets: list of ExperimentParameters of the enrollment group
+        :param task_paths: list of tuples (parameter log path, database log path) per parameter set
+        :param seed: seed of random generator of task
+        :param constants: dict of constants to set in Constants (see DatabaseRunner.get_constants) """
+        for name, value in constants.items():
+            setattr(Constants, name, value)
+        random.seed(seed)
+        temp_paths = [tuple('{}.{}.tmp'.format(path, os.getpid()) for path in paths) for paths in task_paths]
+        for paths in temp_paths:
+            for path in paths:
+                open(path, 'w').close()
+        experiment(unit.gallery_xyt, unit.probe_xyts, database_path, parameter_sets, temp_paths)
+        for paths, final_paths in zip(temp_paths, task_paths):
+            for path, final_path in zip(paths, final_paths):
+                os.replace(path, final_path)
+
+    def run(self, units, experiment, database_path, sweep_folder, workers, seed=None, echo=False):
+        """ Runs all tasks (enrollment group x work unit) that are not finished yet on a pool of worker processes
+        :param units: list of WorkUnit (see Database_Runner)
+        :param experiment: function running a task (see run_task), has to be defined at module level
+        :param database_path: path to folder of fingerprint templates
+        :param sweep_folder: folder of the task logs
+        :param workers: amount of processes, tasks are run in the current process if 1
+        :param seed: seed of the random generators of all tasks, random if None (seed of the first run if the sweep
+        folder contains an interrupted sweep)
+        :param echo: print progress to console
+        :raises ValueError if sweep_folder contains another sweep """
+        os.makedirs(os.path.join(sweep_folder, ParameterSweep.TASKS), exist_ok=True)
+        seed = self.write_plan(units, sweep_folder, seed)
+        constants = DatabaseRunner.get_constants()
+        arguments = []
+        for group in self.enrollment_groups():
+            for unit in units:
+                task_paths = [ParameterSweep.get_task_paths(sweep_folder, set_index, unit.index) for set_index in group]
+                if all(os.path.exists(path) for paths in task_paths for path in paths):
+                    continue
+                # same seed as unit in Database_Runner for all groups: parameter sets are compared on same chaff points
+                arguments.append((unit, experiment, database_path, [self.parameter_sets[i] for i in group],
+                                  task_paths, '{}_{}'.format(seed, unit.index), constants))
+        tasks_amount = len(self.enrollment_groups()) * len(units)
+        if echo:
+            print('Running {} of {} tasks ({} parameter sets in {} enrollment groups, {} work units)'.format(
+                len(arguments), tasks_amount, len(self), len(self.enrollment_groups()), len(units)))
+
+        t_start = time.time()
+        done = tasks_amount - len(arguments)
+        if workers == 1:
+            for argument in arguments:
+                ParameterSweep.run_task(*argument)
+                done += 1
+                if echo:
+                    DatabaseRunner.print_progress(done, tasks_amount, t_start)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(ParameterSweep.run_task, *argument) for argument in arguments]
+                for future in as_completed(futures):
+                    future.result()
+                    done += 1
+                    if echo:
+                        DatabaseRunner.print_progress(done, tasks_amount, t_start)
+
+    def write_plan(self, units, sweep_folder, seed):
+        """ Writes parameter sets, units and seed of the sweep to sweep_folder, or checks that an existing plan of an
+        interrupted sweep is the same
+        :returns seed of the sweep """
+        plan = {'parameter_sets': [parameters.to_dict() for parameters in self.parameter_sets],
+                'units': [[unit.gallery_xyt, unit.probe_xyts] for unit in units],
+                'seed': seed if seed is not None else random.getrandbits(64)}
+        plan_path = os.path.join(sweep_folder, ParameterSweep.PLAN)
+        if os.path.exists(plan_path):
+            with open(plan_path, 'r') as file:
+                plan_existing = json.load(file)
+            if plan_existing['parameter_sets'] != plan['parameter_sets'] or plan_existing['units'] != plan['units']:
+                raise ValueError('Sweep folder {} contains another sweep'.format(sweep_folder))
+            return plan_existing['seed']
+        with open(plan_path, 'w') as file:
+            json.dump(plan, file)
+        return plan['seed']
+
+    def merge(self, units, sweep_folder, set_index, log_files):
+        """ Appends the logs of parameter set set_index of all units to log_files in order of units
+        :param log_files: dict of log key: (log parameter file, log database file) """
+        results = []
+        for unit in units:
+            parameter_path, db_path = ParameterSweep.get_task_paths(sweep_folder, set_index, unit.index)
+            results.append((unit.index, parameter_path, 0, os.path.getsize(parameter_path),
+                            db_path, 0, os.path.getsize(db_path)))
+        DatabaseRunner.merge(units, results, log_files)
@@ -7,147 +7,189 @@
 """
 
 from functools import reduce
-from bitstring import BitArray
-import binascii
-from itertools import combinations
-from random import shuffle, sample
-from math import factorial
+from random import getrandbits, Random
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import threading
+import os
 
 import Constants
-from Vault import Vault
+from CRC_Verifier import CRCVerifier
+from Vault import VaultDecodeContext
+from Subset_Enumerator import SubsetEnumerator
 from Galois.Poly_Ring import PolyRing
-from Galois.Galois_Converter import GaloisConverter
-from Galois.Galois_Field import GF
+from Galois.Galois_Field_Factory import GaloisFieldFactory
+from Galois.Lagrange_Interpolator import LagrangeInterpolator
+from Galois.Incremental_Interpolator import IncrementalInterpolator
+from Galois.Reed_Solomon_Decoder import GaoDecoder
 
 
 class PolynomialExtractor:
-    def __init__(self, gf_exp):
+    def __init__(self, gf_exp, gf_backend=None):
         """
         :param gf_exp: exponential in GF(2**gf_exp)
+        :param gf_backend: implementation of GF(2**gf_exp) ('int' or 'sympy'), Constants.GF_BACKEND if None
         """
         self.gf_exp = gf_exp
-        self.K = GF(2, gf_exp)
+        self.gf_backend = gf_backend or Constants.GF_BACKEND
+        self.K = GaloisFieldFactory.create_field(2, gf_exp, self.gf_backend)
+        self.interpolator = LagrangeInterpolator(self.K)
+        self.incremental_interpolator = IncrementalInterpolator(self.K)
+        self.decoder = GaoDecoder(self.K)
 
     def extract_polynomial_gf_2(self, X, Y):
         """ Extracts polynomial from X and Y using Lagrange interpolation over field K = GF(2**m) """
-        poly = self.interpolate_lagrange_poly_in_field(X, Y)
-        return GaloisConverter.convert_gf_2_list_to_int_list(poly, self.gf_exp)
+        poly = self.interpolator.interpolate(X, Y)
+        return [self.K.element_to_int(c) for c in poly]
+
+    def decode_polynomial_gf_2(self, X, Y, k):
+        """ Decodes polynomial with k coefficients from X and Y with Gao's Reed-Solomon decoder over field K
+            :returns list of coefficients as int or None if too many points are not on a common polynomial """
+        poly = self.decoder.decode(X, Y, k)
+        if poly is None:
+            return None
+        return [self.K.element_to_int(c) for c in poly]
 
     def interpolate_lagrange_poly_in_field(self, X, Y):
-        """ Interpolates polynomial with Lagrange
+        """ Interpolates polynomial with Lagrange (reference implementation, O(k**3),
+            extract_polynomial_gf_2 uses the faster LagrangeInterpolator)
             :param X: x-coordinates of points
             :param Y: y-coordinates of points
             :param K: Galois Field
             :returns polynomial in [1,0,0,0] form in GF K """
         R = PolyRing(self.K)
-        poly = [[]]
+        poly = [self.K.zero]
         for j, y in enumerate(Y):
             Xe = X[:j] + X[j + 1:]
-            numerator = reduce(lambda p, q: R.mul(p, q), ([[1], self.K.sub([], x)] for x in Xe))
+            numerator = reduce(lambda p, q: R.mul(p, q), ([self.K.one, self.K.sub(self.K.zero, x)] for x in Xe))
             denominator = reduce(lambda x, y: self.K.mul(x, y), (self.K.sub(X[j], x) for x in Xe))
             poly = R.add(poly, R.mul(numerator, [self.K.mul(y, self.K.inv(denominator))]))
         return poly
 
     @staticmethod
     def check_crc_in_poly(poly, degree, crc_length, secret_length):
-        """ Extract bitstring from polynomial coefficients and checks if CRC is correct
+        """ Extract secret from polynomial coefficients and checks if CRC is correct
             :param poly: list of coefficients of polynomial
             :param degree: degree of the polynomial
             :param crc_length: length of the CRC in bits as int
             :param secret_length: length of the secret in bits as int
             :returns if CRC in polynomial encoding (secret) is correct as boolean"""
-        # strip leading coefficients that are greater than degree + 1
-        poly = poly[len(poly) - (degree + 1):]
-        result = BitArray()
-        assert (crc_length + secret_length) % (degree + 1) == 0
-        coefficient_length = (crc_length + secret_length) // (degree + 1)
-        for coefficient in poly:
-            # if coefficient is bigger than supposed to CRC is definitely not correct
-            if coefficient.bit_length() > coefficient_length:
-                return False
-            result.append(BitArray(uint=coefficient, length=coefficient_length))
-        crc_code = result[-crc_length:]
-        extracted_crc = crc_code.uint
-        secret = result[:-crc_length]
-        calculated_crc = binascii.crc32(secret.bytes)
-        return extracted_crc == calculated_crc
-
-    def interpolate_and_check_crc(self, vault: Vault, degree: int, crc_length, secret_length, log_dict,
-                                  echo=False):
+        return CRCVerifier(degree, crc_length, secret_length).verify(poly)
+
+    def check_subset(self, subset, verifier: CRCVerifier):
+        """ Interpolates polynomial on subset of candidate points and checks CRC
+            :param subset: list of (x, y) tuples as int
+            :param verifier: CRCVerifier for the secret polynomial
+            :returns True if CRC in interpolated polynomial is correct (False for repeated x-coordinates) """
+        X, Y = list(zip(*subset))
+        # no polynomial interpolates points with repeated x-coordinates
+        if len(set(X)) != len(X):
+            return verifier.reject()
+        X = [self.K.element_from_int(x) for x in X]
+        Y = [self.K.element_from_int(y) for y in Y]
+        poly = self.interpolator.interpolate(X, Y)
+        return verifier.verify(poly, self.K.element_to_int)
+
+    def interpolate_and_check_crc(self, decode_context: VaultDecodeContext, degree: int, crc_length, secret_length,
+                                  log_dict, echo=False, workers=None):
         """ Gets candidate points from vaults and interpolates on subsets in order
             to verify CRC (coordinates from interpolated polynomial consists of secret and CRC.
             If CRC matches, then match is found (vault is opened).
-            :param vault: decoded vault
+            If Constants.ALGEBRAIC_DECODING is set, all candidate points are decoded at once with Gao's decoder first
+            and subsets are only evaluated if that fails (and Constants.ALGEBRAIC_DECODING_FALLBACK is set).
+            The decoder that found the match is logged in log_dict['decoder'], the amount of checked polynomials and
+            rejections by too big coefficients or wrong CRC are added to log_dict['crc_checked'],
+            log_dict['crc_rejected_coefficient'] and log_dict['crc_rejected_crc'].
+            With more than one worker, subsets are split across reused worker processes (SubsetEvaluationPool).
+            Otherwise all subsets (not random subset evaluation) are interpolated incrementally if
+            Constants.INCREMENTAL_INTERPOLATION is set
+            :param decode_context: decoding attempt with candidate minutiae and function points
             :param degree: degree of polynomial
-            :param gf_exp: exponential in GF(2**gf_exp)
             :param crc_length: length of CRC
             :param secret_length: length of secret
             :param log_dict: dictionary for logging (logs amount of subsets that were evaluated if CRC matched)
             :param echo: if True, printing intermediate messages to console
+            :param workers: amount of processes evaluating subsets, Constants.SUBSET_EVAL_WORKERS if None
             :returns True if match is found, False otherwise """
 
-        def generate_all_subsets_version(candidate_tuples):
-            """ Generating all subsets first before interpolating and checking CRC """
-            # calculate all subsets using possible candidate vault tuples
-            subsets = list(combinations(candidate_tuples, degree + 1))
-            # shuffle subsets, so that false (chaff) points are not iterated one after another
-            shuffle(subsets)
+        def decode_algebraic(candidate_tuples):
+            """ Decoding polynomial from all candidate points at once and checking CRC """
+            X, Y = list(zip(*candidate_tuples))
+            # decoder needs pairwise distinct x-coordinates
+            if len(set(X)) != len(X):
+                return False
+            X = [self.K.element_from_int(x) for x in X]
+            Y = [self.K.element_from_int(y) for y in Y]
+            poly = self.decoder.decode(X, Y, degree + 1)
+            if echo:
+                print('Algebraically decoded secret polynomial is: {}'.format(
+                    poly if poly is None else [self.K.element_to_int(c) for c in poly]))
+            if poly is not None and verifier.verify(poly, self.K.element_to_int):
+                log_dict['decoder'] = 'gao'
+                log_dict['evaluated_subsets'] = 0
+                if echo:
+                    print('Match found with algebraic decoding')
+                return True
+            if echo:
+                print('Algebraic decoding failed with {} candidate points'.format(len(candidate_tuples)))
+            return False
+
+        def evaluate_subsets(candidate_list):
+            """ Interpolate on all subsets in random order (SubsetEnumerator) until CRC matches """
+            enumerator = SubsetEnumerator(len(candidate_list), degree + 1, seed)
             if echo:
                 print('Total of {} candidate minutiae and {} subsets found'.format(
-                    len(candidate_tuples), len(subsets)
+                    len(candidate_list), len(enumerator)
                 ))
             # log total subsets
-            log_dict['total_subsets'] = len(subsets)
+            log_dict['total_subsets'] = len(enumerator)
 
-            for i, subset in enumerate(subsets, 1):
+            for i, subset_indices in enumerate(enumerator, 1):
                 if echo:
                     print('Interpolating subset #{}...'.format(i))
-                # use all points in subset execute polynomial interpolation
-                # divide subset tuples to two list x and y again
-                X, Y = list(zip(*subset))
-                X = GaloisConverter.convert_int_list_to_gf_2_list(X, gf_exp)
-                Y = GaloisConverter.convert_int_list_to_gf_2_list(Y, gf_exp)
-                poly = self.extract_polynomial_gf_2(X, Y)
-                if echo:
-                    print('Interpolated secret polynomial is: {}'.format(poly))
-                if PolynomialExtractor.check_crc_in_poly(poly, degree, crc_length, secret_length):
+                # interpolate polynomial on all points of subset and check CRC
+                if self.check_subset([candidate_list[j] for j in subset_indices], verifier):
                     log_dict['evaluated_subsets'] = i
+                    log_dict['decoder'] = 'subsets'
                     if echo:
                         print('Match found with subsets evaluated: {}'.format(i))
                     return True
                 else:
                     if echo:
-                        print('Unfortunately, failure in verifying CRC in above interpolated polynomial')
+                        print('Unfortunately, failure in verifying CRC in interpolated polynomial')
             if echo:
                 print('Failure in all polynomial CRC verifications\n')
             log_dict['evaluated_subsets'] = -1
             return False
 
-        def evaluate_random_subsets(candidate_tuples):
-            """ Take random subsets on the fly and interpolate until max threshold reached """
-            n = len(candidate_tuples)
+        def evaluate_subsets_incremental(candidate_list):
+            """ Walk all subsets in revolving door order, consecutive subsets differ in one point,
+                so every interpolation after the first one is an O(k) update of the previous polynomial """
+            # shuffle points, so that false (chaff) points are not iterated one after another
+            candidate_list = list(candidate_list)
+            Random(seed).shuffle(candidate_list)
+            X = [self.K.element_from_int(x) for x, _ in candidate_list]
+            Y = [self.K.element_from_int(y) for _, y in candidate_list]
+            n = len(candidate_list)
             k = degree + 1
-            try:
-                max_threshold = factorial(n) // factorial(k) // factorial(n - k)
-            except ValueError:
-                max_threshold = 0
-
-            log_dict['total_subsets'] = max_threshold
+            log_dict['total_subsets'] = SubsetEnumerator(n, k).total
+            if echo:
+                print('Total of {} candidate minutiae and {} subsets found'.format(n, log_dict['total_subsets']))
 
-            for i in range(max_threshold):
+            for i, (subset_indices, removed, added) in enumerate(SubsetEnumerator.revolving_door(n, k), 1):
                 if echo:
                     print('Interpolating subset #{}...'.format(i))
-                subset = sample(candidate_tuples, k)
-                # use all points in subset execute polynomial interpolation
-                # divide subset tuples to two list x and y again
-                X, Y = list(zip(*subset))
-                X = GaloisConverter.convert_int_list_to_gf_2_list(X, gf_exp)
-                Y = GaloisConverter.convert_int_list_to_gf_2_list(Y, gf_exp)
-                poly = self.extract_polynomial_gf_2(X, Y)
+                if removed is None:
+                    poly = self.incremental_interpolator.reset([X[j] for j in subset_indices],
+                                                               [Y[j] for j in subset_indices])
+                else:
+                    poly = self.incremental_interpolator.swap(X[removed], X[added], Y[added])
                 if echo:
-                    print('Interpolated secret polynomial is: {}'.format(poly))
-                if PolynomialExtractor.check_crc_in_poly(poly, degree, crc_length, secret_length):
+                    print('Interpolated secret polynomial is: {}'.format([self.K.element_to_int(c) for c in poly]))
+                if verifier.verify(poly, self.K.element_to_int):
                     log_dict['evaluated_subsets'] = i
+                    log_dict['decoder'] = 'subsets'
                     if echo:
                         print('Match found with subsets evaluated: {}'.format(i))
                     return True
@@ -159,12 +201,147 @@ class PolynomialExtractor:
             log_dict['evaluated_subsets'] = -1
             return False
 
-        gf_exp = self.gf_exp
+        def evaluate_subsets_parallel(candidate_list):
+            """ Split the random order of subsets across the reused worker processes (see SubsetEvaluationPool),
+                the first match in the random order is the same as in evaluate_subsets """
+            total = SubsetEnumerator(len(candidate_list), degree + 1, seed).total
+            log_dict['total_subsets'] = total
+            if echo:
+                print('Evaluating {} subsets of {} candidate minutiae with {} workers'.format(
+                    total, len(candidate_list), workers))
+
+            match_index, worker_counts = SubsetEvaluationPool.get(workers).evaluate(
+                self.gf_exp, self.gf_backend, candidate_list, seed, total, degree, crc_length, secret_length)
+            for counts in worker_counts:
+                verifier.add_counts(counts)
+
+            if match_index is not None:
+                log_dict['evaluated_subsets'] = match_index + 1
+                log_dict['decoder'] = 'subsets'
+                if echo:
+                    print('Match found with subsets evaluated: {}'.format(match_index + 1))
+                return True
+            if echo:
+                print('Failure in all polynomial CRC verifications\n')
+            log_dict['evaluated_subsets'] = -1
+            return False
+
+        if workers is None:
+            workers = Constants.SUBSET_EVAL_WORKERS
+
+        candidate_vault_tuples = set(zip(decode_context.vault_original_minutiae_rep,
+                                         decode_context.vault_function_points_rep))
+        # subsets are drawn from the sorted candidates, so the same seed always evaluates the same subsets
+        candidate_list = sorted(candidate_vault_tuples)
+        seed = Constants.SUBSET_EVAL_SEED if Constants.SUBSET_EVAL_SEED is not None else getrandbits(64)
+        verifier = CRCVerifier(degree, crc_length, secret_length)
+        try:
+            if Constants.ALGEBRAIC_DECODING and candidate_list:
+                if decode_algebraic(candidate_list):
+                    return True
+                if not Constants.ALGEBRAIC_DECODING_FALLBACK:
+                    log_dict['evaluated_subsets'] = -1
+                    return False
+            # both variants enumerate every subset at most once in random order, flag is kept for the logs
+            log_dict['subset_eval_random'] = \
+                len(candidate_list) > Constants.SUBSET_EVAL_THRES or Constants.RANDOM_SUBSET_EVAL
+            if workers > 1:
+                return evaluate_subsets_parallel(candidate_list)
+            # incremental interpolation needs pairwise distinct x-coordinates
+            if Constants.INCREMENTAL_INTERPOLATION and not log_dict['subset_eval_random'] and \
+                    len(set(x for x, _ in candidate_list)) == len(candidate_list):
+                return evaluate_subsets_incremental(candidate_list)
+            return evaluate_subsets(candidate_list)
+        finally:
+            # log how many interpolated polynomials were rejected in which stage of the CRC check
+            verifier.add_to_log(log_dict)
+
+
+class SubsetEvaluationPool:
+    """ Worker processes evaluating shares of the random order of subsets (see evaluate_subsets_worker).
+        The processes are started on first use and reused by all verifications of this process. """
+    # pools by amount of workers
+    pools = dict()
+    # guards pools, evaluations on a pool run one after the other (its workers share the position of the match)
+    lock = threading.Lock()
+
+    def __init__(self, workers):
+        """
+        :param workers: amount of worker processes
+        """
+        self.workers = workers
+        self.pid = os.getpid()
+        # index of the first matching subset in the random order, total amount of subsets while there is none
+        self.first_match = multiprocessing.Value('q', 0)
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=init_subset_eval_worker,
+                                            initargs=(self.first_match,))
+
+    @staticmethod
+    def get(workers):
+        """ Pool with workers processes, started if there is none (or it was inherited from a parent process)
+            :returns SubsetEvaluationPool """
+        with SubsetEvaluationPool.lock:
+            pool = SubsetEvaluationPool.pools.get(workers)
+            if pool is None or pool.pid != os.getpid():
+                pool = SubsetEvaluationPool(workers)
+                SubsetEvaluationPool.pools[workers] = pool
+            return pool
+
+    def evaluate(self, gf_exp, gf_backend, candidate_list, seed, total, degree, crc_length, secret_length):
+        """ Evaluates the subsets of candidate_list in the random order of SubsetEnumerator, worker w evaluates
+            positions w, w + workers, w + 2 * workers, ... and all workers stop after the first match
+            :param total: amount of subsets
+            :returns tuple (index of the first matching subset in the random order or None, list of counts of
+            the CRCVerifier of every worker)
+            :raises BrokenProcessPool if a worker process died (the next evaluation starts new processes) """
+        with SubsetEvaluationPool.lock:
+            self.first_match.value = total
+            futures = [self.executor.submit(evaluate_subsets_worker, gf_exp, gf_backend, candidate_list, seed, w,
+                                            self.workers, degree, crc_length, secret_length)
+                       for w in range(self.workers)]
+            try:
+                worker_counts = [future.result() for future in futures]
+            except BrokenProcessPool:
+                del SubsetEvaluationPool.pools[self.workers]
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                raise
+            except Exception:
+                # stop the other workers before the pool is used again
+                self.first_match.value = -1
+                wait(futures)
+                raise
+            match_index = self.first_match.value
+            return (match_index if match_index < total else None), worker_counts
+
+
+# first_match of the SubsetEvaluationPool of this worker process
+worker_first_match = None
+
+
+def init_subset_eval_worker(first_match):
+    """ Initializer of the worker processes of SubsetEvaluationPool """
+    global worker_first_match
+    worker_first_match = first_match
+
 
-        candidate_vault_tuples = set(zip(vault.vault_original_minutiae_rep, vault.vault_function_points_rep))
-        if len(candidate_vault_tuples) > Constants.SUBSET_EVAL_THRES or Constants.RANDOM_SUBSET_EVAL:
-            log_dict['subset_eval_random'] = True
-            return evaluate_random_subsets(candidate_vault_tuples)
-        else:
-            log_dict['subset_eval_random'] = False
-            return generate_all_subsets_version(candidate_vault_tuples)
+def evaluate_subsets_worker(gf_exp, gf_backend, candidate_list, seed, start, step, degree, crc_length,
+                            secret_length):
+    """ Worker process of SubsetEvaluationPool evaluating its share of the subsets
+        :param candidate_list: list of candidate (x, y) tuples
+        :param seed: seed of the SubsetEnumerator, the same for all workers
+        :param start: position of the first subset in the random order that is evaluated by this worker
+        :param step: distance between subsets evaluated by this worker (amount of workers)
+        :returns counts of CRCVerifier """
+    poly_extractor = PolynomialExtractor(gf_exp, gf_backend)
+    verifier = CRCVerifier(degree, crc_length, secret_length)
+    enumerator = SubsetEnumerator(len(candidate_list), degree + 1, seed)
+    for index, subset_indices in zip(range(start, enumerator.total, step), enumerator.subsets(start, step)):
+        # subsets after the first match (of any worker) cannot change the result
+        if index > worker_first_match.value:
+            break
+        subset = [candidate_list[j] for j in subset_indices]
+        if poly_extractor.check_subset(subset, verifier):
+            with worker_first_match.get_lock():
+                worker_first_match.value = min(worker_first_match.value, index)
+            break
+    return verifier.counts()
@@ -4,18 +4,20 @@
 
 from bitstring import BitArray
 import binascii
+import numpy as np
 
-from Galois.Galois_Converter import GaloisConverter
-from Galois.Galois_Field import GF
+import Constants
+from Galois.Galois_Field_Factory import GaloisFieldFactory
 
 
 class PolynomialGenerator:
-    def __init__(self, secret_bytes, degree, crc_length, gf_exp):
+    def __init__(self, secret_bytes, degree, crc_length, gf_exp, gf_backend=None):
         """
         :param secret_bytes: secret in bytes format
         :param degree: polynomial degree as int
         :param crc_length: CRC length as int
         :param gf_exp: exponential in GF(2**gf_exp)
+        :param gf_backend: implementation of GF(2**gf_exp) ('int' or 'sympy'), Constants.GF_BACKEND if None
         """
         self.degree = degree
         self.crc_length = crc_length
@@ -29,10 +31,10 @@ class PolynomialGenerator:
         self.total_bit.append(self.checksum_bit)
 
         self.coefficients = self.extract_coefficients()
-        # save polynomial in GF 2**32 form for performance reasons
-        self.poly_gf_32 = GaloisConverter.convert_int_list_to_gf_2_list(self.coefficients, 32)
         # save galois field K for polynomial evaluations
-        self.K = GF(2, gf_exp)
+        self.K = GaloisFieldFactory.create_field(2, gf_exp, gf_backend or Constants.GF_BACKEND)
+        # save polynomial in GF form of K for performance reasons
+        self.poly_gf = [self.K.element_from_int(c) for c in self.coefficients]
 
     def prune_secret(self, secret_bit):
         """ Prunes secret if secret length + CRC length is not multiple of
@@ -67,23 +69,19 @@ class PolynomialGenerator:
             :param m: exponential in GF(2**m)
             :returns function result as int """
         m = self.gf_exp
-        if m == 32:
-            poly_gf = self.poly_gf_32
-        else:
-            poly_gf = GaloisConverter.convert_int_list_to_gf_2_list(self.coefficients, m)
-        x_gf = GaloisConverter.convert_int_to_element_in_gf_2(x, m)
-        y_gf = self.K.eval_poly(poly_gf, x_gf)
-        result = GaloisConverter.convert_gf_2_element_to_int(y_gf, m)
+        x_gf = self.K.element_from_int(x)
+        y_gf = self.K.eval_poly(self.poly_gf, x_gf)
+        result = self.K.element_to_int(y_gf)
         # Safety check
         if result > 2**m*2:
             raise ValueError('Too large number generated in polynomial GF(2**{}):{}'.format(m, result))
         return result
 
     def evaluate_polynomial_gf_2_array(self, array):
-        """ Evaluate polynomial on list of integers
-            :param array: list of integers
-            :param m: exponential in GF(2**m) """
-        result = []
-        for x in array:
-            result.append(self.evaluate_polynomial_gf_2(x))
-        return result
+        """ Evaluate polynomial on array of integers in GF(2**m) in one vectorized call
+            (element by element if the Galois Field backend has no array arithmetic)
+            :param array: list or numpy array (uint32) of integers
+            :returns function results as numpy array (uint32) """
+        if hasattr(self.K, 'eval_poly_array'):
+            return self.K.eval_poly_array(self.coefficients, array)
+        return np.array([self.evaluate_polynomial_gf_2(int(x)) for x in array], dtype=np.uint32)
@@ -0,0 +1,66 @@
+"""
+    Pose Estimator for pre-alignment of probe and vault minutiae (pose clustering with Hough voting)
+
+    Every pair of probe minutia and vault point implies a pose (rotation d_theta and translation dx, dy) that maps the
+    probe minutia onto the vault point. All pairs vote in a coarse (d_theta, dx, dy) accumulator, genuine
+    correspondences agree on the same pose and produce a peak. A pair of probe basis and gallery basis in geometric
+    hashing implies a pose in the same way, so pairs can be ordered by the votes of their pose.
+"""
+
+import numpy as np
+
+
+class PoseEstimator:
+    @staticmethod
+    def implied_poses(probe_minutiae, vault_points):
+        """
+        Poses mapping every probe minutia onto every vault point (rotation around origin, then translation).
+        Rotation is counterclockwise, the inverse of the rotation in GHTransformer.transform_minutia_to_basis
+        :param probe_minutiae: (M, 3) array of probe minutiae (x, y, theta)
+        :param vault_points: (N, 3) array of vault points (x, y, theta)
+        :return: tuple of (M, N) arrays (d_theta in degrees 0..359, dx, dy)
+        """
+        probe_minutiae = probe_minutiae.astype(np.float64)
+        vault_points = vault_points.astype(np.float64)
+        d_theta = np.mod(vault_points[None, :, 2] - probe_minutiae[:, None, 2], 360)
+        cos_d_theta = np.cos(np.radians(d_theta))
+        sin_d_theta = np.sin(np.radians(d_theta))
+        probe_x = probe_minutiae[:, None, 0]
+        probe_y = probe_minutiae[:, None, 1]
+        dx = vault_points[None, :, 0] - (probe_x * cos_d_theta - probe_y * sin_d_theta)
+        dy = vault_points[None, :, 1] - (probe_x * sin_d_theta + probe_y * cos_d_theta)
+        return d_theta, dx, dy
+
+    @staticmethod
+    def pose_votes(probe_minutiae, vault_points, theta_bin, xy_bin):
+        """
+        Votes of all pairs of probe minutia and vault point in accumulator with bins of size theta_bin and xy_bin.
+        Votes of neighbouring bins are summed up, so that poses close to a bin border are not split up
+        (rotation wraps around at 360 degrees)
+        :param probe_minutiae: (M, 3) array of probe minutiae (x, y, theta)
+        :param vault_points: (N, 3) array of vault points (x, y, theta)
+        :param theta_bin: bin size of rotation in degrees
+        :param xy_bin: bin size of translation
+        :return: (M, N) array of votes for the pose implied by pair of probe minutia i and vault point j
+        """
+        if not probe_minutiae.size or not vault_points.size:
+            return np.zeros((len(probe_minutiae), len(vault_points)), dtype=np.int32)
+        d_theta, dx, dy = PoseEstimator.implied_poses(probe_minutiae, vault_points)
+        theta_bins = int(np.ceil(360 / theta_bin))
+        theta_index = np.minimum((d_theta // theta_bin).astype(np.int64), theta_bins - 1)
+        # shift translation bins by one, so that there is an empty border for neighbour sums
+        x_index = np.floor(dx / xy_bin).astype(np.int64)
+        x_index -= x_index.min() - 1
+        y_index = np.floor(dy / xy_bin).astype(np.int64)
+        y_index -= y_index.min() - 1
+
+        accumulator = np.zeros((theta_bins, x_index.max() + 2, y_index.max() + 2), dtype=np.int32)
+        np.add.at(accumulator, (theta_index, x_index, y_index), 1)
+        summed = np.zeros_like(accumulator)
+        for theta_offset in (-1, 0, 1) if theta_bins > 2 else (0,):
+            rotated = np.roll(accumulator, theta_offset, axis=0)
+            for x_offset in (-1, 0, 1):
+                for y_offset in (-1, 0, 1):
+                    summed[:, 1:-1, 1:-1] += rotated[:, 1 + x_offset:rotated.shape[1] - 1 + x_offset,
+                                                     1 + y_offset:rotated.shape[2] - 1 + y_offset]
+        return summed[theta_index, x_index, y_index]
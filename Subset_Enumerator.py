@@ -0,0 +1,135 @@
+"""
+    Subset Enumerator yields every k-subset of n elements exactly once in (pseudo) random order
+
+    Subsets are identified by their rank in the combinatorial number system (0 <= rank < C(n, k)).
+    The ranks are permuted with a keyed Feistel network (cycle-walking to stay below C(n, k)), and every permuted rank
+    is unranked to its subset on the fly. Thus no subsets are stored and the memory usage is independent of C(n, k).
+    The same seed always yields the same order.
+
+    revolving_door walks all k-subsets so that consecutive subsets differ in exactly one element (Gray code),
+    which allows incremental interpolation.
+"""
+
+import random
+
+
+class SubsetEnumerator:
+    # rounds of the Feistel network used to permute the ranks
+    FEISTEL_ROUNDS = 4
+    MASK_64 = (1 << 64) - 1
+
+    def __init__(self, n, k, seed=None):
+        """
+        :param n: amount of elements
+        :param k: size of subsets
+        :param seed: seed of the random order as int, random if None
+        """
+        self.n = n
+        self.k = k
+        # binomials[c][i] = C(c, i) for c <= n and i <= k
+        self.binomials = [[0] * (k + 1) for _ in range(n + 1)]
+        for c in range(n + 1):
+            self.binomials[c][0] = 1
+            for i in range(1, min(c, k) + 1):
+                self.binomials[c][i] = self.binomials[c - 1][i - 1] + self.binomials[c - 1][i]
+        self.total = self.binomials[n][k] if 0 <= k <= n else 0
+
+        if seed is None:
+            seed = random.getrandbits(64)
+        key_generator = random.Random(seed)
+        self.round_keys = [key_generator.getrandbits(64) for _ in range(self.FEISTEL_ROUNDS)]
+        # Feistel network works on 2 * half_bits bits, which covers all ranks
+        self.half_bits = max(1, ((self.total - 1).bit_length() + 1) // 2) if self.total > 1 else 1
+        self.half_mask = (1 << self.half_bits) - 1
+
+    def __len__(self):
+        return self.total
+
+    def __iter__(self):
+        return self.subsets()
+
+    def mix(self, x, key):
+        """ Round function of the Feistel network (64 bit mixing function) """
+        x = (x ^ key) & self.MASK_64
+        x = ((x ^ (x >> 30)) * 0xbf58476d1ce4e5b9) & self.MASK_64
+        x = ((x ^ (x >> 27)) * 0x94d049bb133111eb) & self.MASK_64
+        return x ^ (x >> 31)
+
+    def feistel(self, x):
+        """ Bijection on all values with 2 * half_bits bits """
+        left, right = x >> self.half_bits, x & self.half_mask
+        for key in self.round_keys:
+            left, right = right, left ^ (self.mix(right, key) & self.half_mask)
+        return (left << self.half_bits) | right
+
+    def permuted_rank(self, index):
+        """ Rank of the subset at position index of the random order
+            :param index: position in random order, 0 <= index < total
+            :returns rank, 0 <= rank < total """
+        if not 0 <= index < self.total:
+            raise IndexError('Subset index {} out of range of {} subsets'.format(index, self.total))
+        rank = self.feistel(index)
+        # cycle-walking: apply permutation again until the value is a valid rank
+        while rank >= self.total:
+            rank = self.feistel(rank)
+        return rank
+
+    def unrank(self, rank):
+        """ Converts rank to subset with the combinatorial number system
+            :returns tuple of k element indices in ascending order """
+        subset = [0] * self.k
+        c = self.n
+        for i in range(self.k, 0, -1):
+            # largest c with C(c, i) <= rank
+            c -= 1
+            while self.binomials[c][i] > rank:
+                c -= 1
+            subset[i - 1] = c
+            rank -= self.binomials[c][i]
+        return tuple(subset)
+
+    def subsets(self, start=0, step=1):
+        """ Yields subsets at positions start, start + step, ... of the random order
+            (workers can split all subsets by using different start values and step = amount of workers)
+            :returns generator of tuples of k element indices """
+        for index in range(start, self.total, step):
+            yield self.unrank(self.permuted_rank(index))
+
+    @staticmethod
+    def revolving_door(n, k):
+        """ Yields all k-subsets of range(n) in revolving door order (Knuth, TAOCP 7.2.1.3, Algorithm R),
+            consecutive subsets differ by removing one element and adding another
+            :returns generator of tuples (subset as sorted list, removed element, added element),
+            removed and added element are None for the first subset """
+        if not 0 < k <= n:
+            if k == 0:
+                yield [], None, None
+            return
+        # c[1..k] is the current subset, c[k + 1] = n is a sentinel
+        c = [0] + list(range(k)) + [n]
+        previous = c[1:k + 1]
+        yield list(previous), None, None
+        while True:
+            # easy case: move the smallest element
+            if k % 2 and c[1] + 1 < c[2]:
+                c[1] += 1
+            elif not k % 2 and c[1] > 0:
+                c[1] -= 1
+            else:
+                # otherwise alternately try to decrease or increase c[j] for increasing j
+                j, decrease = 2, bool(k % 2)
+                while True:
+                    if j > k:
+                        return
+                    if decrease and c[j] >= j:
+                        c[j], c[j - 1] = c[j - 1], j - 2
+                        break
+                    if not decrease and c[j] + 1 < c[j + 1]:
+                        c[j - 1], c[j] = c[j], c[j] + 1
+                        break
+                    j, decrease = j + 1, not decrease
+            current = c[1:k + 1]
+            removed = set(previous).difference(current).pop()
+            added = set(current).difference(previous).pop()
+            previous = current
+            yield list(current), removed, added
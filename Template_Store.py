@@ -0,0 +1,123 @@
+"""
+    Template Store to get minutiae of fingerprint templates (.xyt files) as packed arrays
+
+    Every .xyt file is parsed only once into an int16 array with one row (x, y, theta, quality) per minutia, sorted by
+    descending quality (same order as MinutiaeExtractor.extract_minutiae_from_xyt). Arrays are kept in memory and
+    optionally saved as .npy files in a cache folder, which are loaded memory-mapped by later runs. Cache files are
+    named by path and modification time of the template, so a changed template is parsed again.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+from Minutia import MinutiaNBIS
+
+
+class TemplateStore:
+    # columns of template arrays
+    X = 0
+    Y = 1
+    THETA = 2
+    QUALITY = 3
+
+    def __init__(self, cache_folder=None):
+        """
+        :param cache_folder: folder of the binary cache (.npy files), no binary cache if None
+        """
+        self.cache_folder = cache_folder
+        # absolute path of template: (modification time in ns, template array)
+        self.templates = dict()
+
+    def __len__(self):
+        return len(self.templates)
+
+    def get_template(self, file_path):
+        """ Gets minutiae of a fingerprint .xyt file, parsing the file only if it is not in memory or in cache
+        :param file_path: path to .xyt file
+        :returns read-only (N, 4) int16 array of (x, y, theta, quality) with descending order of quality """
+        absolute_path = os.path.abspath(file_path)
+        mtime = os.stat(absolute_path).st_mtime_ns
+        stored = self.templates.get(absolute_path)
+        if stored is not None and stored[0] == mtime:
+            return stored[1]
+
+        template = None
+        cache_path = None
+        if self.cache_folder is not None:
+            cache_path = self.get_cache_path(absolute_path, mtime)
+            if os.path.exists(cache_path):
+                template = np.load(cache_path, mmap_mode='r')
+        if template is None:
+            template = TemplateStore.parse_xyt(absolute_path)
+            template.flags.writeable = False
+            if cache_path is not None:
+                self.write_cache(cache_path, template)
+        self.templates[absolute_path] = (mtime, template)
+        return template
+
+    def get_minutiae(self, file_path, amount=None):
+        """ Gets minutiae of a fingerprint .xyt file as Minutia objects
+        :param file_path: path to .xyt file
+        :param amount: amount of best quality minutiae, all minutiae if None
+        :returns a list of MinutiaNBIS with descending order of quality """
+        return TemplateStore.minutiae_from_array(self.get_template(file_path)[:amount])
+
+    def get_cache_path(self, absolute_path, mtime):
+        """ :returns path of cache file of template at absolute_path with modification time mtime """
+        path_hash = hashlib.sha1(absolute_path.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_folder, '{}_{}.npy'.format(path_hash, mtime))
+
+    def write_cache(self, cache_path, template):
+        """ Saves template to cache_path and removes cache files of older versions of the same template.
+        File is written under a temporary name and renamed, so other processes never load a partial file """
+        os.makedirs(self.cache_folder, exist_ok=True)
+        prefix = os.path.basename(cache_path).rsplit('_', 1)[0] + '_'
+        temp_path = '{}.{}.tmp'.format(cache_path, os.getpid())
+        with open(temp_path, 'wb') as file:
+            np.save(file, template)
+        os.replace(temp_path, cache_path)
+        for file_name in os.listdir(self.cache_folder):
+            if file_name.startswith(prefix) and file_name.endswith('.npy') and \
+                    file_name != os.path.basename(cache_path):
+                try:
+                    os.remove(os.path.join(self.cache_folder, file_name))
+                except FileNotFoundError:
+                    pass
+
+    def clear(self):
+        """ Removes all templates from memory (cache files are kept) """
+        self.templates.clear()
+
+    @staticmethod
+    def parse_xyt(file_path):
+        """ Parses a fingerprint .xyt file (one minutia 'x y theta quality' per line)
+        :returns (N, 4) int16 array of (x, y, theta, quality) with descending order of quality
+        (minutiae of same quality stay in file order) """
+        with open(file_path, 'rb') as file:
+            values = file.read().split()
+        if len(values) % 4:
+            raise ValueError('{} does not consist of lines with x, y, theta and quality'.format(file_path))
+        template = np.array(values, dtype=np.int64).reshape(-1, 4)
+        lower = [MinutiaNBIS.X_MIN, MinutiaNBIS.Y_MIN, MinutiaNBIS.THETA_MIN, MinutiaNBIS.QUALITY_MIN]
+        upper = [MinutiaNBIS.X_MAX, MinutiaNBIS.Y_MAX, MinutiaNBIS.THETA_MAX, MinutiaNBIS.QUALITY_MAX]
+        if np.any(template < lower) or np.any(template > upper):
+            raise ValueError('{} contains minutiae out of range of MinutiaNBIS'.format(file_path))
+        order = np.argsort(-template[:, TemplateStore.QUALITY], kind='stable')
+        return template[order].astype(np.int16)
+
+    @staticmethod
+    def minutiae_from_array(template):
+        """ Converts rows of a template array to Minutia objects
+        :param template: (N, 4) array of (x, y, theta, quality)
+        :returns list of MinutiaNBIS """
+        return [MinutiaNBIS(x, y, theta, quality) for x, y, theta, quality in template.tolist()]
+
+    @staticmethod
+    def iter_minutiae(template):
+        """ Yields rows of a template array as Minutia objects, created only when they are needed
+        :param template: (N, 4) array of (x, y, theta, quality)
+        :returns generator of MinutiaNBIS """
+        for x, y, theta, quality in template.tolist():
+            yield MinutiaNBIS(x, y, theta, quality)
@@ -4,17 +4,44 @@
 
 from bitstring import BitArray
 import binascii
+from contextlib import contextmanager, redirect_stdout
 from itertools import permutations
+import itertools
 import datetime
+import io
+import math
+import os
+import random
+import shutil
+import tempfile
+from types import SimpleNamespace
 
-from Polynomial_Extractor import PolynomialExtractor
+import numpy as np
+
+import Main
+from Polynomial_Extractor import PolynomialExtractor, SubsetEvaluationPool
 from Polynomial_Generator import PolynomialGenerator
 import Vault_Verifier
 from Minutia import *
 from Minutiae_Extractor import MinutiaeExtractor
-from Geometric_Hashing_Transformer import GHTransformer
+from Geometric_Hashing_Transformer import GHTransformer, GHElementEnrollment, GHElementVerification, GHThetaIndex
 import Constants
 from Minutia_Converter import MinutiaConverter
+from Chaff_Points_Generator import ChaffPointsGenerator
+from CRC_Verifier import CRCVerifier
+from Database_Runner import DatabaseRunner, RunJournal
+from Experiment_Parameters import ExperimentParameters
+from Galois.Galois_Field_Factory import GaloisFieldFactory
+from Galois.Incremental_Interpolator import IncrementalInterpolator
+from Galois.Lagrange_Interpolator import LagrangeInterpolator
+from Galois.Reed_Solomon_Decoder import GaoDecoder
+from Subset_Enumerator import SubsetEnumerator
+from Template_Store import TemplateStore
+from Vault import Vault, VaultElement, VaultDecodeContext, CompactVault
+from Vault_Identifier import VaultIdentifier
+from Vault_Verifier import VaultVerifier
+from Work_Coordinator import WorkCoordinator
+from Pose_Estimator import PoseEstimator
 
 now = datetime.datetime.now()
 
@@ -197,9 +224,815 @@ def test_poly_in_gf(x):
     print(poly_gen.evaluate_polynomial_gf_2(x, 32))
 
 
+# Regression tests of the optimized implementations against the reference implementations (run with python Tests.py)
+
+
+@contextmanager
+def constants(**values):
+    """ Sets Constants to values and restores them afterwards """
+    previous = {name: getattr(Constants, name) for name in values}
+    for name, value in values.items():
+        setattr(Constants, name, value)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            setattr(Constants, name, value)
+
+
+def random_minutiae(amount, generator, minutia_class=MinutiaNBIS):
+    """ :returns list of amount random minutiae within the boundaries of minutia_class """
+    return [minutia_class(generator.randrange(minutia_class.X_MIN, minutia_class.X_MAX),
+                          generator.randrange(minutia_class.Y_MIN, minutia_class.Y_MAX),
+                          generator.randrange(minutia_class.THETA_MIN, minutia_class.THETA_MAX))
+            for _ in range(amount)]
+
+
+def write_random_finger(folder, finger, poses, generator, minutiae_amount=40):
+    """ Writes .xyt templates of a random finger captured with poses (rotation around the image center in degrees,
+        translation) and small jitter
+        :returns list of paths of the templates """
+    minutiae = []
+    while len(minutiae) < minutiae_amount:
+        x, y = generator.randrange(80, 480), generator.randrange(80, 480)
+        if all(math.hypot(x - other_x, y - other_y) > 20 for other_x, other_y, _, _ in minutiae):
+            minutiae.append((x, y, generator.randrange(360), generator.randrange(10, 100)))
+    paths = []
+    for capture, (angle, dx, dy) in enumerate(poses, 1):
+        cos_angle, sin_angle = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+        paths.append(os.path.join(folder, '{}_{}.xyt'.format(finger, capture)))
+        with open(paths[-1], 'w') as file:
+            for x, y, theta, quality in minutiae:
+                x, y = x - 280, y - 280
+                file.write('{} {} {} {}\n'.format(
+                    round(x * cos_angle - y * sin_angle + 280 + dx) + generator.randint(-2, 2),
+                    round(x * sin_angle + y * cos_angle + 280 + dy) + generator.randint(-2, 2),
+                    (theta + angle + generator.randint(-2, 2)) % 360, quality))
+    return paths
+
+
+@contextmanager
+def memory_template_store():
+    """ Main reads templates without binary cache (templates of tests are temporary) """
+    template_store = Main.template_store
+    Main.template_store = TemplateStore()
+    try:
+        yield
+    finally:
+        Main.template_store = template_store
+
+
+def enroll_random_vault(xyt_path, secret):
+    """ :returns Vault with geometric hashing table enrolled from template at xyt_path with Constants """
+    log_dict = {}
+    Main.initialize_log_dict(log_dict)
+    vault = Main.generate_vault(xyt_path, Constants.MINUTIAE_POINTS_AMOUNT, Constants.CHAFF_POINTS_AMOUNT,
+                                Constants.POLY_DEGREE, secret, Constants.CRC_LENGTH, Constants.GF_2_M, log_dict)
+    vault.create_geom_table()
+    return vault
+
+
+def test_gf_int_backend():
+    """ GFInt multiplication and inversion equal the sympy backend """
+    generator = random.Random(1)
+    gf_int = GaloisFieldFactory.create_field(2, GF_2_M, GaloisFieldFactory.BACKEND_INT)
+    gf_sympy = GaloisFieldFactory.create_field(2, GF_2_M, GaloisFieldFactory.BACKEND_SYMPY)
+    for _ in range(200):
+        x = generator.getrandbits(GF_2_M)
+        y = generator.getrandbits(GF_2_M)
+        product = gf_sympy.mul(gf_sympy.element_from_int(x), gf_sympy.element_from_int(y))
+        assert gf_int.mul(x, y) == gf_sympy.element_to_int(product)
+        if x:
+            assert gf_int.inv(x) == gf_sympy.element_to_int(gf_sympy.inv(gf_sympy.element_from_int(x)))
+            assert gf_int.mul(x, gf_int.inv(x)) == 1
+
+
+def test_polynomial_array():
+    """ secret polynomial evaluated on an array with the int backend equals evaluation point by point with sympy """
+    generator = random.Random(14)
+    degree, crc_length, secret_length = 8, 32, 112
+    secret_bytes = bytes(generator.getrandbits(8) for _ in range(secret_length // 8))
+    poly_gen_int = PolynomialGenerator(secret_bytes, degree, crc_length, GF_2_M, GaloisFieldFactory.BACKEND_INT)
+    poly_gen_sympy = PolynomialGenerator(secret_bytes, degree, crc_length, GF_2_M, GaloisFieldFactory.BACKEND_SYMPY)
+    X = [generator.getrandbits(GF_2_M) for _ in range(100)] + [0, 1, 2 ** GF_2_M - 1]
+    Y = poly_gen_int.evaluate_polynomial_gf_2_array(np.array(X, dtype=np.uint32))
+    assert Y.dtype == np.uint32
+    assert Y.tolist() == [poly_gen_sympy.evaluate_polynomial_gf_2(x) for x in X]
+    assert poly_gen_sympy.evaluate_polynomial_gf_2_array(X).tolist() == Y.tolist()
+
+
+def test_lagrange_interpolation():
+    """ LagrangeInterpolator (batch inversion) equals the reference interpolation """
+    generator = random.Random(2)
+    poly_extractor = PolynomialExtractor(GF_2_M, GaloisFieldFactory.BACKEND_INT)
+    interpolator = LagrangeInterpolator(poly_extractor.K)
+    for k in (2, 5, 9):
+        X = generator.sample(range(1, 1 << GF_2_M), k)
+        Y = [generator.getrandbits(GF_2_M) for _ in range(k)]
+        reference = poly_extractor.interpolate_lagrange_poly_in_field(X, Y)
+        poly = interpolator.interpolate(X, Y)
+        assert [0] * (len(poly) - len(reference)) + reference == poly
+
+
+def test_gao_decoding():
+    """ Gao's decoder corrects up to (n - k) / 2 errors and never returns the secret beyond """
+    generator = random.Random(4)
+    K = GaloisFieldFactory.create_field(2, GF_2_M, GaloisFieldFactory.BACKEND_INT)
+    decoder = GaoDecoder(K)
+    n, k = 30, 9
+    for errors in range((n - k) // 2 - 1, (n - k) // 2 + 3):
+        poly = [generator.getrandbits(GF_2_M) for _ in range(k)]
+        X = generator.sample(range(1, 1 << GF_2_M), n)
+        Y = [K.eval_poly(poly, x) for x in X]
+        for i in generator.sample(range(n), errors):
+            Y[i] ^= generator.getrandbits(GF_2_M) or 1
+        decoded = decoder.decode(X, Y, k)
+        if 2 * errors <= n - k:
+            assert decoded == poly
+        else:
+            assert decoded != poly
+
+
+def test_parallel_subset_evaluation():
+    """ subsets evaluated by worker processes find the same match after the same subsets as the serial evaluation """
+    generator = random.Random(12)
+    degree, crc_length, secret_length = 4, 32, 48
+    for secret_seed in range(3):
+        secret_bytes = bytes(generator.getrandbits(8) for _ in range(secret_length // 8))
+        poly_gen = PolynomialGenerator(secret_bytes, degree, crc_length, GF_2_M, 'int')
+        X = generator.sample(range(1, 1 << GF_2_M), 15)
+        decode_context = VaultDecodeContext()
+        for i, x in enumerate(X):
+            decode_context.add_minutia_rep(x)
+            # 7 genuine points and 8 chaff points (no match if the genuine points are less than degree + 1)
+            genuine = i < (7 if secret_seed < 2 else degree)
+            decode_context.add_function_point_rep(poly_gen.evaluate_polynomial_gf_2(x) if genuine
+                                                  else generator.getrandbits(GF_2_M))
+        logs = []
+        with constants(SUBSET_EVAL_SEED=secret_seed, INCREMENTAL_INTERPOLATION=False):
+            for workers in (1, 2):
+                log_dict = {}
+                match = PolynomialExtractor(GF_2_M, 'int').interpolate_and_check_crc(
+                    decode_context, degree, crc_length, secret_length, log_dict, workers=workers)
+                logs.append((match, log_dict['total_subsets'], log_dict['evaluated_subsets']))
+        assert logs[0] == logs[1]
+        assert logs[0][0] == (secret_seed < 2)
+    # worker processes are reused
+    assert SubsetEvaluationPool.get(2) is SubsetEvaluationPool.get(2)
+
+
+def test_subset_enumerator():
+    """ SubsetEnumerator yields every subset exactly once, also if split across workers """
+    for n, k in ((10, 4), (7, 7), (12, 1), (13, 5)):
+        all_subsets = set(itertools.combinations(range(n), k))
+        enumerator = SubsetEnumerator(n, k, seed=4)
+        subsets = list(enumerator)
+        assert len(subsets) == len(enumerator) == len(all_subsets)
+        assert set(subsets) == all_subsets
+        assert subsets == list(SubsetEnumerator(n, k, seed=4))
+        # strided split: workers evaluate disjoint shares in the same order
+        workers = 3
+        shares = [list(enumerator.subsets(start, workers)) for start in range(workers)]
+        assert sorted(subset for share in shares for subset in share) == sorted(subsets)
+        for start, share in enumerate(shares):
+            assert share == subsets[start::workers]
+
+
+def test_repeated_x_subsets():
+    """ subsets with repeated x-coordinates are rejected as wrong CRC instead of failing in the interpolation """
+    poly_extractor = PolynomialExtractor(GF_2_M, GaloisFieldFactory.BACKEND_INT)
+    verifier = CRCVerifier(2, 32, 64)
+    assert not poly_extractor.check_subset([(5, 1), (5, 2), (7, 3)], verifier)
+    assert verifier.counts() == (1, 0, 1)
+
+
+def test_incremental_interpolation():
+    """ IncrementalInterpolator along the revolving door order equals a new interpolation of every subset """
+    generator = random.Random(3)
+    K = GaloisFieldFactory.create_field(2, GF_2_M, GaloisFieldFactory.BACKEND_INT)
+    interpolator = LagrangeInterpolator(K)
+    incremental_interpolator = IncrementalInterpolator(K)
+    n, k = 9, 4
+    X = generator.sample(range(1, 1 << GF_2_M), n)
+    Y = [generator.getrandbits(GF_2_M) for _ in range(n)]
+    subsets = set()
+    for subset, removed, added in SubsetEnumerator.revolving_door(n, k):
+        if removed is None:
+            poly = incremental_interpolator.reset([X[j] for j in subset], [Y[j] for j in subset])
+        else:
+            poly = incremental_interpolator.swap(X[removed], X[added], Y[added])
+        assert poly == interpolator.interpolate([X[j] for j in subset], [Y[j] for j in subset])
+        subsets.add(tuple(subset))
+    assert subsets == set(itertools.combinations(range(n), k))
+
+
+def check_crc_in_poly_bitarray(poly, degree, crc_length, secret_length):
+    """ Reference CRC check with BitArray (CRCVerifier replaced it) """
+    poly = poly[len(poly) - (degree + 1):]
+    result = BitArray()
+    coefficient_length = (crc_length + secret_length) // (degree + 1)
+    for coefficient in poly:
+        if coefficient.bit_length() > coefficient_length:
+            return False
+        result.append(BitArray(uint=coefficient, length=coefficient_length))
+    return result[-crc_length:].uint == binascii.crc32(result[:-crc_length].bytes)
+
+
+def test_crc_verifier():
+    """ CRCVerifier accepts exactly the polynomials accepted by the reference BitArray check """
+    generator = random.Random(5)
+    degree, crc_length, secret_length = 8, 32, 112
+    verifier = CRCVerifier(degree, crc_length, secret_length)
+    coefficient_length = (crc_length + secret_length) // (degree + 1)
+    for i in range(300):
+        secret_bytes = bytes(generator.getrandbits(8) for _ in range(secret_length // 8))
+        poly = PolynomialGenerator(secret_bytes, degree, crc_length, GF_2_M, 'int').coefficients
+        poly = [int(coefficient) for coefficient in poly]
+        if i % 3 == 1:
+            # flip one bit
+            position = generator.randrange(degree + 1)
+            poly[position] ^= 1 << generator.randrange(coefficient_length)
+        elif i % 3 == 2:
+            # too big coefficient
+            poly[generator.randrange(degree + 1)] |= 1 << coefficient_length
+        expected = check_crc_in_poly_bitarray(poly, degree, crc_length, secret_length)
+        assert expected == (i % 3 == 0)
+        assert verifier.verify(poly) == expected
+        # leading zeros are ignored
+        assert verifier.verify([0, 0] + poly) == expected
+    assert verifier.counts() == (600, 200, 200)
+
+
+def test_geom_matching_modes():
+    """ pairwise, hash and vectorized geometric matching find the same matches """
+    generator = random.Random(6)
+    parameters = ExperimentParameters.from_constants()
+    for _ in range(20):
+        gallery = random_minutiae(30, generator)
+        # probe with minutiae close to the first half of the gallery minutiae and random minutiae
+        probe = [MinutiaNBIS(min(max(m.x + generator.randint(-5, 5), 0), MinutiaNBIS.X_MAX),
+                             min(max(m.y + generator.randint(-5, 5), 0), MinutiaNBIS.Y_MAX), m.theta)
+                 for m in gallery[:15]] + random_minutiae(15, generator)
+        enrollment = GHTransformer.convert_list_to_MinutiaNBIS_GH(gallery)
+        verification = GHTransformer.convert_list_to_MinutiaNBIS_GH(probe)
+        element_enrollment = GHElementEnrollment(enrollment[0], enrollment, [0] * len(enrollment))
+        element_verification = GHElementVerification(verification[0], verification)
+        minutiae_verification = element_verification.transformed_minutiae_list
+        matches = [Vault_Verifier.GEOM_MATCHING_MODES[mode](
+            element_enrollment, element_verification, minutiae_verification, parameters)
+            for mode in ('pairwise', 'hash', 'vectorized')]
+        assert matches[0]
+        assert matches[0] == matches[1] == matches[2]
+
+
+def test_geom_transform_array():
+    """ transformation of all minutiae to all bases as array equals transform_minutia_to_basis """
+    generator = random.Random(10)
+    bases = GHTransformer.convert_list_to_MinutiaNBIS_GH(random_minutiae(20, generator))
+    minutiae = GHTransformer.convert_list_to_MinutiaNBIS_GH(random_minutiae(50, generator))
+    transformed = GHTransformer.transform_minutiae_array(GHTransformer.minutiae_to_array(bases),
+                                                         GHTransformer.minutiae_to_array(minutiae))
+    assert transformed.shape == (20, 50, 3)
+    for b, basis in enumerate(bases):
+        for i, minutia in enumerate(minutiae):
+            reference = GHTransformer.transform_minutia_to_basis(basis, minutia)
+            assert transformed[b, i].tolist() == [reference.x, reference.y, reference.theta]
+
+
+def test_pose_votes():
+    """ rotated and translated copy of the gallery implies the inverse pose for its true pairs, which are ordered
+        first by their votes """
+    generator = random.Random(13)
+    for angle, dx, dy in ((0, 0, 0), (30, 40, -25), (-100, -60, 10), (179, 5, 70)):
+        gallery = np.array([(generator.randint(-200, 200), generator.randint(-200, 200), generator.randrange(360))
+                            for _ in range(40)])
+        cos_angle, sin_angle = np.cos(np.radians(angle)), np.sin(np.radians(angle))
+        probe = np.stack([np.round(gallery[:, 0] * cos_angle - gallery[:, 1] * sin_angle + dx),
+                          np.round(gallery[:, 0] * sin_angle + gallery[:, 1] * cos_angle + dy),
+                          np.mod(gallery[:, 2] + angle, 360)], axis=1).astype(np.int64)
+        # half of the probe minutiae are genuine, the gallery also contains chaff points
+        probe = np.concatenate([probe[:20], np.array([(generator.randint(-200, 200), generator.randint(-200, 200),
+                                                       generator.randrange(360)) for _ in range(20)])])
+        vault = np.concatenate([gallery, np.array([(generator.randint(-250, 250), generator.randint(-250, 250),
+                                                    generator.randrange(360)) for _ in range(200)])])
+        d_theta, implied_dx, implied_dy = PoseEstimator.implied_poses(probe[:20], vault[:20])
+        # inverse pose: rotation by -angle, translation by the rotated -(dx, dy)
+        assert np.all(np.diagonal(d_theta) == (-angle) % 360)
+        assert np.allclose(np.diagonal(implied_dx), -(dx * cos_angle + dy * sin_angle), atol=1.5)
+        assert np.allclose(np.diagonal(implied_dy), -(-dx * sin_angle + dy * cos_angle), atol=1.5)
+
+        votes = PoseEstimator.pose_votes(probe, vault, Constants.POSE_THETA_BIN, Constants.POSE_XY_BIN)
+        assert votes.shape == (40, 240)
+        # pairs implying a pose close to the true pose get votes of the true pairs from neighbouring bins
+        d_theta, implied_dx, implied_dy = PoseEstimator.implied_poses(probe, vault)
+        theta_distance = np.abs(np.mod(d_theta + angle + 180, 360) - 180)
+        dx_distance = np.abs(implied_dx + dx * cos_angle + dy * sin_angle)
+        dy_distance = np.abs(implied_dy - dx * sin_angle + dy * cos_angle)
+        far = (theta_distance > 2 * Constants.POSE_THETA_BIN) | (dx_distance > 2 * Constants.POSE_XY_BIN) | \
+            (dy_distance > 2 * Constants.POSE_XY_BIN)
+        # true pairs are ordered before all pairs implying a different pose
+        positions = np.empty(votes.size, dtype=np.int64)
+        positions[np.argsort(-votes, axis=None, kind='stable')] = np.arange(votes.size)
+        positions = positions.reshape(votes.shape)
+        assert positions[range(20), range(20)].max() < positions[far].min()
+
+
+def test_theta_index_wrap():
+    """ GHThetaIndex finds all bases within threshold, also across 0/360 degrees """
+    generator = random.Random(7)
+    thetas = [generator.randrange(360) for _ in range(200)] + [0, 359, 5, 355]
+    geom_table = [SimpleNamespace(basis=SimpleNamespace(theta=theta)) for theta in thetas]
+    index = GHThetaIndex.from_geom_table(geom_table)
+    for theta in (0, 1, 3, 180, 356, 359):
+        for threshold in (0, 4, 10, 179, 180):
+            expected = [i for i, basis_theta in enumerate(thetas)
+                        if min(abs(basis_theta - theta), 360 - abs(basis_theta - theta)) <= threshold]
+            assert index.query(theta, threshold).tolist() == expected
+
+
+def random_vault(amount, generator):
+    """ :returns Vault with geometric hashing table of amount random minutiae and random y values """
+    m_conv = MinutiaConverter()
+    vault = Vault()
+    for minutia in random_minutiae(amount, generator):
+        vault.add_vault_element(VaultElement(m_conv.get_uint_from_minutia(minutia), generator.getrandbits(GF_2_M)))
+    vault.create_geom_table()
+    return vault
+
+
+def test_compact_vault():
+    """ CompactVault keeps x and y representations and orientation index of a vault through a round trip """
+    generator = random.Random(15)
+    vault = random_vault(60, generator)
+    compact_vault = CompactVault.from_vault(vault)
+    assert compact_vault.vault_x.dtype == compact_vault.vault_y.dtype == np.uint32
+    assert [(element.x_rep, element.y_rep) for element in compact_vault.vault_final_elements_pairs] == \
+        [(element.x_rep, element.y_rep) for element in vault.vault_final_elements_pairs]
+    restored = compact_vault.to_vault()
+    assert [(element.x_rep, element.y_rep) for element in restored.vault_final_elements_pairs] == \
+        [(element.x_rep, element.y_rep) for element in vault.vault_final_elements_pairs]
+    # orientation index is reused by the restored geometric hashing table
+    assert restored.geom_theta_index is vault.geom_theta_index
+    assert GHThetaIndex.from_geom_table(restored.geom_table).order.tolist() == vault.geom_theta_index.order.tolist()
+    assert [element.basis.theta for element in restored.geom_table] == \
+        [element.basis.theta for element in vault.geom_table]
+    assert compact_vault.to_vault(geom_table=False).geom_table == []
+    try:
+        CompactVault([2 ** 32], [0])
+        assert False
+    except ValueError:
+        pass
+
+
+def test_decode_context():
+    """ decoding collects candidates in its own context and leaves the vault unchanged, so it can be decoded again """
+    generator = random.Random(16)
+    random.seed(16)
+    folder = tempfile.mkdtemp()
+    try:
+        with memory_template_store():
+            gallery_xyt, probe_xyt = write_random_finger(folder, 1, [(0, 0, 0), (5, 10, -10)], generator)
+            secret = Main.generate_smallest_secret(Constants.POLY_DEGREE, Constants.CRC_LENGTH, min_size=128)
+            vault = enroll_random_vault(gallery_xyt, secret)
+            elements = list(vault.vault_final_elements_pairs)
+            geom_table = list(vault.geom_table)
+            for _ in range(2):
+                log_dict = {}
+                Main.initialize_log_dict(log_dict)
+                decode_context = VaultDecodeContext()
+                assert VaultVerifier.unlock_vault_geom(
+                    vault, Main.template_store.get_minutiae(probe_xyt, Constants.MINUTIAE_POINTS_AMOUNT),
+                    Constants.POLY_DEGREE, Constants.GF_2_M, Constants.CRC_LENGTH, len(secret) * 8, log_dict,
+                    decode_context=decode_context)
+                assert len(decode_context.vault_original_minutiae_rep) == log_dict['minutiae_candidates'] > \
+                    Constants.POLY_DEGREE
+                assert vault.vault_final_elements_pairs == elements and vault.geom_table == geom_table
+                assert not vault.vault_original_minutiae_rep and not vault.vault_function_points_rep
+    finally:
+        shutil.rmtree(folder)
+
+
+def test_concurrent_verification():
+    """ verify_probes with threads and processes on a shared vault finds the same matches as serial verify,
+        expands a CompactVault once and does not change the vault """
+    generator = random.Random(16)
+    random.seed(16)
+    folder = tempfile.mkdtemp()
+    try:
+        with memory_template_store():
+            gallery_xyt, genuine_xyt = write_random_finger(folder, 1, [(0, 0, 0), (5, 10, -10)], generator)
+            impostor_xyt, = write_random_finger(folder, 2, [(0, 0, 0)], generator)
+            secret = Main.generate_smallest_secret(Constants.POLY_DEGREE, Constants.CRC_LENGTH, min_size=128)
+            vault = enroll_random_vault(gallery_xyt, secret)
+            probes = [Main.template_store.get_minutiae(xyt, Constants.MINUTIAE_POINTS_AMOUNT)
+                      for xyt in (genuine_xyt, impostor_xyt, genuine_xyt)]
+        arguments = (Constants.POLY_DEGREE, Constants.GF_2_M, Constants.CRC_LENGTH, len(secret) * 8)
+        elements = [(element.x_rep, element.y_rep) for element in vault.vault_final_elements_pairs]
+        geom_table = list(vault.geom_table)
+        compact_vault = CompactVault.from_vault(vault)
+        compact_arrays = (compact_vault.vault_x.copy(), compact_vault.vault_y.copy())
+
+        expected = [VaultVerifier.verify(vault, probe, *arguments).match for probe in probes]
+        assert expected == [True, False, True]
+        expansions = []
+        to_vault = CompactVault.to_vault
+
+        def counted_to_vault(self, *args):
+            expansions.append(self)
+            return to_vault(self, *args)
+        CompactVault.to_vault = counted_to_vault
+        try:
+            for shared_vault, use_processes in ((vault, False), (compact_vault, False), (compact_vault, True)):
+                results = VaultVerifier.verify_probes(shared_vault, probes, *arguments, workers=2,
+                                                      use_processes=use_processes)
+                assert [result.match for result in results] == expected
+                assert [result.probe_id for result in results] == [0, 1, 2]
+        finally:
+            CompactVault.to_vault = to_vault
+        # threads share one expanded vault (expansions in worker processes are not counted)
+        assert expansions == [compact_vault]
+        assert [(element.x_rep, element.y_rep) for element in vault.vault_final_elements_pairs] == elements
+        assert vault.geom_table == geom_table
+        assert all(np.array_equal(array, copy) for array, copy in
+                   zip((compact_vault.vault_x, compact_vault.vault_y), compact_arrays))
+    finally:
+        shutil.rmtree(folder)
+
+
+def test_identification():
+    """ genuine vaults are on the shortlist of a probe, identification stops at the first matching vault """
+    generator = random.Random(17)
+    random.seed(17)
+    folder = tempfile.mkdtemp()
+    try:
+        with memory_template_store():
+            secret = Main.generate_smallest_secret(Constants.POLY_DEGREE, Constants.CRC_LENGTH, min_size=128)
+            gallery = []
+            for finger in range(1, 9):
+                gallery_xyt, probe_xyt = write_random_finger(folder, finger, [(0, 0, 0), (5, 10, -10)], generator)
+                gallery.append(('finger_{}'.format(finger), enroll_random_vault(gallery_xyt, secret)))
+            # second vault of the last finger (other chaff points)
+            gallery.append(('finger_8_2', enroll_random_vault(gallery_xyt, secret)))
+            identifier = VaultIdentifier()
+            for vault_id, vault in gallery:
+                identifier.add_vault(CompactVault.from_vault(vault), vault_id)
+            probe = Main.template_store.get_minutiae(probe_xyt, Constants.MINUTIAE_POINTS_AMOUNT)
+            assert {vault_index for vault_index, _ in identifier.shortlist(probe, 2)} == {7, 8}
+
+            verified = []
+            verify = VaultVerifier.verify
+
+            def counted_verify(vault, *args):
+                verified.append(vault)
+                return verify(vault, *args)
+            VaultVerifier.verify = counted_verify
+            try:
+                # shortlist is verified in chunks of workers, no chunk is verified after the first match
+                for workers in (1, 3):
+                    verified.clear()
+                    with constants(VERIFY_WORKERS=workers, IDENTIFY_TOP_K=9):
+                        result = Main.run_identification(probe_xyt, [(vault_id, CompactVault.from_vault(vault))
+                                                                     for vault_id, vault in gallery], echo=False)
+                    assert result.match and result.vault_id in ('finger_8', 'finger_8_2')
+                    assert len(verified) == workers
+            finally:
+                VaultVerifier.verify = verify
+    finally:
+        shutil.rmtree(folder)
+
+
+def generate_chaff_points_reference(amount, genuine_minutiae, smallest_minutia_rep, minutia_converter,
+                                    points_distance):
+    """ Reference chaff point generation comparing every candidate with all vault points (grid sampler replaced it) """
+    chaff_points_list = []
+    all_vault_points = genuine_minutiae.copy()
+    for _ in range(amount):
+        plausible_minutia = False
+        while not plausible_minutia:
+            x_random = random.randrange(MinutiaNBIS.X_MIN, MinutiaNBIS.X_MAX)
+            y_random = random.randrange(MinutiaNBIS.Y_MIN, MinutiaNBIS.Y_MAX)
+            theta_random = random.randrange(MinutiaNBIS.THETA_MIN, MinutiaNBIS.THETA_MAX)
+            quality_random = random.randrange(MinutiaNBIS.QUALITY_MIN, MinutiaNBIS.QUALITY_MAX)
+            chaff_point = MinutiaNBIS(x_random, y_random, theta_random, quality_random)
+            if minutia_converter.get_uint_from_minutia(chaff_point) >= (smallest_minutia_rep // 2):
+                if all(chaff_point.distance_to(minutia) > points_distance for minutia in all_vault_points):
+                    chaff_points_list.append(chaff_point)
+                    all_vault_points.append(chaff_point)
+                    plausible_minutia = True
+    return chaff_points_list
+
+
+def test_chaff_points_grid():
+    """ grid chaff sampler yields the same chaff points as the reference sampler with the same random state """
+    m_conv = MinutiaConverter()
+    for seed, points_distance in ((9, 10), (10, 0), (11, 25)):
+        random.seed(seed)
+        genuine_minutiae = random_minutiae(30, random)
+        smallest_minutia_rep = min(m_conv.get_uint_from_minutia(m) for m in genuine_minutiae)
+        state = random.getstate()
+        reference = generate_chaff_points_reference(200, genuine_minutiae, smallest_minutia_rep, m_conv,
+                                                    points_distance)
+        random.setstate(state)
+        chaff_points = ChaffPointsGenerator.generate_chaff_points_randomly(
+            200, genuine_minutiae, smallest_minutia_rep, m_conv, points_distance)
+        assert [(m.x, m.y, m.theta, m.quality) for m in chaff_points] == \
+            [(m.x, m.y, m.theta, m.quality) for m in reference]
+        random.setstate(state)
+        chaff_points_reps = ChaffPointsGenerator.generate_chaff_points_rep_array(
+            200, genuine_minutiae, smallest_minutia_rep, m_conv, points_distance)
+        assert chaff_points_reps.tolist() == [m_conv.get_uint_from_minutia(m) for m in reference]
+
+
+def test_chaff_y_values():
+    """ random y values of chaff points are drawn in bulk: below 2**m, not on the polynomial and determined by the
+        random seed """
+    generator = random.Random(19)
+    m_conv = MinutiaConverter()
+    secret_bytes = bytes(generator.getrandbits(8) for _ in range(14))
+    poly_gen = PolynomialGenerator(secret_bytes, 8, 32, GF_2_M)
+    genuine_minutiae = random_minutiae(30, generator)
+    chaff_ys = []
+    for _ in range(2):
+        random.seed(19)
+        vault = Vault()
+        for minutia in genuine_minutiae:
+            vault.add_minutia_rep(m_conv.get_uint_from_minutia(minutia))
+        vault.vault_chaff_points_rep.extend(ChaffPointsGenerator.generate_chaff_points_rep_array(
+            300, genuine_minutiae, vault.get_smallest_original_minutia(), m_conv).tolist())
+        vault.evaluate_polynomial_on_minutiae(poly_gen)
+        vault.evaluate_random_on_chaff_points(poly_gen, GF_2_M)
+        chaff_elements = vault.vault_final_elements_pairs[30:]
+        assert [element.x_rep for element in chaff_elements] == vault.vault_chaff_points_rep
+        assert all(0 < element.y_rep < 2 ** GF_2_M and element.y_rep != poly_gen.evaluate_polynomial_gf_2(element.x_rep)
+                   for element in chaff_elements)
+        # y values of chaff points have as many digits as y values of genuine minutiae
+        digits = [len(str(element.y_rep)) for element in vault.vault_final_elements_pairs[:30]]
+        assert all(min(digits) <= len(str(element.y_rep)) <= max(digits) for element in chaff_elements)
+        chaff_ys.append([element.y_rep for element in chaff_elements])
+    assert chaff_ys[0] == chaff_ys[1]
+
+
+def test_minutia_converter():
+    """ shift/mask conversion is bit-identical to the bitstring conversion, also for arrays """
+    generator = random.Random(8)
+    m_conv = MinutiaConverter()
+    minutiae = random_minutiae(200, generator) + [MinutiaNBIS(0, 0, 0), MinutiaNBIS(560, 560, 360)]
+    for minutia in minutiae:
+        uint = m_conv.get_uint_from_minutia(minutia)
+        bitstring = m_conv.get_total_bitstring_from_minutia(minutia)
+        assert uint == bitstring.uint
+        restored = m_conv.get_minutia_from_uint(uint)
+        reference = m_conv.get_minutia_from_bitstring(BitArray(uint=uint, length=m_conv.TOTAL_BIT_LENGTH))
+        assert (restored.x, restored.y, restored.theta) == (reference.x, reference.y, reference.theta) == \
+            (minutia.x, minutia.y, minutia.theta)
+    minutiae_array = [(m.x, m.y, m.theta) for m in minutiae]
+    uint_array = m_conv.get_uint_array_from_minutiae_array(minutiae_array)
+    assert uint_array.tolist() == [m_conv.get_uint_from_minutia(m) for m in minutiae]
+    assert m_conv.get_minutiae_array_from_uint_array(uint_array).tolist() == [list(m) for m in minutiae_array]
+    # transformed minutiae with negative coordinates
+    minutiae_gh = random_minutiae(200, generator, MinutiaNBIS_GH)
+    minutiae_gh_array = [(m.x, m.y, m.theta) for m in minutiae_gh]
+    uint_gh_array = m_conv.get_uint_array_from_minutiae_array(minutiae_gh_array, non_negative=False)
+    assert uint_gh_array.tolist() == [m_conv.get_uint_from_minutia(m, non_negative=False) for m in minutiae_gh]
+    assert m_conv.get_minutiae_array_from_uint_array(uint_gh_array, non_negative=False).tolist() == \
+        [list(m) for m in minutiae_gh_array]
+
+
+def test_template_store():
+    """ TemplateStore parses templates in the order of MinutiaeExtractor, writes its cache under a temporary name and
+        parses a template again when it was changed """
+    generator = random.Random(21)
+    folder = tempfile.mkdtemp()
+    try:
+        xyt_path = os.path.join(folder, '1_1.xyt')
+        with open(xyt_path, 'w') as file:
+            # many minutiae of the same quality
+            for _ in range(60):
+                file.write('{} {} {} {}\n'.format(generator.randrange(560), generator.randrange(560),
+                                                  generator.randrange(360), generator.choice([10, 40, 41, 90])))
+        reference = [(m.x, m.y, m.theta, m.quality) for m in MinutiaeExtractor().extract_minutiae_from_xyt(xyt_path)]
+        assert [tuple(row) for row in TemplateStore.parse_xyt(xyt_path).tolist()] == reference
+
+        cache_folder = os.path.join(folder, 'cache')
+        store = TemplateStore(cache_folder)
+        replaced = []
+        replace = os.replace
+
+        def recorded_replace(source, destination):
+            replaced.append((source, destination))
+            replace(source, destination)
+        os.replace = recorded_replace
+        try:
+            template = store.get_template(xyt_path)
+        finally:
+            os.replace = replace
+        cache_path = store.get_cache_path(os.path.abspath(xyt_path), os.stat(xyt_path).st_mtime_ns)
+        assert len(replaced) == 1 and replaced[0][0].endswith('.tmp') and replaced[0][1] == cache_path
+        assert os.listdir(cache_folder) == [os.path.basename(cache_path)]
+        assert store.get_template(xyt_path) is template
+        # cache file is loaded by other stores
+        assert TemplateStore(cache_folder).get_template(xyt_path).tolist() == template.tolist()
+        assert [(m.x, m.y, m.theta, m.quality) for m in store.get_minutiae(xyt_path, 10)] == reference[:10]
+
+        # changed template is parsed again and replaces the old cache file
+        with open(xyt_path, 'w') as file:
+            file.write('1 2 3 4\n5 6 7 80\n')
+        mtime = os.stat(xyt_path).st_mtime_ns
+        os.utime(xyt_path, ns=(mtime + 10 ** 9, mtime + 10 ** 9))
+        assert store.get_template(xyt_path).tolist() == [[5, 6, 7, 80], [1, 2, 3, 4]]
+        assert os.listdir(cache_folder) == [os.path.basename(
+            store.get_cache_path(os.path.abspath(xyt_path), mtime + 10 ** 9))]
+    finally:
+        shutil.rmtree(folder)
+
+
+def test_database_runner_workers():
+    """ merged logs of a database run with 1 and 2 worker processes are the same for the same seed """
+    generator = random.Random(22)
+    folder = tempfile.mkdtemp()
+    try:
+        database_path = os.path.join(folder, 'database', '')
+        os.makedirs(database_path)
+        for finger in range(1, 4):
+            write_random_finger(database_path, finger, [(0, 0, 0), (5, 10, -10)], generator)
+        units = DatabaseRunner.plan_protocols(Main.list_database_xyt(database_path))
+        logs = []
+        with memory_template_store(), constants(CHAFF_POINTS_AMOUNT=100):
+            for workers in (1, 2):
+                results = DatabaseRunner.run(units, Main.run_experiment_reuse_vault, database_path,
+                                             os.path.join(folder, '{}_shards'.format(workers)), workers, seed=22)
+                log_files = {key: (os.path.join(folder, '{}_{}_param.csv'.format(workers, key)),
+                                   os.path.join(folder, '{}_{}_db.csv'.format(workers, key)))
+                             for key in (DatabaseRunner.LOG_ONE_TO_ONE, DatabaseRunner.LOG_FVC)}
+                for paths in log_files.values():
+                    for path in paths:
+                        open(path, 'w').close()
+                DatabaseRunner.merge(units, results, log_files)
+                run_logs = []
+                for log_parameter_file, log_db_file in log_files.values():
+                    with open(log_parameter_file, 'r') as log, open(log_db_file, 'r') as log_db:
+                        # without columns of times
+                        run_logs.append([line.split(';')[:9] + line.split(';')[15:] for line in log])
+                        run_logs.append(log_db.readlines())
+                logs.append(run_logs)
+        assert logs[0] == logs[1]
+        # 1vs1: 3 impostor and 3 genuine pairs, FVC: 3 impostor and 3 genuine pairs
+        assert [len(log) for log in logs[0]] == [6, 6, 6, 6]
+    finally:
+        shutil.rmtree(folder)
+
+
+def log_random_experiment(gallery_xyt, probe_xyts, database_path, log_parameter_file, log_db_file):
+    """ Experiment for DatabaseRunner that logs one random number per probe (results depend on the seed only) """
+    with open(log_parameter_file, 'a') as log, open(log_db_file, 'a') as log_db:
+        for probe_xyt in probe_xyts:
+            log.write('{} vs {};{}\n'.format(probe_xyt, gallery_xyt, random.random()))
+            log_db.write('{};{}\n'.format(gallery_xyt, probe_xyt))
+    with open(os.path.join(database_path, 'runs.txt'), 'a') as runs:
+        runs.write(gallery_xyt + '\n')
+
+
+def test_run_journal_resume():
+    """ interrupted run resumes with the units missing in the journal and writes the logs of a complete run """
+    folder = tempfile.mkdtemp()
+    try:
+        xyts = ['{}_{}.xyt'.format(finger, capture) for finger in range(1, 4) for capture in range(1, 4)]
+        units = DatabaseRunner.plan_all(xyts, xyts)
+
+        def run(name, run_units, journal):
+            """ :returns merged parameter log of run (None if only some units were run) """
+            results = DatabaseRunner.run(run_units, log_random_experiment, folder, os.path.join(folder, 'shards'), 1,
+                                         seed=12, journal=journal, parameters=name)
+            if len(run_units) != len(units):
+                return None
+            log_parameter_file = os.path.join(folder, name + '_param.csv')
+            log_db_file = os.path.join(folder, name + '_db.csv')
+            open(log_parameter_file, 'w').close()
+            open(log_db_file, 'w').close()
+            DatabaseRunner.merge(units, results, {DatabaseRunner.LOG_ALL: (log_parameter_file, log_db_file)})
+            with open(log_parameter_file, 'r') as log:
+                return log.read()
+
+        complete_log = run('complete', units, None)
+        journal_path = os.path.join(folder, 'journal.jsonl')
+        journal = RunJournal(journal_path)
+        assert journal.start('resumed', 12, {'all': ['a', 'b']}) == (12, {'all': ('a', 'b')})
+        # interrupted after 4 units, last record only partially written
+        run('resumed', units[:4], journal)
+        with open(journal_path, 'a') as file:
+            file.write('{"type": "unit", "param')
+        os.remove(os.path.join(folder, 'runs.txt'))
+
+        journal = RunJournal(journal_path)
+        assert journal.start('resumed', 13, {'all': ['c', 'd']}) == (12, {'all': ('a', 'b')})
+        assert sorted(journal.get_results('resumed', units)) == [0, 1, 2, 3]
+        assert run('resumed', units, journal) == complete_log
+        with open(os.path.join(folder, 'runs.txt'), 'r') as runs:
+            assert runs.read().split() == [unit.gallery_xyt for unit in units[4:]]
+        assert not journal.is_merged('resumed')
+        journal.set_merged('resumed')
+        assert RunJournal(journal_path).is_merged('resumed')
+    finally:
+        shutil.rmtree(folder)
+
+
+def test_work_coordinator_leases():
+    """ expired leases are taken over, fresh leases and leases of other workers are kept """
+    folder = tempfile.mkdtemp()
+    try:
+        os.makedirs(os.path.join(folder, WorkCoordinator.LEASES))
+        assert WorkCoordinator.claim(folder, 0, 'a', 60)
+        assert not WorkCoordinator.claim(folder, 0, 'b', 60)
+        assert WorkCoordinator.read_lease_owner(folder, 0) == 'a'
+        # lease of a is not renewed and expires
+        lease_path = WorkCoordinator.get_lease_path(folder, 0)
+        os.utime(lease_path, (0, 0))
+        assert WorkCoordinator.claim(folder, 0, 'b', 60)
+        assert WorkCoordinator.read_lease_owner(folder, 0) == 'b'
+        # a finishes late and must not remove the lease of b
+        WorkCoordinator.release(folder, 0, 'a')
+        assert WorkCoordinator.read_lease_owner(folder, 0) == 'b'
+        WorkCoordinator.release(folder, 0, 'b')
+        assert WorkCoordinator.read_lease_owner(folder, 0) is None
+        assert os.listdir(os.path.join(folder, WorkCoordinator.LEASES)) == []
+    finally:
+        shutil.rmtree(folder)
+
+
+def test_parameter_sweep():
+    """ parameter sets of a sweep with the same enrollment parameters share one vault per gallery template, and their
+        logs (named for the log summary) have the same results as separate runs with their Constants """
+    generator = random.Random(25)
+    folder = tempfile.mkdtemp()
+    try:
+        database_path = os.path.join(folder, 'database', '')
+        os.makedirs(database_path)
+        for finger in range(1, 3):
+            write_random_finger(database_path, finger, [(0, 0, 0), (5, 10, -10)], generator)
+        units = DatabaseRunner.plan_all(['1_1.xyt', '2_1.xyt'], Main.list_database_xyt(database_path))
+        grid = {'theta_threshold': [Constants.THETA_THRESHOLD, Constants.THETA_THRESHOLD // 2]}
+        vaults = []
+        generate_vault = Main.generate_vault
+        plan_database = Main.plan_database
+
+        def counted_generate_vault(*args, **kwargs):
+            vaults.append(args[0])
+            return generate_vault(*args, **kwargs)
+        Main.generate_vault = counted_generate_vault
+        # logs of split computation, which the log summary does not recognize
+        Main.plan_database = lambda path: (units, {DatabaseRunner.LOG_ALL: (Constants.LOG_FILE_PARAMETER_2A,
+                                                                            Constants.LOG_FILE_DATABASE_2A)})
+        try:
+            with memory_template_store(), constants(CHAFF_POINTS_AMOUNT=100, DB_RUNNER_SEED=25,
+                                                    SWEEP_FOLDER=os.path.join(folder, 'sweep', '')):
+                # log summary prints its progress
+                with redirect_stdout(io.StringIO()):
+                    sweep_log_files = Main.run_parameter_sweep(database_path, grid, 1, echo=False)
+                assert sorted(vaults) == sorted(database_path + unit.gallery_xyt for unit in units)
+
+                for set_index, theta_threshold in enumerate(grid['theta_threshold']):
+                    log_parameter_file, log_db_file = sweep_log_files[set_index][DatabaseRunner.LOG_ALL]
+                    assert os.path.basename(log_db_file).startswith('db_poly')
+                    log_summary_path = os.path.join(os.path.dirname(log_db_file),
+                                                    os.path.basename(Constants.LOG_SUMMARY_PATH))
+                    with open(log_summary_path, 'r') as log_summary:
+                        # header and summary of the set
+                        assert len(log_summary.readlines()) == 2
+                    separate_log_files = (os.path.join(folder, '{}_param.csv'.format(set_index)),
+                                          os.path.join(folder, '{}_db.csv'.format(set_index)))
+                    with constants(THETA_THRESHOLD=theta_threshold):
+                        results = DatabaseRunner.run(units, Main.run_experiment_reuse_vault, database_path,
+                                                     os.path.join(folder, '{}_shards'.format(set_index)), 1, seed=25)
+                    for path in separate_log_files:
+                        open(path, 'w').close()
+                    DatabaseRunner.merge(units, results, {DatabaseRunner.LOG_ALL: separate_log_files})
+                    # random order of verification may differ, results do not
+                    with open(log_db_file, 'r') as log_db, open(separate_log_files[1], 'r') as separate_log_db:
+                        assert log_db.readlines()[1:] == separate_log_db.readlines()
+        finally:
+            Main.generate_vault = generate_vault
+            Main.plan_database = plan_database
+    finally:
+        shutil.rmtree(folder)
+
+
+def run_regression_tests():
+    """ Runs all regression tests and prints their names """
+    for test in (test_gf_int_backend, test_polynomial_array, test_lagrange_interpolation, test_gao_decoding,
+                 test_parallel_subset_evaluation, test_subset_enumerator, test_repeated_x_subsets,
+                 test_incremental_interpolation, test_crc_verifier, test_geom_matching_modes, test_geom_transform_array,
+                 test_pose_votes, test_theta_index_wrap, test_compact_vault, test_decode_context,
+                 test_concurrent_verification, test_identification, test_chaff_points_grid, test_chaff_y_values,
+                 test_minutia_converter, test_template_store, test_database_runner_workers, test_run_journal_resume,
+                 test_work_coordinator_leases, test_parameter_sweep):
+        test()
+        print('{} passed'.format(test.__name__))
+
+
 if __name__ == '__main__':
     # test_geometric_hashing()
     # generate_all_geom_from_path(XYT_GALLERY_PATH)
     #write_basis_minutiae_header(MINUTIAE_OUT_FILE)
     #write_probe_vs_gallery(XYT_PROBE_PATH, XYT_GALLERY_PATH, MINUTIAE_OUT_FILE)
-    test_poly_in_gf(297850099)
+    # test_poly_in_gf(297850099)
+    run_regression_tests()
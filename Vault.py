@@ -3,16 +3,26 @@
 
     :var self.vault_original_minutiae: list of representation of minutiae without chaff points
     :var self.vault_chaff_points: list of representation of chaff points
+
+    Decoding does not change the vault: candidate minutiae and function points of one attempt are collected in a
+    VaultDecodeContext, so one vault can be verified against any number of probes without copying it
+
+    CompactVault holds a finalized vault in two uint32 arrays (x and y representations) and the orientation index of
+    its geometric hashing table, without any per element objects. The geometric hashing table itself is not stored,
+    it is recreated from the arrays when the vault is expanded for verification (CompactVault.to_vault)
 """
 
 import random
+import numpy as np
 from Polynomial_Generator import PolynomialGenerator
-from Geometric_Hashing_Transformer import GHTransformer
+from Geometric_Hashing_Transformer import GHTransformer, GHThetaIndex
 from Constants import CHECK_CHAFF_POINT_MAPPING
 
 
 class VaultElement:
     """ Element of a (fuzzy) Vault """
+    __slots__ = ('x_rep', 'y_rep')
+
     def __init__(self, x_rep, y_rep):
         """
         :param x_rep 1st element of vault element tuple: e.g. representation of minutia
@@ -29,7 +39,39 @@ class VaultElement:
         )
 
 
+class VaultElementView:
+    """ Element i of a CompactVault with the same interface as VaultElement (values are read from the arrays) """
+    __slots__ = ('vault', 'index')
+
+    def __init__(self, vault, index):
+        """
+        :param vault: CompactVault
+        :param index: index of element in vault
+        """
+        self.vault = vault
+        self.index = index
+
+    @property
+    def x_rep(self):
+        return int(self.vault.vault_x[self.index])
+
+    @property
+    def y_rep(self):
+        return int(self.vault.vault_y[self.index])
+
+    def __str__(self):
+        return '({}, {})\n'.format(self.x_rep, self.y_rep)
+
+    def __repr__(self):
+        return '{}({}, {})'.format(
+            self.__class__.__name__, self.x_rep, self.y_rep
+        )
+
+
 class Vault:
+    __slots__ = ('vault_final_elements_pairs', 'vault_original_minutiae_rep', 'vault_chaff_points_rep',
+                 'vault_function_points_rep', 'geom_table', 'geom_theta_index')
+
     def __init__(self):
         # list of vault elements (tuples)
         self.vault_final_elements_pairs = []
@@ -41,6 +83,8 @@ class Vault:
         self.vault_function_points_rep = []
         # table for geometric hashing
         self.geom_table = []
+        # index of geom_table by orientation of basis (GHThetaIndex)
+        self.geom_theta_index = None
         self.clear_vault()
 
     def add_minutia_rep(self, minutia_rep):
@@ -68,21 +112,21 @@ class Vault:
         self.vault_chaff_points_rep.clear()
         self.vault_function_points_rep.clear()
         self.geom_table.clear()
+        self.geom_theta_index = None
 
     def evaluate_polynomial_on_minutiae(self, poly_generator: PolynomialGenerator, echo=False):
         """ Evaluate polynomial on original minutiae in vault_minutiae and save to vault_elements_pairs
             :param poly_generator: generator containing polynomial"""
-        for minutia_rep in self.vault_original_minutiae_rep:
-            vault_element = VaultElement(minutia_rep, poly_generator.evaluate_polynomial_gf_2(minutia_rep))
-            self.add_vault_element(vault_element)
-            if echo:
-                print("...", end="")
+        function_points = poly_generator.evaluate_polynomial_gf_2_array(self.vault_original_minutiae_rep)
+        for minutia_rep, function_point in zip(self.vault_original_minutiae_rep, function_points.tolist()):
+            self.add_vault_element(VaultElement(minutia_rep, function_point))
         if echo:
             print("\nFinish evaluating polynomial of vault elements")
 
     def evaluate_random_on_chaff_points(self, poly_generator: PolynomialGenerator, m):
         """ Generate random evaluation of chaff points for second element of VaultElement (X,Y)
             Random points Y do not lie on polynomial(X) = Y
+            Y of all chaff points are drawn at once as array, only Y that lie on the polynomial are drawn again
             :param poly_generator: generator containing polynomial
             :param m describes largest number exponential 2**m """
         # gets vault elements from original minutiae to generate similar values
@@ -90,28 +134,34 @@ class Vault:
         max_digits = 10
         max_number = 2 ** m
         if self.vault_final_elements_pairs:
-            digits_list = []
-            for element in self.vault_final_elements_pairs:
-                digits_list.append(len(str(element.y_rep)))
-            min_digits = int(min(digits_list))
-            max_digits = int(max(digits_list))
-
-        # generate random Y and check if Y = polynomial(X) where X = chaff_point
-        for chaff_point in self.vault_chaff_points_rep:
-            y_candidate = 0
-
-            # check for on_polynomial normally omitted due to performance reasons
-            if CHECK_CHAFF_POINT_MAPPING:
-                y_real = poly_generator.evaluate_polynomial_gf_2(chaff_point)
-                on_polynomial = True
-            else:
-                y_real = 0
-                on_polynomial = False
-
-            while on_polynomial or y_candidate > max_number or y_candidate == 0:
-                y_candidate = self.random_int_digits(min_digits, max_digits)
-                if y_real != y_candidate:
-                    on_polynomial = False
+            y_reps = np.array([element.y_rep for element in self.vault_final_elements_pairs], dtype=np.uint64)
+            # amount of decimal digits of every y (same as len(str(y)))
+            digits = np.searchsorted(10 ** np.arange(1, 20, dtype=np.uint64), y_reps, side='right') + 1
+            min_digits = int(digits.min())
+            max_digits = int(digits.max())
+        # random Y is between min_digits and max_digits digits, 0 < Y < max_number
+        range_start = 10 ** (min_digits - 1)
+        range_end = min(10 ** max_digits, max_number)
+        if range_start >= range_end:
+            raise ValueError('No random Y with {} to {} digits is below 2**{}'.format(min_digits, max_digits, m))
+        if not self.vault_chaff_points_rep:
+            return
+
+        # random state of numpy is seeded from random, so random.seed also determines chaff points
+        generator = np.random.default_rng(random.getrandbits(64))
+        y_candidates = generator.integers(range_start, range_end, size=len(self.vault_chaff_points_rep),
+                                          dtype=np.uint64)
+        # check for on_polynomial normally omitted due to performance reasons
+        if CHECK_CHAFF_POINT_MAPPING:
+            # evaluate polynomial at all chaff points at once
+            y_reals = poly_generator.evaluate_polynomial_gf_2_array(self.vault_chaff_points_rep).astype(np.uint64)
+            on_polynomial = np.flatnonzero(y_candidates == y_reals)
+            while on_polynomial.size:
+                y_candidates[on_polynomial] = generator.integers(range_start, range_end, size=on_polynomial.size,
+                                                                 dtype=np.uint64)
+                on_polynomial = on_polynomial[y_candidates[on_polynomial] == y_reals[on_polynomial]]
+
+        for chaff_point, y_candidate in zip(self.vault_chaff_points_rep, y_candidates.tolist()):
             self.add_vault_element(VaultElement(chaff_point, y_candidate))
 
     def finalize_vault(self):
@@ -120,13 +170,6 @@ class Vault:
         self.vault_chaff_points_rep.clear()
         random.shuffle(self.vault_final_elements_pairs)
 
-    def random_int_digits(self, min_digits, max_digits):
-        """ Helper function to generate random integer between min_digits and max_digits
-            Example: :param min_digits = 3, max_digits = 5: random integer between 100 and 99999 """
-        range_start = 10 ** (min_digits - 1)
-        range_end = (10 ** max_digits) - 1
-        return random.randint(range_start, range_end)
-
     def get_smallest_original_minutia(self):
         """ Get smallest original minutia for better chaff points creation
             :returns smallest original minutia in uint """
@@ -134,3 +177,100 @@ class Vault:
 
     def create_geom_table(self):
         self.geom_table = GHTransformer.generate_enrollment_table(self.vault_final_elements_pairs)
+        # index of deserialized vault can be reused as geom_table only depends on vault_final_elements_pairs
+        if self.geom_theta_index is None or len(self.geom_theta_index) != len(self.geom_table):
+            self.geom_theta_index = GHThetaIndex.from_geom_table(self.geom_table)
+
+
+class VaultDecodeContext:
+    """ Scratch state of one attempt to decode a vault (candidate minutiae, their function points and chaff points) """
+    __slots__ = ('vault_original_minutiae_rep', 'vault_function_points_rep', 'vault_chaff_points_rep')
+
+    def __init__(self):
+        # candidate minutiae
+        self.vault_original_minutiae_rep = []
+        # function points that correspond to vault_original_minutiae_rep
+        self.vault_function_points_rep = []
+        # vault points that are not candidates
+        self.vault_chaff_points_rep = []
+
+    def add_minutia_rep(self, minutia_rep):
+        """ Add candidate minutia
+            :param minutia_rep is a uint representation of a minutia """
+        self.vault_original_minutiae_rep.append(minutia_rep)
+
+    def add_function_point_rep(self, function_point_rep):
+        """ Add function point that corresponds to a candidate minutia
+            :param function_point_rep is a uint representation of a polynomial mapping minutia """
+        self.vault_function_points_rep.append(function_point_rep)
+
+    def clear(self):
+        """ Clear all lists in context """
+        self.vault_original_minutiae_rep.clear()
+        self.vault_function_points_rep.clear()
+        self.vault_chaff_points_rep.clear()
+
+
+class CompactVault:
+    """ Finalized vault backed by uint32 arrays, e.g. for holding many enrolled vaults in memory """
+    __slots__ = ('vault_x', 'vault_y', 'geom_theta_index')
+
+    def __init__(self, vault_x, vault_y, geom_theta_index=None):
+        """
+        :param vault_x: x representations of vault elements (ints or array, 0 <= x < 2**32)
+        :param vault_y: y representations of vault elements (ints or array, 0 <= y < 2**32)
+        :param geom_theta_index: GHThetaIndex of geometric hashing table of the vault or None
+        """
+        self.vault_x = CompactVault.to_uint32_array(vault_x)
+        self.vault_y = CompactVault.to_uint32_array(vault_y)
+        if len(self.vault_x) != len(self.vault_y):
+            raise ValueError('Vault has {} x but {} y representations'.format(len(self.vault_x), len(self.vault_y)))
+        self.geom_theta_index = geom_theta_index
+
+    @staticmethod
+    def to_uint32_array(values):
+        """ Converts representations to uint32 array
+            :raises ValueError if a value does not fit in 32 bits """
+        if isinstance(values, np.ndarray) and values.dtype == np.uint32:
+            return values
+        values = values.tolist() if isinstance(values, np.ndarray) else list(values)
+        if values and (min(values) < 0 or max(values) >= 2 ** 32):
+            raise ValueError('Vault representations do not fit in 32 bits')
+        return np.array(values, dtype=np.uint32)
+
+    @staticmethod
+    def from_vault(vault: Vault):
+        """ Creates CompactVault from vault_final_elements_pairs and geom_theta_index of a finalized vault """
+        return CompactVault([element.x_rep for element in vault.vault_final_elements_pairs],
+                            [element.y_rep for element in vault.vault_final_elements_pairs],
+                            vault.geom_theta_index)
+
+    def to_vault(self, geom_table=True):
+        """ Expands to Vault, e.g. for verification
+            :param geom_table: if True, the geometric hashing table is created (reusing the orientation index)
+            :returns Vault """
+        vault = Vault()
+        for x_rep, y_rep in zip(self.vault_x.tolist(), self.vault_y.tolist()):
+            vault.add_vault_element(VaultElement(x_rep, y_rep))
+        vault.geom_theta_index = self.geom_theta_index
+        if geom_table:
+            vault.create_geom_table()
+        return vault
+
+    @property
+    def vault_final_elements_pairs(self):
+        """ list of VaultElementView, one per vault element """
+        return [VaultElementView(self, i) for i in range(len(self))]
+
+    def nbytes(self):
+        """ :returns bytes used by the arrays of the vault """
+        nbytes = self.vault_x.nbytes + self.vault_y.nbytes
+        if self.geom_theta_index is not None:
+            nbytes += self.geom_theta_index.order.nbytes + self.geom_theta_index.thetas.nbytes
+        return nbytes
+
+    def __len__(self):
+        return len(self.vault_x)
+
+    def __getitem__(self, index):
+        return VaultElementView(self, range(len(self))[index])
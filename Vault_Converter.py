@@ -1,7 +1,8 @@
 """ Vault Converter that serializes (vault to JSON) and deserializes (JSON to vault) """
 
 
-from Vault import Vault, VaultElement
+from Vault import Vault, VaultElement, CompactVault
+from Geometric_Hashing_Transformer import GHThetaIndex
 import Constants
 
 
@@ -10,9 +11,10 @@ class VaultConverter:
     def serialize(vault: Vault, vault_id, geom_table_flag=False):
         """
         Serializes vault to JSON represented as python dictionary
-        :param vault: fuzzy vault
+        :param vault: fuzzy vault (Vault or CompactVault)
         :param vault_id: ID of vault to be saved in database
         :param geom_table_flag: flag to determine if geom table is stored at DB and included in vault
+        (only for Vault, CompactVault does not hold a geom table)
         :return: dict
         """
         vault_x = []
@@ -25,6 +27,10 @@ class VaultConverter:
         result[Constants.JSON_VAULT_ID] = vault_id
         result[Constants.JSON_VAULT_X] = vault_x
         result[Constants.JSON_VAULT_Y] = vault_y
+        # index of geometric hashing table by orientation of basis
+        if vault.geom_theta_index is not None:
+            result[Constants.JSON_VAULT_THETA_ORDER] = vault.geom_theta_index.order.tolist()
+            result[Constants.JSON_VAULT_THETA] = vault.geom_theta_index.thetas.tolist()
 
         if geom_table_flag:
             geom_table_db = []
@@ -53,4 +59,20 @@ class VaultConverter:
         vault_y = vault_dict[Constants.JSON_VAULT_Y]
         for i, _ in enumerate(vault_x):
             new_vault.add_vault_element(VaultElement(vault_x[i], vault_y[i]))
+        if Constants.JSON_VAULT_THETA_ORDER in vault_dict:
+            new_vault.geom_theta_index = GHThetaIndex(vault_dict[Constants.JSON_VAULT_THETA_ORDER],
+                                                      vault_dict[Constants.JSON_VAULT_THETA])
         return new_vault
+
+    @staticmethod
+    def deserialize_compact(vault_dict):
+        """
+        Deserializes dict to compact vault
+        :param vault_dict: dictionary from database
+        :return: CompactVault
+        """
+        geom_theta_index = None
+        if Constants.JSON_VAULT_THETA_ORDER in vault_dict:
+            geom_theta_index = GHThetaIndex(vault_dict[Constants.JSON_VAULT_THETA_ORDER],
+                                            vault_dict[Constants.JSON_VAULT_THETA])
+        return CompactVault(vault_dict[Constants.JSON_VAULT_X], vault_dict[Constants.JSON_VAULT_Y], geom_theta_index)
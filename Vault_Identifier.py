@@ -0,0 +1,268 @@
+"""
+    Vault Identifier searches a probe in a gallery of enrolled vaults (1:N identification)
+
+    Shortlist: every pair of vault points (x, y, theta) closer than Constants.IDENTIFY_PAIR_DISTANCE is hashed by
+    features that do not change with rotation and translation: the quantized distance and the angles of both minutiae
+    relative to the line through the pair. The pairs of all vaults are stored in one inverted index (numpy arrays
+    sorted by key, with the start of every key in key_starts). Every pair of probe minutiae looks up its key, and
+    every hit votes for the pose (rotation and translation) that maps the probe pair onto the vault pair. Genuine pairs
+    agree on one pose, so the score of a vault is the highest vote count of a pose. Only the vaults with the highest
+    scores are verified with VaultVerifier.verify (geometric hashing and interpolation)
+"""
+
+import numpy as np
+
+import Constants
+from Minutia_Converter import MinutiaConverter
+from Vault import CompactVault
+from Vault_Verifier import VaultVerifier
+
+
+class VaultIdentifier:
+    def __init__(self, pair_distance=None, distance_bin=None, angle_bin=None):
+        """
+        :param pair_distance: maximal distance of points forming a pair, Constants.IDENTIFY_PAIR_DISTANCE if None
+        :param distance_bin: bin size of distance of pair, Constants.IDENTIFY_DISTANCE_BIN if None
+        :param angle_bin: bin size of angles of pair (has to divide 180), Constants.IDENTIFY_ANGLE_BIN if None
+        """
+        self.pair_distance = pair_distance if pair_distance is not None else Constants.IDENTIFY_PAIR_DISTANCE
+        self.distance_bin = distance_bin if distance_bin is not None else Constants.IDENTIFY_DISTANCE_BIN
+        self.angle_bin = angle_bin if angle_bin is not None else Constants.IDENTIFY_ANGLE_BIN
+        assert 180 % self.angle_bin == 0
+        self.keys_amount = (int(self.pair_distance // self.distance_bin) + 1) * (360 // self.angle_bin) ** 2
+        # enrolled vaults (Vault with geom_table or CompactVault) and their IDs
+        self.vaults = []
+        self.vault_ids = []
+        # inverted index: arrays sorted by key, every entry is a pair of vault points (index of vault, x and y of the
+        # first point, orientation of line from first to second point), entries of key k are at
+        # key_starts[k]:key_starts[k + 1] (keys themselves are not stored)
+        self.key_starts = np.zeros(self.keys_amount + 1, dtype=np.int64)
+        self.entries_vault = np.zeros(0, dtype=np.int32)
+        self.entries_x = np.zeros(0, dtype=np.int16)
+        self.entries_y = np.zeros(0, dtype=np.int16)
+        self.entries_phi = np.zeros(0, dtype=np.int16)
+        # entries of vaults added since the index was built last
+        self.pending = []
+
+    def __len__(self):
+        return len(self.vaults)
+
+    def add_vault(self, vault, vault_id=None):
+        """
+        Enrolls vault in gallery (index is rebuilt on next search)
+        :param vault: Vault with geom_table or CompactVault
+        :param vault_id: ID of vault returned in results, index in gallery if None
+        """
+        vault_index = len(self.vaults)
+        self.vaults.append(vault)
+        self.vault_ids.append(vault_id if vault_id is not None else vault_index)
+        keys, points, phi = self.pair_keys(VaultIdentifier.vault_points(vault))
+        self.pending.append((keys, np.full(len(keys), vault_index, dtype=np.int32), points, phi))
+
+    def build_index(self):
+        """ Merges entries of added vaults into the sorted inverted index """
+        if not self.pending:
+            return
+        keys, vaults, points, phi = (np.concatenate(column) for column in zip(*self.pending))
+        self.pending = []
+        indexed_keys = np.repeat(np.arange(self.keys_amount, dtype=np.int32), np.diff(self.key_starts))
+        keys = np.concatenate((indexed_keys, keys))
+        order = np.argsort(keys, kind='stable')
+        self.key_starts[1:] = np.cumsum(np.bincount(keys, minlength=self.keys_amount))
+        self.entries_vault = np.concatenate((self.entries_vault, vaults))[order]
+        self.entries_x = np.concatenate((self.entries_x, points[:, 0]))[order]
+        self.entries_y = np.concatenate((self.entries_y, points[:, 1]))[order]
+        self.entries_phi = np.concatenate((self.entries_phi, phi))[order]
+
+    @staticmethod
+    def vault_points(vault):
+        """
+        Decodes x representations of all vault points to minutiae (same as MinutiaConverter.get_minutia_from_uint)
+        :param vault: Vault or CompactVault
+        :return: (N, 3) array of (x, y, theta)
+        """
+        if isinstance(vault, CompactVault):
+            x_reps = vault.vault_x
+        else:
+            x_reps = [element.x_rep for element in vault.vault_final_elements_pairs]
+        return MinutiaConverter().get_minutiae_array_from_uint_array(x_reps)
+
+    def pair_features(self, minutiae):
+        """
+        Features of all pairs of minutiae closer than pair_distance
+        :param minutiae: (N, 3) array of (x, y, theta)
+        :return: tuple of arrays (distance, angle of first and of second minutia relative to line from first to second
+        minutia, orientation of line in degrees, first minutia (P, 3), second minutia (P, 3))
+        """
+        minutiae = np.asarray(minutiae, dtype=np.float64).reshape(-1, 3)
+        first, second = np.triu_indices(len(minutiae), 1)
+        dx = minutiae[second, 0] - minutiae[first, 0]
+        dy = minutiae[second, 1] - minutiae[first, 1]
+        distance = np.hypot(dx, dy)
+        close = (distance <= self.pair_distance) & (distance > 0)
+        first, second, dx, dy, distance = first[close], second[close], dx[close], dy[close], distance[close]
+        phi = np.mod(np.degrees(np.arctan2(dy, dx)), 360)
+        alpha_first = np.mod(minutiae[first, 2] - phi, 360)
+        alpha_second = np.mod(minutiae[second, 2] - phi, 360)
+        return distance, alpha_first, alpha_second, phi, minutiae[first], minutiae[second]
+
+    def canonical_keys(self, distance_bins, alpha_first_bins, alpha_second_bins, phi, first, second):
+        """
+        Keys of pairs in the direction with the lexicographically smaller angle bins, so that both directions of a
+        pair have the same key (pairs with equal bins in both directions get keys for both directions)
+        :return: tuple of arrays (keys, first minutia (K, 3) of direction, orientation of line of direction)
+        """
+        angle_bins = 360 // self.angle_bin
+        half = 180 // self.angle_bin
+        # reversing the direction turns the line by 180 degrees and swaps the minutiae
+        reversed_first = (alpha_second_bins + half) % angle_bins
+        reversed_second = (alpha_first_bins + half) % angle_bins
+        reverse = (reversed_first < alpha_first_bins) | \
+                  ((reversed_first == alpha_first_bins) & (reversed_second < alpha_second_bins))
+        tie = (reversed_first == alpha_first_bins) & (reversed_second == alpha_second_bins)
+        key_first = np.where(reverse, reversed_first, alpha_first_bins)
+        key_second = np.where(reverse, reversed_second, alpha_second_bins)
+        keys = (distance_bins * angle_bins + key_first) * angle_bins + key_second
+        points = np.where(reverse[:, None], second, first)
+        phi = np.where(reverse, phi + 180, phi) % 360
+        keys = np.concatenate((keys, keys[tie]))
+        points = np.concatenate((points, second[tie]))
+        phi = np.concatenate((phi, (phi[tie] + 180) % 360))
+        return keys.astype(np.int32), points, phi
+
+    def pair_keys(self, minutiae):
+        """
+        Keys of all pairs of vault points
+        :param minutiae: (N, 3) array of (x, y, theta)
+        :return: tuple of arrays (keys, (K, 2) int16 x and y of first point, int16 orientation of line)
+        """
+        distance, alpha_first, alpha_second, phi, first, second = self.pair_features(minutiae)
+        keys, points, phi = self.canonical_keys((distance // self.distance_bin).astype(np.int64),
+                                                (alpha_first // self.angle_bin).astype(np.int64),
+                                                (alpha_second // self.angle_bin).astype(np.int64), phi, first, second)
+        return keys, points[:, :2].astype(np.int16), np.rint(phi).astype(np.int16) % 360
+
+    def probe_keys(self, minutiae):
+        """
+        Keys of all pairs of probe minutiae. Every feature is looked up in its bin and in the neighbouring bin
+        closer to its value, so that pairs close to a bin border are found as well
+        :param minutiae: (N, 3) array of (x, y, theta)
+        :return: tuple of arrays (keys, (K, 3) first minutia, orientation of line)
+        """
+        distance, alpha_first, alpha_second, phi, first, second = self.pair_features(minutiae)
+        angle_bins = 360 // self.angle_bin
+        variants = []
+        for value, size in ((distance, self.distance_bin), (alpha_first, self.angle_bin),
+                            (alpha_second, self.angle_bin)):
+            bins = (value // size).astype(np.int64)
+            neighbour = np.where(value - bins * size < size / 2, bins - 1, bins + 1)
+            variants.append((bins, neighbour))
+        keys, points, phis = [], [], []
+        for distance_bins in variants[0]:
+            for alpha_first_bins in variants[1]:
+                for alpha_second_bins in variants[2]:
+                    valid = (distance_bins >= 0) & (distance_bins <= self.pair_distance // self.distance_bin)
+                    variant_keys, variant_points, variant_phi = self.canonical_keys(
+                        distance_bins[valid], alpha_first_bins[valid] % angle_bins,
+                        alpha_second_bins[valid] % angle_bins, phi[valid], first[valid], second[valid])
+                    keys.append(variant_keys)
+                    points.append(variant_points)
+                    phis.append(variant_phi)
+        return np.concatenate(keys), np.concatenate(points).reshape(-1, 3), np.concatenate(phis)
+
+    def scores(self, probe_minutiae):
+        """
+        Score of every vault: highest amount of votes of probe and vault pairs for one pose
+        (rotation in bins of Constants.POSE_THETA_BIN, translation in bins of Constants.POSE_XY_BIN)
+        :param probe_minutiae: list of Minutia of probe
+        :return: array of scores in order of vaults
+        """
+        self.build_index()
+        scores = np.zeros(len(self.vaults), dtype=np.int32)
+        probe_array = np.array([(m.x, m.y, m.theta) for m in probe_minutiae], dtype=np.float64).reshape(-1, 3)
+        keys, probe_points, probe_phi = self.probe_keys(probe_array)
+        starts = self.key_starts[keys]
+        lengths = self.key_starts[keys + 1] - starts
+        if not lengths.sum():
+            return scores
+        # index of probe pair and index in inverted index of every hit
+        hit_probe = np.repeat(np.arange(len(keys)), lengths)
+        hit_entry = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) + \
+            np.repeat(starts, lengths)
+        vaults = self.entries_vault[hit_entry].astype(np.int64)
+        d_theta = np.mod(self.entries_phi[hit_entry] - probe_phi[hit_probe], 360)
+        cos_d_theta = np.cos(np.radians(d_theta))
+        sin_d_theta = np.sin(np.radians(d_theta))
+        probe_x = probe_points[hit_probe, 0]
+        probe_y = probe_points[hit_probe, 1]
+        dx = self.entries_x[hit_entry] - (probe_x * cos_d_theta - probe_y * sin_d_theta)
+        dy = self.entries_y[hit_entry] - (probe_x * sin_d_theta + probe_y * cos_d_theta)
+        # pose cell of every hit, translations are shifted to be non-negative (coordinates are below 2**bit_length)
+        m_conv = MinutiaConverter()
+        xy_offset = 2 ** (max(m_conv.X_BIT_LENGTH, m_conv.Y_BIT_LENGTH) + 2)
+        xy_bins = 2 * xy_offset // Constants.POSE_XY_BIN + 1
+        theta_bins = int(np.ceil(360 / Constants.POSE_THETA_BIN))
+        x_index = np.floor((dx + xy_offset) / Constants.POSE_XY_BIN).astype(np.int64)
+        y_index = np.floor((dy + xy_offset) / Constants.POSE_XY_BIN).astype(np.int64)
+        theta_index = (d_theta // Constants.POSE_THETA_BIN).astype(np.int64)
+        cells = ((vaults * theta_bins + theta_index) * xy_bins + x_index) * xy_bins + y_index
+        cells, votes = np.unique(cells, return_counts=True)
+        np.maximum.at(scores, cells // (theta_bins * xy_bins * xy_bins), votes.astype(np.int32))
+        return scores
+
+    def shortlist(self, probe_minutiae, top_k=None):
+        """
+        Vaults with highest scores
+        :param probe_minutiae: list of Minutia of probe
+        :param top_k: length of shortlist, Constants.IDENTIFY_TOP_K if None
+        :return: list of tuples (index of vault, score) ordered by descending score
+        """
+        if top_k is None:
+            top_k = Constants.IDENTIFY_TOP_K
+        scores = self.scores(probe_minutiae)
+        top_k = min(top_k, len(scores))
+        if not top_k:
+            return []
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        candidates = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return list(zip(candidates.tolist(), scores[candidates].tolist()))
+
+    def identify_iter(self, probe_minutiae, poly_degree, gf_exp, crc_length, secret_length, top_k=None,
+                      workers=None, use_processes=None):
+        """
+        Verifies probe against the shortlist and yields results as they are available, stops after the first match
+        (candidates are verified in chunks of workers on a thread or process pool, see VaultVerifier.verify_pairs)
+        :param probe_minutiae: list of Minutia of probe (best quality first)
+        :param top_k: length of shortlist, Constants.IDENTIFY_TOP_K if None
+        :param workers: amount of threads or processes, Constants.VERIFY_WORKERS if None
+        :param use_processes: use processes instead of threads, Constants.VERIFY_USE_PROCESSES if None
+        :returns generator of VerificationResult (vault_id is ID of vault, metrics contain 'identify_score')
+        """
+        if workers is None:
+            workers = Constants.VERIFY_WORKERS
+        candidates = self.shortlist(probe_minutiae, top_k)
+        for chunk_start in range(0, len(candidates), max(workers, 1)):
+            chunk = candidates[chunk_start:chunk_start + max(workers, 1)]
+            results = VaultVerifier.verify_pairs(
+                [(self.vaults[vault_index], probe_minutiae, self.vault_ids[vault_index], None)
+                 for vault_index, _ in chunk], poly_degree, gf_exp, crc_length, secret_length, workers, use_processes)
+            for result, (_, score) in zip(results, chunk):
+                result.metrics['identify_score'] = score
+                yield result
+                if result.match:
+                    return
+
+    def nbytes(self):
+        """ :returns bytes used by the inverted index """
+        return self.key_starts.nbytes + self.entries_vault.nbytes + self.entries_x.nbytes + self.entries_y.nbytes + \
+            self.entries_phi.nbytes
+
+    def identify(self, probe_minutiae, poly_degree, gf_exp, crc_length, secret_length, top_k=None):
+        """
+        Searches probe in gallery
+        :returns VerificationResult of first matching vault or None if no vault in shortlist matched
+        """
+        for result in self.identify_iter(probe_minutiae, poly_degree, gf_exp, crc_length, secret_length, top_k):
+            if result.match:
+                return result
+        return None
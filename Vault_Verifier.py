@@ -4,23 +4,212 @@
 
 import random
 import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
 
 import Constants
-from Geometric_Hashing_Transformer import GHTransformer
+from Experiment_Parameters import ExperimentParameters
+from Geometric_Hashing_Transformer import GHTransformer, GHThetaIndex
 from Minutia import Minutia
 from Minutia_Converter import MinutiaConverter
 from Polynomial_Extractor import PolynomialExtractor
-from Vault import Vault
+from Pose_Estimator import PoseEstimator
+from Vault import Vault, VaultDecodeContext, CompactVault
+
+
+class VerificationResult:
+    """ Result of verifying probe minutiae against a vault """
+    def __init__(self, match, metrics, decode_context, vault_id=None, probe_id=None):
+        """
+        :param match: True if vault was unlocked
+        :param metrics: dict with metrics of verification (see VaultVerifier.initialize_metrics)
+        :param decode_context: VaultDecodeContext with candidates of the last decoding attempt
+        :param vault_id: ID of vault (e.g. index in batch)
+        :param probe_id: ID of probe (e.g. index in batch)
+        """
+        self.match = match
+        self.metrics = metrics
+        self.decode_context = decode_context
+        self.vault_id = vault_id
+        self.probe_id = probe_id
+
+    def __bool__(self):
+        return self.match
+
+    def __repr__(self):
+        return '{}(match={}, vault_id={}, probe_id={})'.format(
+            self.__class__.__name__, self.match, self.vault_id, self.probe_id
+        )
 
 
 class VaultVerifier:
+    @staticmethod
+    def initialize_metrics(log_dict):
+        """ Initializes all metrics written by verification in log_dict """
+        # how many elements iterated through in geometric table
+        log_dict['amount_geom_table'] = 0
+        # number of subsets total
+        log_dict['total_subsets'] = 0
+        # how many subsets evaluated in polynomial interpolation
+        log_dict['evaluated_subsets'] = -1
+        # how many minutiae candidates before polynomial interpolation
+        log_dict['minutiae_candidates'] = 0
+        # time of polynomial interpolation (only the last try)
+        log_dict['time_interpolation'] = 0
+        # total time of geometric hashing (all iterations)
+        log_dict['time_geom'] = 0
+        # how many times candidate sets have been discovered in geometric hashing
+        log_dict['geom_match_tries'] = 0
+        # how many total iterations have been computed in geometric hashing (each subloop)
+        log_dict['geom_iteration'] = 0
+        # how many single minutiae matches have been found in geometric hashing
+        log_dict['geom_single_match'] = 0
+        # basis selected in gallery for geometric hashing in geom table for matching and interpolation
+        log_dict['geom_gallery_basis'] = None
+        # basis selected in probe for geometric hashing in geom table for matching and interpolation
+        log_dict['geom_probe_basis'] = None
+        # thresholds in Vault_Verifier
+        log_dict['thresholds'] = ''
+        # log if choice of candidate subsets is done randomly
+        log_dict['subset_eval_random'] = Constants.RANDOM_SUBSET_EVAL
+        # decoder that recovered the secret polynomial: 'gao' (algebraic decoding) or 'subsets' (subset interpolation)
+        log_dict['decoder'] = None
+        # how many interpolated polynomials were checked and rejected by a too big coefficient or a wrong CRC
+        log_dict['crc_checked'] = 0
+        log_dict['crc_rejected_coefficient'] = 0
+        log_dict['crc_rejected_crc'] = 0
+        # how many pairs of probe and gallery basis were skipped because of too few votes for their pose
+        log_dict['pose_skipped_pairs'] = 0
+
+    @staticmethod
+    def verify(vault, probe_minutiae, poly_degree, gf_exp, crc_length, secret_length, vault_id=None, probe_id=None,
+               parameters: ExperimentParameters = None):
+        """
+        Re-entrant verification of probe minutiae against vault: the vault is not changed except for the cache of hash
+        tables of its geometric hashing table ('hash' matching mode), which is filled under a lock
+        (see GHElementEnrollment.get_hash_table), so the same vault can be verified by several threads at the same time
+        :param vault: Vault with geom_table or CompactVault (expanded for this verification, see verify_batch)
+        :param probe_minutiae: list of Minutia of probe (best quality first)
+        :param vault_id: ID of vault stored in result
+        :param probe_id: ID of probe stored in result
+        :param parameters: ExperimentParameters with thresholds, Constants if None
+        :returns VerificationResult
+        """
+        if isinstance(vault, CompactVault):
+            vault = vault.to_vault()
+        metrics = dict()
+        VaultVerifier.initialize_metrics(metrics)
+        decode_context = VaultDecodeContext()
+        match = VaultVerifier.unlock_vault_geom(vault, probe_minutiae, poly_degree, gf_exp, crc_length, secret_length,
+                                                metrics, decode_context=decode_context, parameters=parameters)
+        return VerificationResult(match, metrics, decode_context, vault_id, probe_id)
+
+    @staticmethod
+    def verify_probes(vault, probes, poly_degree, gf_exp, crc_length, secret_length, workers=None,
+                      use_processes=None):
+        """
+        Verifies many probes against one vault in parallel
+        :param vault: Vault with geom_table or CompactVault
+        :param probes: list of probe minutiae lists
+        :param workers: amount of threads or processes, Constants.VERIFY_WORKERS if None
+        :param use_processes: use processes instead of threads, Constants.VERIFY_USE_PROCESSES if None
+        :returns list of VerificationResult in order of probes (probe_id is index in probes)
+        """
+        return VaultVerifier.verify_pairs([(vault, probe_minutiae, None, probe_id)
+                                           for probe_id, probe_minutiae in enumerate(probes)],
+                                          poly_degree, gf_exp, crc_length, secret_length, workers, use_processes)
+
+    @staticmethod
+    def verify_vaults(vaults, probe_minutiae, poly_degree, gf_exp, crc_length, secret_length, workers=None,
+                      use_processes=None):
+        """
+        Verifies one probe against many vaults in parallel
+        :param vaults: list of Vault with geom_table or CompactVault
+        :param probe_minutiae: list of Minutia of probe
+        :param workers: amount of threads or processes, Constants.VERIFY_WORKERS if None
+        :param use_processes: use processes instead of threads, Constants.VERIFY_USE_PROCESSES if None
+        :returns list of VerificationResult in order of vaults (vault_id is index in vaults)
+        """
+        return VaultVerifier.verify_pairs([(vault, probe_minutiae, vault_id, None)
+                                           for vault_id, vault in enumerate(vaults)],
+                                          poly_degree, gf_exp, crc_length, secret_length, workers, use_processes)
+
+    @staticmethod
+    def verify_batch(vault, probes, poly_degree, gf_exp, crc_length, secret_length):
+        """
+        Verifies probes one after the other against one vault, a CompactVault is expanded once for all probes
+        :param vault: Vault with geom_table or CompactVault
+        :param probes: list of tuples (probe minutiae, vault_id, probe_id)
+        :returns list of VerificationResult in order of probes
+        """
+        if isinstance(vault, CompactVault):
+            vault = vault.to_vault()
+        return [VaultVerifier.verify(vault, probe_minutiae, poly_degree, gf_exp, crc_length, secret_length, vault_id,
+                                     probe_id)
+                for probe_minutiae, vault_id, probe_id in probes]
+
+    @staticmethod
+    def verify_pairs(pairs, poly_degree, gf_exp, crc_length, secret_length, workers=None, use_processes=None):
+        """
+        Verifies pairs of vault and probe on a thread or process pool. Every CompactVault is expanded once for all
+        its pairs: before the verifications with threads, in every batch of its pairs with processes
+        :param pairs: list of tuples (vault, probe minutiae, vault_id, probe_id)
+        :param workers: amount of threads or processes, Constants.VERIFY_WORKERS if None
+        :param use_processes: use processes instead of threads, Constants.VERIFY_USE_PROCESSES if None
+        :returns list of VerificationResult in order of pairs
+        """
+        if workers is None:
+            workers = Constants.VERIFY_WORKERS
+        if use_processes is None:
+            use_processes = Constants.VERIFY_USE_PROCESSES
+        # positions of the pairs of every vault (pairs share a vault if they contain the same object)
+        vaults = dict()
+        for position, (vault, _, _, _) in enumerate(pairs):
+            vaults.setdefault(id(vault), (vault, []))[1].append(position)
+        results = [None] * len(pairs)
+
+        def add_results(positions, batch_results):
+            for position, result in zip(positions, batch_results):
+                results[position] = result
+
+        if workers <= 1 or use_processes:
+            # batches of pairs with the same vault, with processes at least workers batches
+            batches = []
+            for vault, positions in vaults.values():
+                amount = 1 if workers <= 1 else min(len(positions), max(1, workers // len(vaults)))
+                batches.extend((vault, positions[i::amount]) for i in range(amount))
+            arguments = [(vault, [pairs[position][1:] for position in positions], poly_degree, gf_exp, crc_length,
+                          secret_length) for vault, positions in batches]
+            if workers <= 1:
+                for (_, positions), argument in zip(batches, arguments):
+                    add_results(positions, VaultVerifier.verify_batch(*argument))
+                return results
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(VaultVerifier.verify_batch, *argument) for argument in arguments]
+                for (_, positions), future in zip(batches, futures):
+                    add_results(positions, future.result())
+            return results
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # threads share the expanded vaults
+            expanded = {vault_key: pool.submit(vault.to_vault) for vault_key, (vault, _) in vaults.items()
+                        if isinstance(vault, CompactVault)}
+            expanded = {vault_key: future.result() for vault_key, future in expanded.items()}
+            futures = [pool.submit(VaultVerifier.verify, expanded.get(id(vault), vault), probe_minutiae, poly_degree,
+                                   gf_exp, crc_length, secret_length, vault_id, probe_id)
+                       for vault, probe_minutiae, vault_id, probe_id in pairs]
+            return [future.result() for future in futures]
+
     @staticmethod
     def unlock_vault_geom(vault: Vault, probe_minutiae, poly_degree, gf_exp, crc_length, secret_length, log_dict,
-                          echo=False):
+                          echo=False, decode_context=None, parameters: ExperimentParameters = None):
         """
         Given vault, find candidate minutiae according to probe minutiae (list of Minutia) using geometric hashing.
         Afterwards, run interpolation on candidate minutiae
-        geom_table needs to exist in vault
+        geom_table needs to exist in vault. The vault is not changed (except for the cached hash tables, see verify),
+        so it can be shared by any number of probes
+        :param decode_context: VaultDecodeContext collecting candidates of this attempt, a new one is used if None
+        :param parameters: ExperimentParameters with thresholds of geometric hashing, Constants if None
         :returns True if match found in polynomial after interpolation, else False
         """
 
@@ -32,35 +221,55 @@ class VaultVerifier:
             log_dict['time_geom'] = time.time() - t_geom
             log_dict['geom_gallery_basis'] = None
             log_dict['geom_probe_basis'] = None
-            vault.vault_original_minutiae_rep.clear()
-            vault.vault_function_points_rep.clear()
-            vault.vault_chaff_points_rep.clear()
+            decode_context.clear()
             return False
 
         def get_geom_table_basis_threshold(probe_minutiae_gh):
             """
-            Removes basis in geom_table of vault that correspond to no probe_minutiae orientation
+            Range queries in the orientation index of vault.geom_table for all probe_minutiae orientations
             :param probe_minutiae_gh: list of probe minutiae as MinutiaNBIS_GH
-            :return: changes vault.geom_table, no return value
+            :return: list of arrays (one per probe minutia) of ascending indices in vault.geom_table with basis
+            orientation within basis_theta_threshold of the probe minutia (wrapping around at 360 degrees)
+            """
+            theta_index = vault.geom_theta_index
+            if theta_index is None or len(theta_index) != len(vault.geom_table):
+                # vault is not changed, index is only used for this verification
+                theta_index = GHThetaIndex.from_geom_table(vault.geom_table)
+            return [theta_index.query(m.theta, parameters.basis_theta_threshold) for m in probe_minutiae_gh]
+
+        def get_basis_pairs(probe_minutiae_array, geom_table, compatible_positions):
+            """
+            Pairs of probe basis and element in geom_table with similar basis orientation in the order they are tried:
+            all elements for one probe basis after the other or, if Constants.POSE_ALIGNMENT is set, ordered by the
+            votes of the pose implied by the bases (PoseEstimator). Pairs with less than Constants.POSE_MIN_VOTES
+            votes are skipped
+            :param probe_minutiae_array: probe minutiae as (M, 3) array
+            :param geom_table: list of GHElementEnrollment
+            :param compatible_positions: list of arrays of ascending indices in geom_table for every probe basis
+            :return: list of tuples (index of probe basis, index in geom_table)
             """
-            geom_table = vault.geom_table.copy()
-            for element_enroll in geom_table.copy():
-                in_threshold = False
-                for m in probe_minutiae_gh:
-                    if abs(element_enroll.basis.theta - m.theta) <= Constants.BASIS_THETA_THRESHOLD:
-                        # not removing element from geom_table
-                        in_threshold = True
-                        break
-                # remove element from geom_table if there was no match
-                if not in_threshold:
-                    geom_table.remove(element_enroll)
-            return geom_table
+            # indices in row-major order, the same order as iterating through geom_table for every probe basis
+            cnt_bases = np.repeat(np.arange(len(compatible_positions)),
+                                  [len(positions) for positions in compatible_positions])
+            cnt_enrolls = np.concatenate(compatible_positions) if compatible_positions else cnt_bases
+            if Constants.POSE_ALIGNMENT and len(cnt_enrolls):
+                gallery_bases_array = GHTransformer.minutiae_to_array([element.basis for element in geom_table])
+                votes = PoseEstimator.pose_votes(probe_minutiae_array, gallery_bases_array,
+                                                 Constants.POSE_THETA_BIN, Constants.POSE_XY_BIN)
+                votes = votes[cnt_bases, cnt_enrolls]
+                # stable sort keeps the original order for pairs with the same votes
+                order = np.argsort(-votes, kind='stable')
+                order = order[votes[order] >= Constants.POSE_MIN_VOTES]
+                log_dict['pose_skipped_pairs'] = log_dict.get('pose_skipped_pairs', 0) + len(votes) - len(order)
+                cnt_bases, cnt_enrolls = cnt_bases[order], cnt_enrolls[order]
+            return list(zip(cnt_bases.tolist(), cnt_enrolls.tolist()))
 
         assert vault.geom_table
-        log_dict['thresholds'] = '({}/[{}/{}/{}/{}]/{})'.format(
-            Constants.POINTS_DISTANCE,
-            Constants.X_THRESHOLD, Constants.Y_THRESHOLD, Constants.THETA_THRESHOLD,
-            Constants.TOTAL_THRESHOLD, Constants.BASIS_THETA_THRESHOLD)
+        if decode_context is None:
+            decode_context = VaultDecodeContext()
+        if parameters is None:
+            parameters = ExperimentParameters.from_constants()
+        log_dict['thresholds'] = parameters.thresholds_str()
         # start time geometric hashing
         t_geom = time.time()
         # create polynomial extractor
@@ -69,89 +278,167 @@ class VaultVerifier:
         probe_minutiae_GH = GHTransformer.convert_list_to_MinutiaNBIS_GH(probe_minutiae)
         random.shuffle(probe_minutiae_GH)
         # remove all basis in geom_table that are not within threshold of probe_minutiae orientation
-        vault_geom_table = get_geom_table_basis_threshold(probe_minutiae_GH)
-        for cnt_basis, basis in enumerate(probe_minutiae_GH):
-            # take random basis and try matching
-            element_verification = GHTransformer.generate_verification_table_element(basis, probe_minutiae_GH.copy())
-            for cnt_enroll, element_enrollment in enumerate(vault_geom_table):
-                # check if basis in element_enrollment has similar orientation to current basis in probe
-                if not (abs(element_verification.basis.theta - element_enrollment.basis.theta)
-                        <= Constants.BASIS_THETA_THRESHOLD):
-                    continue
-                # clear lists in vault to be populated in decoding for each element in geom_table
-                vault.vault_original_minutiae_rep.clear()
-                vault.vault_function_points_rep.clear()
-                vault.vault_chaff_points_rep.clear()
-                assert len(element_enrollment.transformed_minutiae_list) == len(vault.vault_final_elements_pairs)
-                # cnt_m_enr is representing the same indices also in vault_final_element_pairs
-                match = 0
-                candidates_verification = []
-                candidates_enrollment = []
-                candidate_minutiae_verification = element_verification.transformed_minutiae_list.copy()
-                for cnt_m_enr, minutia_enrollment in enumerate(element_enrollment.transformed_minutiae_list):
-                    if not candidate_minutiae_verification:
-                        break
-                    for minutia_verification in candidate_minutiae_verification:
-                        if fuzzy_compare(minutia_enrollment, minutia_verification):
-                            log_dict['geom_single_match'] += 1
-                            # Only add element if not already in list
-                            if not vault.vault_final_elements_pairs[
-                                       cnt_m_enr].x_rep in vault.vault_original_minutiae_rep:
-                                match += 1
-                                # add representation (uint) to candidate minutiae
-                                # first element corresponding to x value of vault tuple
-                                vault.add_minutia_rep(vault.vault_final_elements_pairs[cnt_m_enr].x_rep)
-                                # second element corresponding to y value of vault tuple
-                                vault.add_function_point_rep(vault.vault_final_elements_pairs[cnt_m_enr].y_rep)
-                                # candidate minutiae for logging purposes
-                                candidates_verification.append(minutia_verification)
-                                candidates_enrollment.append(minutia_enrollment)
-                            assert match == len(vault.vault_original_minutiae_rep)
-                        else:
-                            # add to chaff points (but not relevant as minutia can not be matched in different basis)
-                            chaff_candidate = vault.vault_final_elements_pairs[cnt_m_enr].x_rep
-                            if chaff_candidate not in vault.vault_chaff_points_rep:
-                                vault.add_chaff_point_rep(chaff_candidate)
-                        log_dict['geom_iteration'] += 1
-
-                if match >= Constants.MATCH_THRESHOLD:
-                    assert match == len(vault.vault_original_minutiae_rep)
-                    assert len(candidates_verification) == len(candidates_enrollment)
-                    assert len(vault.vault_original_minutiae_rep) == len(vault.vault_function_points_rep)
-                    assert len(vault.vault_function_points_rep) == len(candidates_enrollment)
-                    # log iterations in geometric hashing, minutiae candidates. tries to interpolate and basis
-                    log_dict['amount_geom_table'] += cnt_enroll
-                    log_dict['minutiae_candidates'] = len(vault.vault_original_minutiae_rep)
-                    log_dict['geom_match_tries'] += 1
-                    log_dict['geom_gallery_basis'] = element_enrollment.basis
-                    log_dict['geom_probe_basis'] = element_verification.basis
-
-                    # time geometric hashing
-                    log_dict['time_geom'] = time.time() - t_geom
-                    # polynomial interpolation on candidate set function points and test CRC in extracted polynomials
-                    t_interpol = time.time()
-                    success = poly_extractor.interpolate_and_check_crc(vault, poly_degree, crc_length,
-                                                                       secret_length, log_dict, echo=echo)
-                    log_dict['time_interpolation'] += time.time() - t_interpol
-                    if success:
-                        # log candidate minutiae
-                        if Constants.LOG_CANDIDATE_MINUTIAE:
-                            log_candidates_minutia(Constants.LOG_CANDIDATES_PATH_PREFIX,
-                                                   Constants.LOG_CANDIDATES_PATH_SUFFIX,
-                                                   candidates_verification, candidates_enrollment,
-                                                   element_verification.basis, element_enrollment.basis,
-                                                   vault, number=log_dict['exp_number'])
-                        return True
-
-                # break if max threshold is reached
-                if log_dict['geom_iteration'] > Constants.MAX_ITERATION_THRESHOLD:
-                    print("Max iteration threshold reached!")
-                    return exit_false()
+        compatible_indices = get_geom_table_basis_threshold(probe_minutiae_GH)
+        geom_table_indices = np.unique(np.concatenate(compatible_indices)) if compatible_indices \
+            else np.zeros(0, dtype=np.int32)
+        vault_geom_table = [vault.geom_table[i] for i in geom_table_indices.tolist()]
+        # positions of compatible elements in vault_geom_table for every probe basis
+        positions = np.zeros(len(vault.geom_table), dtype=np.int64)
+        positions[geom_table_indices] = np.arange(len(geom_table_indices))
+        compatible_positions = [positions[indices] for indices in compatible_indices]
+        vault_x_reps = [vault_element.x_rep for vault_element in vault.vault_final_elements_pairs]
+        # transform probe minutiae to all probe bases at once
+        probe_minutiae_array = GHTransformer.minutiae_to_array(probe_minutiae_GH)
+        probe_transformed_minutiae = GHTransformer.transform_minutiae_array(probe_minutiae_array, probe_minutiae_array)
+        # probe elements are created once for every probe basis when it is first needed
+        elements_verification = {}
+        for cnt_basis, cnt_enroll in get_basis_pairs(probe_minutiae_array, vault_geom_table,
+                                                         compatible_positions):
+            if cnt_basis not in elements_verification:
+                # take random basis and try matching
+                element_verification = GHTransformer.generate_verification_table_element(
+                    probe_minutiae_GH[cnt_basis], probe_minutiae_GH, probe_transformed_minutiae[cnt_basis])
+                elements_verification[cnt_basis] = (element_verification,
+                                                    element_verification.transformed_minutiae_list)
+            element_verification, minutiae_verification = elements_verification[cnt_basis]
+            element_enrollment = vault_geom_table[cnt_enroll]
+            # clear lists in decode context to be populated in decoding for each element in geom_table
+            decode_context.clear()
+            assert len(element_enrollment.transformed_minutiae) == len(vault.vault_final_elements_pairs)
+            # cnt_m_enr is representing the same indices also in vault_final_element_pairs
+            match = 0
+            candidates_verification = []
+            candidates_enrollment = []
+            if minutiae_verification:
+                matches = GEOM_MATCHING_MODES[Constants.GEOM_MATCHING_MODE](
+                    element_enrollment, element_verification, minutiae_verification, parameters)
+                # representations already added as candidates
+                candidate_reps = set()
+                for cnt_m_enr in sorted(matches):
+                    matches_enrollment = matches[cnt_m_enr]
+                    log_dict['geom_single_match'] += len(matches_enrollment)
+                    # Only add element if not already in list, the first matching probe minutia is the candidate
+                    vault_element = vault.vault_final_elements_pairs[cnt_m_enr]
+                    if vault_element.x_rep not in candidate_reps:
+                        candidate_reps.add(vault_element.x_rep)
+                        match += 1
+                        # add representation (uint) to candidate minutiae
+                        # first element corresponding to x value of vault tuple
+                        decode_context.add_minutia_rep(vault_element.x_rep)
+                        # second element corresponding to y value of vault tuple
+                        decode_context.add_function_point_rep(vault_element.y_rep)
+                        # candidate minutiae for logging purposes
+                        candidates_verification.append(minutiae_verification[matches_enrollment[0]])
+                        candidates_enrollment.append(element_enrollment.get_transformed_minutia(cnt_m_enr))
+                # add to chaff points all minutiae that did not match every probe minutia without duplicates
+                # (but not relevant as minutia can not be matched in different basis)
+                decode_context.vault_chaff_points_rep.extend(dict.fromkeys(
+                    x_rep for cnt_m_enr, x_rep in enumerate(vault_x_reps)
+                    if len(matches.get(cnt_m_enr, ())) < len(minutiae_verification)))
+                # every pair of enrollment and probe minutia counts as iteration
+                log_dict['geom_iteration'] += \
+                    len(element_enrollment.transformed_minutiae) * len(minutiae_verification)
+
+            if match >= parameters.match_threshold:
+                assert match == len(decode_context.vault_original_minutiae_rep)
+                assert len(candidates_verification) == len(candidates_enrollment)
+                assert len(decode_context.vault_original_minutiae_rep) == len(decode_context.vault_function_points_rep)
+                assert len(decode_context.vault_function_points_rep) == len(candidates_enrollment)
+                # log iterations in geometric hashing, minutiae candidates. tries to interpolate and basis
+                log_dict['amount_geom_table'] += cnt_enroll
+                log_dict['minutiae_candidates'] = len(decode_context.vault_original_minutiae_rep)
+                log_dict['geom_match_tries'] += 1
+                log_dict['geom_gallery_basis'] = element_enrollment.basis
+                log_dict['geom_probe_basis'] = element_verification.basis
+
+                # time geometric hashing
+                log_dict['time_geom'] = time.time() - t_geom
+                # polynomial interpolation on candidate set function points and test CRC in extracted polynomials
+                t_interpol = time.time()
+                success = poly_extractor.interpolate_and_check_crc(decode_context, poly_degree, crc_length,
+                                                                   secret_length, log_dict, echo=echo)
+                log_dict['time_interpolation'] += time.time() - t_interpol
+                if success:
+                    # log candidate minutiae
+                    if Constants.LOG_CANDIDATE_MINUTIAE:
+                        log_candidates_minutia(Constants.LOG_CANDIDATES_PATH_PREFIX,
+                                               Constants.LOG_CANDIDATES_PATH_SUFFIX,
+                                               candidates_verification, candidates_enrollment,
+                                               element_verification.basis, element_enrollment.basis,
+                                               decode_context, number=log_dict.get('exp_number', 0))
+                    return True
+
+            # break if max threshold is reached
+            if log_dict['geom_iteration'] > Constants.MAX_ITERATION_THRESHOLD:
+                print("Max iteration threshold reached!")
+                return exit_false()
 
         # unfortunately, no sets found
         return exit_false()
 
 
+def find_matches_pairwise(element_enrollment, element_verification, minutiae_verification, parameters):
+    """ Compares every transformed enrollment minutia with every transformed probe minutia using fuzzy_compare
+        :param element_enrollment: GHElementEnrollment
+        :param element_verification: GHElementVerification
+        :param minutiae_verification: transformed probe minutiae of element_verification as list of MinutiaNBIS_GH
+        :param parameters: ExperimentParameters with thresholds
+        :returns dict with key index of enrollment minutia and value ascending list of indices of matching
+        probe minutiae """
+    matches = {}
+    for cnt_m_enr, minutia_enrollment in enumerate(element_enrollment.transformed_minutiae_list):
+        for cnt_m_ver, minutia_verification in enumerate(minutiae_verification):
+            if fuzzy_compare(minutia_enrollment, minutia_verification, parameters):
+                matches.setdefault(cnt_m_enr, []).append(cnt_m_ver)
+    return matches
+
+
+def find_matches_hash(element_enrollment, element_verification, minutiae_verification, parameters):
+    """ Looks up every transformed probe minutia in the hash table of the enrollment element.
+        Buckets are at least as big as the thresholds of fuzzy_compare, so all matches are in the bucket of the probe
+        minutia or in its 26 neighbours, fuzzy_compare is only applied to minutiae in these buckets
+        :returns same as find_matches_pairwise """
+    x_bucket = max(parameters.x_threshold, 1)
+    y_bucket = max(parameters.y_threshold, 1)
+    theta_bucket = max(parameters.theta_threshold, 1)
+    hash_table = element_enrollment.get_hash_table(x_bucket, y_bucket, theta_bucket)
+    matches = {}
+    for cnt_m_ver, minutia_verification in enumerate(minutiae_verification):
+        x = minutia_verification.x // x_bucket
+        y = minutia_verification.y // y_bucket
+        theta = minutia_verification.theta // theta_bucket
+        for key in NEIGHBOUR_BUCKETS:
+            for cnt_m_enr, minutia_enrollment in hash_table.get((x + key[0], y + key[1], theta + key[2]), ()):
+                if fuzzy_compare(minutia_enrollment, minutia_verification, parameters):
+                    matches.setdefault(cnt_m_enr, []).append(cnt_m_ver)
+    return matches
+
+
+def find_matches_vectorized(element_enrollment, element_verification, minutiae_verification, parameters):
+    """ Compares all transformed enrollment minutiae with all transformed probe minutiae at once with numpy,
+        using the same thresholds as fuzzy_compare
+        :returns same as find_matches_pairwise """
+    minutiae_enrollment = element_enrollment.transformed_minutiae.astype(np.int32)
+    minutiae_probe = element_verification.transformed_minutiae.astype(np.int32)
+    # (enrollment, probe, axis) array of absolute differences
+    diff = np.abs(minutiae_enrollment[:, None, :] - minutiae_probe[None, :, :])
+    in_threshold = (diff[:, :, 0] <= parameters.x_threshold) & (diff[:, :, 1] <= parameters.y_threshold) & \
+                   (diff[:, :, 2] <= parameters.theta_threshold) & (diff.sum(axis=2) <= parameters.total_threshold)
+    matches = {}
+    for cnt_m_enr in np.flatnonzero(in_threshold.any(axis=1)).tolist():
+        matches[cnt_m_enr] = np.flatnonzero(in_threshold[cnt_m_enr]).tolist()
+    return matches
+
+
+# offsets of a bucket and all its neighbours in hash table of geometric hashing
+NEIGHBOUR_BUCKETS = [(x, y, theta) for x in (-1, 0, 1) for y in (-1, 0, 1) for theta in (-1, 0, 1)]
+GEOM_MATCHING_MODES = {
+    'pairwise': find_matches_pairwise,
+    'hash': find_matches_hash,
+    'vectorized': find_matches_vectorized,
+}
+
+
 def minutia_in_probe(minutia, probe_minutiae):
     """ Tests if given minutia is existent in probe minutiae list
         :param probe_minutiae list of Minutia
@@ -172,9 +459,12 @@ def exact_compare(m1: Minutia, m2: Minutia):
         return False
 
 
-def fuzzy_compare(m1: Minutia, m2: Minutia):
+def fuzzy_compare(m1: Minutia, m2: Minutia, parameters: ExperimentParameters = None):
     """ Compare two minutiae in a fuzzy way
+        :param parameters: ExperimentParameters with thresholds, Constants if None
         :returns True if m1 and m2 similar enough else False """
+    if parameters is None:
+        parameters = ExperimentParameters.from_constants()
 
     def diff_in_threshold(m1: Minutia, m2: Minutia):
         """ Helper function to determine if x and y are in threshold (distance)
@@ -190,14 +480,14 @@ def fuzzy_compare(m1: Minutia, m2: Minutia):
 
         def in_total_threshold(m1: Minutia, m2: Minutia):
             diff_total = abs(m1.x - m2.x) + abs(m1.y - m2.y) + abs(m1.theta - m2.theta)
-            if diff_total <= Constants.TOTAL_THRESHOLD:
+            if diff_total <= parameters.total_threshold:
                 return True
             else:
                 return False
 
-        if in_threshold(m1.x, m2.x, Constants.X_THRESHOLD) and \
-                in_threshold(m1.y, m2.y, Constants.Y_THRESHOLD) and \
-                in_threshold(m1.theta, m2.theta, Constants.THETA_THRESHOLD) and \
+        if in_threshold(m1.x, m2.x, parameters.x_threshold) and \
+                in_threshold(m1.y, m2.y, parameters.y_threshold) and \
+                in_threshold(m1.theta, m2.theta, parameters.theta_threshold) and \
                 in_total_threshold(m1, m2):
             return True
         else:
@@ -215,7 +505,7 @@ def log_minutia(log_path: str, minutia: Minutia, is_chaff_point: bool):
             file.write('{} {} {} candidate_minutia\n'.format(minutia.x, minutia.y, minutia.theta))
 
 
-def log_candidates_minutia_original(log_path: str, vault: Vault):
+def log_candidates_minutia_original(log_path: str, vault: VaultDecodeContext):
     m_conv = MinutiaConverter()
     # empty log file if it already exists
     open(log_path, 'w+').close()
@@ -232,7 +522,7 @@ def log_candidates_minutia_original(log_path: str, vault: Vault):
 
 
 def log_candidates_minutia(log_path_prefix, log_path_suffix, candidates_verification, candidates_enrollment,
-                           basis_ver, basis_enr, vault, number=0):
+                           basis_ver, basis_enr, vault: VaultDecodeContext, number=0):
     """ Log converted candidate minutiae: in geometric hashing table (enrollment) vs probe minutiae (verification) """
     # empty log file if it already exists
     log_path = log_path_prefix + str(number) + log_path_suffix
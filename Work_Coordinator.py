@@ -0,0 +1,266 @@
+"""
+    Work Coordinator to run a database with workers on several machines sharing a work directory (e.g. over NFS)
+
+    The coordinator writes the plan of work units (see Database_Runner) with seed and constants to the work directory.
+    Workers (on any machine that sees the work directory and the database) claim units with lease files, renew
+    the lease while they run a unit and write the logs of the unit to the result folder. A lease that was not
+    renewed within the lease time (worker died) expires and the unit is claimed by another worker.
+    Units are seeded like in Database_Runner, so a unit that is run twice writes the same results.
+    When all units are finished, the coordinator merges the logs in order of the plan and creates the log summary.
+
+    Work directory:
+    - plan.json: plan of work units, seed, constants, database path, log files
+    - leases/<unit>.lease: claimed units, modification time is the last renewal
+    - results/<unit>_param.csv, results/<unit>_db.csv: logs of finished units, results/<unit>.done: unit finished
+    - logs/: merged log files and log summary
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+
+import Constants
+from Database_Runner import DatabaseRunner, WorkUnit
+
+
+class WorkCoordinator:
+    PLAN = 'plan.json'
+    LEASES = 'leases'
+    RESULTS = 'results'
+    LOGS = 'logs'
+
+    @staticmethod
+    def write_plan(work_dir, units, log_files, database_path, seed):
+        """ Writes the plan to work_dir, or keeps the plan of an earlier run with the same parameters (resume)
+        :param work_dir: shared work directory
+        :param units: list of WorkUnit
+        :param log_files: dict of log key: (log parameter file name, log database file name) in work_dir/logs
+        :param database_path: path to folder of fingerprint templates (as seen by the workers)
+        :param seed: seed of the random generators of all units
+        :returns plan as dict
+        :raises ValueError if work_dir contains the plan of other parameters or another database """
+        parameters = DatabaseRunner.get_parameters_key(database_path)
+        plan_path = os.path.join(work_dir, WorkCoordinator.PLAN)
+        if os.path.exists(plan_path):
+            plan = WorkCoordinator.read_plan(work_dir)
+            if plan['parameters'] != parameters or \
+                    [(unit['gallery'], unit['probes']) for unit in plan['units']] != \
+                    [(unit.gallery_xyt, unit.probe_xyts) for unit in units]:
+                raise ValueError('Work directory {} contains the plan of another run'.format(work_dir))
+            return plan
+        for folder in (WorkCoordinator.LEASES, WorkCoordinator.RESULTS, WorkCoordinator.LOGS):
+            os.makedirs(os.path.join(work_dir, folder), exist_ok=True)
+        plan = {'parameters': parameters, 'seed': seed, 'constants': DatabaseRunner.get_constants(),
+                'database_path': database_path, 'log_files': log_files,
+                'units': [{'gallery': unit.gallery_xyt, 'probes': unit.probe_xyts, 'logs': unit.logs}
+                          for unit in units]}
+        temp_path = '{}.{}.tmp'.format(plan_path, os.getpid())
+        with open(temp_path, 'w') as file:
+            json.dump(plan, file)
+        os.replace(temp_path, plan_path)
+        return plan
+
+    @staticmethod
+    def read_plan(work_dir):
+        """ :returns plan as dict (see write_plan) """
+        with open(os.path.join(work_dir, WorkCoordinator.PLAN), 'r') as file:
+            return json.load(file)
+
+    @staticmethod
+    def get_units(plan):
+        """ :returns list of WorkUnit of plan """
+        return [WorkUnit(index, unit['gallery'], unit['probes'], tuple(unit['logs']))
+                for index, unit in enumerate(plan['units'])]
+
+    @staticmethod
+    def get_result_paths(work_dir, index):
+        """ :returns tuple of paths (parameter log, database log, done marker) of unit index """
+        prefix = os.path.join(work_dir, WorkCoordinator.RESULTS, str(index))
+        return prefix + '_param.csv', prefix + '_db.csv', prefix + '.done'
+
+    @staticmethod
+    def get_lease_path(work_dir, index):
+        return os.path.join(work_dir, WorkCoordinator.LEASES, '{}.lease'.format(index))
+
+    @staticmethod
+    def is_done(work_dir, index):
+        return os.path.exists(WorkCoordinator.get_result_paths(work_dir, index)[2])
+
+    @staticmethod
+    def claim(work_dir, index, worker_id, lease_seconds):
+        """ Claims unit index by creating its lease file, an expired lease is taken over
+        :returns True if unit is claimed by worker_id """
+        lease_path = WorkCoordinator.get_lease_path(work_dir, index)
+        for _ in range(2):
+            try:
+                lease = os.open(lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    if time.time() - os.stat(lease_path).st_mtime < lease_seconds:
+                        return False
+                    # lease looked expired, but another worker may have replaced it with a fresh lease since: move
+                    # whatever lease is there now away and check it again
+                    expired_path = '{}.{}.expired'.format(lease_path, worker_id)
+                    os.rename(lease_path, expired_path)
+                except FileNotFoundError:
+                    return False
+                if time.time() - os.stat(expired_path).st_mtime < lease_seconds:
+                    # fresh lease of another worker: put it back unless a new lease was created in the meantime
+                    try:
+                        os.link(expired_path, lease_path)
+                    except FileExistsError:
+                        pass
+                    os.remove(expired_path)
+                    return False
+                os.remove(expired_path)
+                continue
+            with os.fdopen(lease, 'w') as file:
+                file.write(worker_id)
+            return True
+        return False
+
+    @staticmethod
+    def read_lease_owner(work_dir, index):
+        """ :returns worker_id of the lease of unit index, None if unit is not leased """
+        try:
+            with open(WorkCoordinator.get_lease_path(work_dir, index), 'r') as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def release(work_dir, index, worker_id):
+        """ Removes lease of unit index if it is still owned by worker_id (it may have expired and been taken over) """
+        lease_path = WorkCoordinator.get_lease_path(work_dir, index)
+        if WorkCoordinator.read_lease_owner(work_dir, index) != worker_id:
+            return
+        # move lease away before checking its owner again, so a lease taken over in between is not removed
+        released_path = '{}.{}.released'.format(lease_path, worker_id)
+        try:
+            os.rename(lease_path, released_path)
+        except FileNotFoundError:
+            return
+        with open(released_path, 'r') as file:
+            owner = file.read()
+        if owner != worker_id:
+            try:
+                os.link(released_path, lease_path)
+            except FileExistsError:
+                pass
+        os.remove(released_path)
+
+    @staticmethod
+    def renew_lease(work_dir, index, stop, lease_seconds):
+        """ Renews lease of unit index every third of the lease time until stop is set
+        :param stop: threading.Event """
+        lease_path = WorkCoordinator.get_lease_path(work_dir, index)
+        while not stop.wait(lease_seconds / 3):
+            try:
+                os.utime(lease_path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def run_unit(work_dir, plan, unit: WorkUnit, experiment, worker_id):
+        """ Runs unit and writes its logs to the result folder (under temporary names until the unit is finished) """
+        parameter_path, db_path, done_path = WorkCoordinator.get_result_paths(work_dir, unit.index)
+        temp_parameter_path = '{}.{}.tmp'.format(parameter_path, worker_id)
+        temp_db_path = '{}.{}.tmp'.format(db_path, worker_id)
+        for temp_path in (temp_parameter_path, temp_db_path):
+            open(temp_path, 'w').close()
+        DatabaseRunner.run_unit(unit, experiment, plan['database_path'], temp_parameter_path, temp_db_path,
+                                '{}_{}'.format(plan['seed'], unit.index), plan['constants'])
+        os.replace(temp_parameter_path, parameter_path)
+        os.replace(temp_db_path, db_path)
+        open(done_path, 'w').close()
+
+    @staticmethod
+    def run_worker(work_dir, experiment, worker_id=None, lease_seconds=None, poll_seconds=None, echo=False):
+        """ Claims and runs units of the plan in work_dir until all units are finished
+        :param work_dir: shared work directory
+        :param experiment: function running a unit (see DatabaseRunner.run_unit)
+        :param worker_id: unique name of worker, host name and process id if None
+        :param lease_seconds: time after which a lease expires if it is not renewed, WORK_LEASE_SECONDS if None
+        :param poll_seconds: time to wait for leases of other workers to expire, WORK_POLL_SECONDS if None
+        :param echo: print progress to console
+        :returns amount of units run by this worker """
+        if worker_id is None:
+            worker_id = '{}_{}'.format(socket.gethostname(), os.getpid())
+        if lease_seconds is None:
+            lease_seconds = Constants.WORK_LEASE_SECONDS
+        if poll_seconds is None:
+            poll_seconds = Constants.WORK_POLL_SECONDS
+        while not os.path.exists(os.path.join(work_dir, WorkCoordinator.PLAN)):
+            time.sleep(poll_seconds)
+        plan = WorkCoordinator.read_plan(work_dir)
+        units = WorkCoordinator.get_units(plan)
+        units_run = 0
+        while True:
+            unfinished = [unit for unit in units if not WorkCoordinator.is_done(work_dir, unit.index)]
+            if not unfinished:
+                return units_run
+            claimed = False
+            for unit in unfinished:
+                if not WorkCoordinator.claim(work_dir, unit.index, worker_id, lease_seconds):
+                    continue
+                claimed = True
+                # unit may have been finished by the previous owner of an expired lease
+                if not WorkCoordinator.is_done(work_dir, unit.index):
+                    stop = threading.Event()
+                    renewal = threading.Thread(target=WorkCoordinator.renew_lease,
+                                               args=(work_dir, unit.index, stop, lease_seconds), daemon=True)
+                    renewal.start()
+                    try:
+                        WorkCoordinator.run_unit(work_dir, plan, unit, experiment, worker_id)
+                    finally:
+                        stop.set()
+                        renewal.join()
+                    units_run += 1
+                    if echo:
+                        print('Worker {} finished work unit {} ({})'.format(worker_id, unit.index, unit.gallery_xyt))
+                WorkCoordinator.release(work_dir, unit.index, worker_id)
+            if not claimed:
+                # all unfinished units are leased by other workers
+                time.sleep(poll_seconds)
+
+    @staticmethod
+    def wait(work_dir, plan, poll_seconds=None, echo=False):
+        """ Waits until all units of plan are finished """
+        if poll_seconds is None:
+            poll_seconds = Constants.WORK_POLL_SECONDS
+        t_start = time.time()
+        done_previous = -1
+        while True:
+            done = sum(WorkCoordinator.is_done(work_dir, index) for index in range(len(plan['units'])))
+            if echo and done != done_previous:
+                DatabaseRunner.print_progress(done, len(plan['units']), t_start)
+                done_previous = done
+            if done == len(plan['units']):
+                return
+            time.sleep(poll_seconds)
+
+    @staticmethod
+    def get_log_files(work_dir, plan):
+        """ :returns dict of log key: (log parameter file path, log database file path) of plan in work_dir/logs """
+        return {key: (os.path.join(work_dir, WorkCoordinator.LOGS, log_parameter_file),
+                      os.path.join(work_dir, WorkCoordinator.LOGS, log_db_file))
+                for key, (log_parameter_file, log_db_file) in plan['log_files'].items()}
+
+    @staticmethod
+    def merge(work_dir, plan, log_files):
+        """ Appends the logs of all units to the log files in order of the plan
+        :param log_files: dict of log key: (log parameter file path, log database file path), see get_log_files """
+        units = WorkCoordinator.get_units(plan)
+        results = []
+        for unit in units:
+            parameter_path, db_path, _ = WorkCoordinator.get_result_paths(work_dir, unit.index)
+            results.append((unit.index, parameter_path, 0, os.path.getsize(parameter_path),
+                            db_path, 0, os.path.getsize(db_path)))
+        DatabaseRunner.merge(units, results, log_files)
+        # remove logs of units that were interrupted by the expiry of their lease
+        results_folder = os.path.join(work_dir, WorkCoordinator.RESULTS)
+        for file_name in os.listdir(results_folder):
+            if file_name.endswith('.tmp'):
+                os.remove(os.path.join(results_folder, file_name))